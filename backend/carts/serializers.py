@@ -1,10 +1,18 @@
 from rest_framework import serializers
-from products.serializers import ProductSerializer
+from products.models import Product
 from .models import Cart, CartItem
 
 
+class CartProductSerializer(serializers.ModelSerializer):
+    """What a cart line shows of its product; no description or reviews"""
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'sku', 'price', 'image', 'stock', 'is_active']
+
+
 class CartItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+    product = CartProductSerializer(read_only=True)
     product_id = serializers.IntegerField(write_only=True)
     total = serializers.SerializerMethodField()
 
@@ -0,0 +1,64 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from products.models import Category, ProductReview
+from products.tests import TEST_SETTINGS, create_products
+from .models import Cart, CartItem
+
+CART_URL = '/api/carts/'
+
+
+@override_settings(**TEST_SETTINGS)
+class CartQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='shopper')
+        cls.reviewers = [User.objects.create(username=f'reviewer{i}') for i in range(3)]
+        cls.category = Category.objects.create(name='Shirts')
+        cls.cart = Cart.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_items(self, count, start=0):
+        for i, product in enumerate(create_products(self.category, count, start=start)):
+            CartItem.objects.create(cart=self.cart, product=product, quantity=i % 3 + 1)
+            for reviewer in self.reviewers:
+                ProductReview.objects.create(product=product, user=reviewer, rating=5)
+
+    def expected_total(self):
+        return float(sum(item.product.price * item.quantity for item in self.cart.items.all()))
+
+    def test_list_queries_do_not_grow_with_items(self):
+        self.add_items(2)
+        with self.assertNumQueries(2):
+            response = self.client.get(CART_URL)
+        self.assertEqual(len(response.data['items']), 2)
+        self.assertEqual(response.data['total'], self.expected_total())
+
+        self.add_items(8, start=2)
+        with self.assertNumQueries(2):
+            response = self.client.get(CART_URL)
+        self.assertEqual(len(response.data['items']), 10)
+        self.assertEqual(response.data['total'], self.expected_total())
+
+    def test_items_carry_line_totals_and_a_slim_product(self):
+        self.add_items(3)
+        items = self.client.get(CART_URL).data['items']
+        for item in items:
+            self.assertEqual(item['total'], float(item['product']['price']) * item['quantity'])
+            self.assertEqual(set(item['product']), {'id', 'name', 'sku', 'price', 'image', 'stock', 'is_active'})
+        self.assertEqual([item['product']['name'] for item in items], ['Product 0', 'Product 1', 'Product 2'])
+
+    def test_empty_cart(self):
+        other = User.objects.create(username='newcomer')
+        self.client.force_authenticate(other)
+        response = self.client.get(CART_URL)
+        self.assertEqual(response.data['items'], [])
+        self.assertEqual(response.data['total'], 0)
+        self.assertTrue(Cart.objects.filter(user=other).exists())
+
+    def test_get_total_without_the_annotation(self):
+        self.add_items(3)
+        self.assertEqual(float(Cart.objects.get(pk=self.cart.pk).get_total()), self.expected_total())
@@ -2,9 +2,10 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import Cart, CartItem
+from django.db.models import Prefetch
+from .models import Cart, CartItem, items_total
 from .serializers import CartSerializer, CartItemSerializer
-from products.models import ProductInteraction
+from products.tracking import track_interaction
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,10 +16,18 @@ class CartViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user)
+        # The cart with its total summed in the database, and its items and
+        # their products in one more query
+        return Cart.objects.filter(user=self.request.user).annotate(
+            items_total=items_total('items__'),
+        ).prefetch_related(
+            Prefetch('items', queryset=CartItem.objects.select_related('product').order_by('id')),
+        )
 
     def list(self, request, *args, **kwargs):
-        cart, created = Cart.objects.get_or_create(user=request.user)
+        cart = self.get_queryset().first()
+        if cart is None:
+            cart, created = Cart.objects.get_or_create(user=request.user)
         serializer = self.get_serializer(cart)
         return Response(serializer.data)
 
@@ -40,12 +49,7 @@ class CartViewSet(viewsets.ModelViewSet):
             # Track add-to-cart interaction
             try:
                 session_id = request.session.session_key
-                ProductInteraction.objects.create(
-                    user=request.user,
-                    product_id=product_id,
-                    interaction_type='add_to_cart',
-                    session_id=session_id
-                )
+                track_interaction(request.user, 'add_to_cart', product=product_id, session_id=session_id)
                 logger.info(f"Tracked add_to_cart for user {request.user.id}, product {product_id}")
             except Exception as e:
                 logger.error(f"Failed to track add_to_cart interaction: {e}")
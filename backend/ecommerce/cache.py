@@ -0,0 +1,162 @@
+"""
+Shared API cache with tag invalidation, on the default cache (Redis).
+
+Every tag ('product', 'category', 'user:42', ...) has a version number.
+cached() stores a payload under a key that embeds the current versions
+of the tags it depends on, and invalidate() increments them, so stale
+entries are never addressed again and simply expire: no key scans or
+deletes, and a reader that raced an invalidation can only write under
+the old, unreachable versions.
+
+    tag:{tag}                 version, seeded from the time in ms so a
+                              flushed cache never reuses an old version
+    tag:{tag}:modified        unix time of the last invalidation
+    stats:{name}:hit / miss   lookups per cache name
+    disabled                  runtime kill switch (manage.py api_cache)
+
+All cache errors are logged and treated as a miss: an outage makes the
+API slower, never broken. API_CACHE_ENABLED=False, or the runtime switch,
+bypasses payload caching; invalidations are still recorded so re-enabling
+never serves stale data.
+"""
+import time
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Cache names with hit/miss counters
+CACHE_NAMES = ('catalog', 'facets', 'profile')
+DISABLED_KEY = 'disabled'
+# Seconds to skip the cache after an error, so an outage costs one
+# connect timeout per window instead of one per request
+BACKOFF_SECONDS = 30
+
+_backoff_until = 0.0
+
+
+def _available():
+    return time.monotonic() >= _backoff_until
+
+
+def _failed(e):
+    global _backoff_until
+    _backoff_until = time.monotonic() + BACKOFF_SECONDS
+    logger.warning(f"API cache unavailable: {e}")
+
+
+def _tag_key(tag):
+    return f'tag:{tag}'
+
+
+def tag_state(tags):
+    """
+    Return ([version per tag], last invalidation unix time or None,
+    enabled) for the tags, or None if the cache is unreachable
+    """
+    if not _available():
+        return None
+    keys = [_tag_key(tag) for tag in tags]
+    try:
+        found = cache.get_many(keys + [f'{key}:modified' for key in keys] + [DISABLED_KEY])
+        for key in keys:
+            if key not in found:
+                cache.add(key, int(time.time() * 1000), timeout=None)
+                found[key] = cache.get(key)
+    except Exception as e:
+        _failed(e)
+        return None
+    modified = [found[f'{key}:modified'] for key in keys if f'{key}:modified' in found]
+    enabled = settings.API_CACHE_ENABLED and not found.get(DISABLED_KEY)
+    return [found[key] for key in keys], max(modified) if modified else None, enabled
+
+
+def invalidate(*tags):
+    """Invalidate everything cached under the tags, now"""
+    try:
+        for tag in tags:
+            key = _tag_key(tag)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, int(time.time() * 1000), timeout=None)
+            cache.set(f'{key}:modified', int(time.time()), timeout=None)
+    except Exception as e:
+        _failed(e)
+
+
+def invalidate_on_commit(*tags):
+    """invalidate() once the current transaction commits, so readers see the new rows"""
+    transaction.on_commit(lambda: invalidate(*tags))
+
+
+def _count(name, outcome):
+    key = f'stats:{name}:{outcome}'
+    try:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+    except Exception as e:
+        _failed(e)
+
+
+def cached(name, key, build, tags=(), timeout=DEFAULT_TIMEOUT, state=None):
+    """
+    Return build()'s result through the cache, stored under `key` and the
+    current versions of `tags` for `timeout` seconds (default: the cache's
+    TIMEOUT). `state` is a tag_state() result the caller already has for
+    the same tags.
+    """
+    state = state or tag_state(tags)
+    if state is None or not state[2]:
+        return build()
+    versions = state[0]
+    full_key = f"{name}:{key}:{'.'.join(map(str, versions))}"
+    try:
+        data = cache.get(full_key)
+    except Exception as e:
+        _failed(e)
+        return build()
+    if data is not None:
+        _count(name, 'hit')
+        return data
+    _count(name, 'miss')
+    data = build()
+    try:
+        cache.set(full_key, data, timeout)
+    except Exception as e:
+        _failed(e)
+    return data
+
+
+def stats():
+    """Hits, misses and hit ratio per cache name (counted since the last reset)"""
+    counts = cache.get_many([f'stats:{name}:{outcome}' for name in CACHE_NAMES for outcome in ('hit', 'miss')])
+    result = {}
+    for name in CACHE_NAMES:
+        hits = counts.get(f'stats:{name}:hit', 0)
+        misses = counts.get(f'stats:{name}:miss', 0)
+        result[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+    return result
+
+
+def reset_stats():
+    cache.delete_many([f'stats:{name}:{outcome}' for name in CACHE_NAMES for outcome in ('hit', 'miss')])
+
+
+def set_enabled(enabled):
+    """Runtime kill switch, shared by all processes"""
+    if enabled:
+        cache.delete(DISABLED_KEY)
+    else:
+        cache.set(DISABLED_KEY, 1, timeout=None)
+
+
+def is_enabled():
+    return settings.API_CACHE_ENABLED and not cache.get(DISABLED_KEY)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from ecommerce import cache as api_cache
+
+
+class Command(BaseCommand):
+    help = 'Show API cache hit ratios, invalidate tags, or switch payload caching off and on'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['stats', 'reset-stats', 'invalidate', 'enable', 'disable'])
+        parser.add_argument('tags', nargs='*', help="Tags for invalidate, e.g. product category user:42")
+
+    def handle(self, *args, **options):
+        action = options['action']
+        if action == 'stats':
+            state = 'enabled' if api_cache.is_enabled() else 'disabled'
+            self.stdout.write(f"API cache {state}")
+            for name, counts in api_cache.stats().items():
+                ratio = '-' if counts['hit_ratio'] is None else f"{counts['hit_ratio']:.1%}"
+                self.stdout.write(f"{name:10} hits={counts['hits']} misses={counts['misses']} hit_ratio={ratio}")
+        elif action == 'reset-stats':
+            api_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Reset hit/miss counters"))
+        elif action == 'invalidate':
+            api_cache.invalidate(*options['tags'])
+            self.stdout.write(self.style.SUCCESS(f"Invalidated {', '.join(options['tags']) or 'nothing'}"))
+        else:
+            api_cache.set_enabled(action == 'enable')
+            self.stdout.write(self.style.SUCCESS(f"API payload cache {action}d"))
@@ -0,0 +1,222 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are read with WHERE (ordering columns) past the last row seen,
+ORDER BY ... LIMIT page_size + 1, so page 10,000 costs the same as page 1
+when a composite index matches the ordering, instead of an OFFSET scan
+plus a COUNT(*) per request. The queryset's ordering is used as the key,
+with id appended as a tie-breaker, so ?ordering= and search ranking keep
+working. Clients follow the opaque `next` / `previous` links.
+
+The total is only computed on request: ?count=exact runs COUNT(*),
+?count=estimate takes the planner's row estimate on PostgreSQL (exact
+elsewhere).
+"""
+import json
+import base64
+import binascii
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def ordering_of(queryset, default=('-created_at',)):
+    """
+    The queryset's ordering as [(field, descending)], ending in id so that
+    every row has a unique key
+    """
+    names = [name for name in (queryset.query.order_by or queryset.model._meta.ordering or default)
+             if isinstance(name, str)]
+    ordering = [(name.lstrip('-'), name.startswith('-')) for name in names]
+    ordering = [('id' if name == 'pk' else name, descending) for name, descending in ordering]
+    if not any(name == 'id' for name, _ in ordering):
+        ordering.append(('id', ordering[0][1] if ordering else False))
+    return ordering
+
+
+def order_by_args(ordering, reverse=False):
+    return [f"{'-' if descending != reverse else ''}{name}" for name, descending in ordering]
+
+
+def keyset_filter(ordering, values, reverse=False):
+    """
+    Q for rows strictly after `values` in `ordering` (before them with
+    reverse=True): a > x OR (a = x AND (b > y OR ...)), plus a leading
+    a >= x bound so the database can range-scan the index on (a, b, ...).
+    """
+    def lookup(descending):
+        return 'lt' if descending != reverse else 'gt'
+
+    condition = None
+    for (name, descending), value in reversed(list(zip(ordering, values))):
+        after = Q(**{f'{name}__{lookup(descending)}': value})
+        condition = after if condition is None else after | (Q(**{name: value}) & condition)
+    (name, descending), value = ordering[0], values[0]
+    return Q(**{f'{name}__{lookup(descending)}e': value}) & condition
+
+
+def row_values(row, ordering):
+    """Key values of a model instance or .values() dict"""
+    if isinstance(row, dict):
+        return [row[name] for name, _ in ordering]
+    return [getattr(row, name) for name, _ in ordering]
+
+
+def keyset_iterator(queryset, chunk_size=2000):
+    """
+    Iterate a large queryset in keyset-ordered chunks. Each chunk is a
+    short indexed query, unlike .iterator(), which holds one cursor (and
+    on PostgreSQL one snapshot) open for the whole scan.
+    """
+    ordering = ordering_of(queryset)
+    queryset = queryset.order_by(*order_by_args(ordering))
+    values = None
+    while True:
+        chunk = queryset if values is None else queryset.filter(keyset_filter(ordering, values))
+        rows = list(chunk[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        values = row_values(rows[-1], ordering)
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def estimated_count(queryset):
+    """Planner row estimate on PostgreSQL, exact count elsewhere"""
+    if connections[queryset.db].vendor == 'postgresql':
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows'])
+    return queryset.count()
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over the queryset's ordering plus id"""
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    # Used when the queryset is unordered
+    default_ordering = ('-created_at',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+        self.ordering = ordering_of(queryset, self.default_ordering)
+        self.count = self.get_count(queryset, request)
+
+        queryset = queryset.order_by(*order_by_args(self.ordering))
+        values, previous = self.decode_cursor(request)
+        if values is not None:
+            queryset = queryset.filter(keyset_filter(self.ordering, values, reverse=previous))
+        if previous:
+            queryset = queryset.order_by(*order_by_args(self.ordering, reverse=True))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if previous:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True, cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'estimate':
+            return estimated_count(queryset)
+        return None
+
+    def decode_cursor(self, request):
+        """Return (key values, is_previous) from ?cursor=, or (None, False)"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if cursor['o'] != order_by_args(self.ordering) or len(cursor['v']) != len(self.ordering):
+                raise ValueError('cursor is for a different ordering')
+            values = [self._parse_value(name, value) for (name, _), value in zip(self.ordering, cursor['v'])]
+            return values, bool(cursor.get('p'))
+        except (TypeError, KeyError, ValueError, ValidationError, binascii.Error, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _parse_value(self, name, value):
+        try:
+            field = self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Annotations such as search_rank are plain JSON numbers
+            return value
+        return field.to_python(value)
+
+    def encode_cursor(self, row, previous=False):
+        cursor = {
+            'o': order_by_args(self.ordering),
+            'v': [_encode_value(value) for value in row_values(row, self.ordering)],
+            'p': previous,
+        }
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], previous=True)
+
+    def get_paginated_response(self, data):
+        response = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.count is not None:
+            response['count'] = self.count
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer'},
+                'results': schema,
+            },
+        }
@@ -20,6 +20,8 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
+    # Project-wide commands (manage.py api_cache)
+    'ecommerce',
     'products',
     'carts',
     'user_accounts',
@@ -29,6 +31,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'django.middleware.gzip.GZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -119,5 +122,62 @@ REDIS_HOST = config('REDIS_HOST', default='localhost')
 REDIS_PORT = config('REDIS_PORT', default=6379, cast=int)
 REDIS_DB = config('REDIS_DB', default=0, cast=int)
 
+# Shared API cache (ecommerce/cache.py); a database of its own so it can be
+# flushed without touching the event stream and popularity counters
+# (REDIS_DB, 0) or the ML service's cache (its REDIS_DB, 1)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f"redis://{REDIS_HOST}:{REDIS_PORT}/{config('CACHE_REDIS_DB', default=2, cast=int)}",
+        'KEY_PREFIX': 'api',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'socket_connect_timeout': 1,
+            'socket_timeout': 1,
+        },
+    }
+}
+# Kill switch for payload caching; `manage.py api_cache disable` flips it at runtime
+API_CACHE_ENABLED = config('API_CACHE_ENABLED', default=True, cast=bool)
+# Seconds a user's /me payload is cached (also invalidated on change)
+PROFILE_CACHE_SECONDS = config('PROFILE_CACHE_SECONDS', default=300, cast=int)
+
 # ML Service Configuration
 ML_SERVICE_URL = config('ML_SERVICE_URL', default='http://localhost:8001')
+
+# Real-time interaction stream consumed by the ML service
+INTERACTION_STREAM_ENABLED = config('INTERACTION_STREAM_ENABLED', default=True, cast=bool)
+INTERACTION_STREAM_KEY = config('INTERACTION_STREAM_KEY', default='interactions:stream')
+INTERACTION_STREAM_MAXLEN = config('INTERACTION_STREAM_MAXLEN', default=100000, cast=int)
+
+# Columnar training snapshots written by `manage.py export_training_snapshot`
+TRAINING_SNAPSHOT_DIR = config('TRAINING_SNAPSHOT_DIR', default=str(BASE_DIR / 'snapshots'))
+TRAINING_SNAPSHOT_KEEP = config('TRAINING_SNAPSHOT_KEEP', default=3, cast=int)
+
+# Buffered interaction tracking (products/tracking.py)
+TRACKING_BUFFER_ENABLED = config('TRACKING_BUFFER_ENABLED', default=True, cast=bool)
+TRACKING_FLUSH_INTERVAL = config('TRACKING_FLUSH_INTERVAL', default=2.0, cast=float)
+TRACKING_BATCH_SIZE = config('TRACKING_BATCH_SIZE', default=500, cast=int)
+TRACKING_MAX_PENDING = config('TRACKING_MAX_PENDING', default=10000, cast=int)
+TRACKING_VIEW_DEDUP_SECONDS = config('TRACKING_VIEW_DEDUP_SECONDS', default=1800, cast=int)
+
+# Real-time popularity counters in Redis (products/popularity.py)
+POPULARITY_COUNTERS_ENABLED = config('POPULARITY_COUNTERS_ENABLED', default=True, cast=bool)
+POPULARITY_RETENTION_HOURS = config('POPULARITY_RETENTION_HOURS', default=72, cast=int)
+POPULARITY_UNIQUE_DAYS = config('POPULARITY_UNIQUE_DAYS', default=8, cast=int)
+
+# Minutes an unpaid order holds its stock before `manage.py release_expired_orders`
+# cancels it (orders/inventory.py)
+ORDER_RESERVATION_MINUTES = config('ORDER_RESERVATION_MINUTES', default=30, cast=int)
+
+# Seconds before each process rebuilds its product suggest index (products/suggest.py)
+SUGGEST_INDEX_TTL = config('SUGGEST_INDEX_TTL', default=300, cast=int)
+
+# Seconds a facet count result is cached per filter combination (products/facets.py)
+FACETS_CACHE_SECONDS = config('FACETS_CACHE_SECONDS', default=60, cast=int)
+
+# Conditional GET for products and categories (products/conditional.py)
+CATALOG_CONDITIONAL_GET_ENABLED = config('CATALOG_CONDITIONAL_GET_ENABLED', default=True, cast=bool)
+# Cache-Control max-age for anonymous catalog reads
+CATALOG_CACHE_MAX_AGE = config('CATALOG_CACHE_MAX_AGE', default=60, cast=int)
+CATALOG_PAYLOAD_CACHE_SECONDS = config('CATALOG_PAYLOAD_CACHE_SECONDS', default=300, cast=int)
@@ -0,0 +1,188 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from products.models import Category, Product
+from products.tests import TEST_SETTINGS
+from . import cache as api_cache
+from .pagination import keyset_iterator
+
+PRODUCTS_URL = '/api/products/products/'
+
+
+@override_settings(**TEST_SETTINGS)
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Shirts')
+        now = timezone.now()
+        for i in range(20):
+            product = Product.objects.create(
+                name=f'Shirt {i}', description='cotton shirt' if i % 2 else 'linen shirt',
+                category=category, price=10 + i % 3, sku=f'SKU-{i}', stock=1,
+            )
+            # Ties on every ordering column; created_at ties in fours
+            Product.objects.filter(pk=product.pk).update(
+                rating=i % 2 * 4.5, review_count=i % 4, created_at=now - timedelta(hours=i // 4),
+            )
+        Product.objects.filter(name='Shirt 19').update(is_active=False)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def ids(self, page):
+        return [product['id'] for product in page['results']]
+
+    def walk(self, params):
+        """Follow next links from the first page; returns the pages"""
+        pages = [self.get(PRODUCTS_URL, dict(params, page_size=3))]
+        while pages[-1]['next']:
+            pages.append(self.get(pages[-1]['next']))
+        return pages
+
+    def test_pages_have_no_duplicates_or_gaps(self):
+        for params in ({}, {'ordering': 'price'}, {'ordering': '-price'}, {'ordering': 'rating'},
+                       {'ordering': '-review_count'}, {'search': 'shirt'}, {'search': 'cotton', 'ordering': 'price'}):
+            with self.subTest(**params):
+                expected = self.ids(self.get(PRODUCTS_URL, dict(params, page_size=100)))
+                pages = self.walk(params)
+                self.assertEqual(sum((self.ids(page) for page in pages), []), expected)
+                self.assertTrue(all(len(self.ids(page)) == 3 for page in pages[:-1]))
+                self.assertIsNone(pages[0]['previous'])
+
+    def test_previous_links_walk_back(self):
+        pages = self.walk({'ordering': 'price'})
+        self.assertEqual(len(pages), 7)
+        back = [pages[-1]]
+        while back[-1]['previous']:
+            back.append(self.get(back[-1]['previous']))
+        self.assertEqual([self.ids(page) for page in reversed(back)], [self.ids(page) for page in pages])
+        self.assertIsNone(back[-1]['previous'])
+        self.assertIsNotNone(back[-1]['next'])
+
+    def test_order_follows_ties_by_id(self):
+        expected = list(Product.objects.filter(is_active=True).order_by('price', 'id').values_list('id', flat=True))
+        pages = self.walk({'ordering': 'price'})
+        self.assertEqual(sum((self.ids(page) for page in pages), []), expected)
+
+    def test_invalid_cursor_is_404(self):
+        for cursor in ('not-base64!', 'e30=', 'eyJvIjogWyItY3JlYXRlZF9hdCJdLCAidiI6IFsxXX0='):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(PRODUCTS_URL, {'cursor': cursor}).status_code, 404)
+
+    def test_cursor_for_another_ordering_is_404(self):
+        next_link = self.get(PRODUCTS_URL, {'ordering': 'price', 'page_size': 3})['next']
+        response = self.client.get(next_link.replace('ordering=price', 'ordering=-rating'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_count_only_on_request(self):
+        self.assertNotIn('count', self.get(PRODUCTS_URL))
+        self.assertEqual(self.get(PRODUCTS_URL, {'count': 'exact', 'page_size': 3})['count'], 19)
+        self.assertEqual(self.get(PRODUCTS_URL, {'count': 'exact', 'search': 'cotton'})['count'], 9)
+        self.assertEqual(self.get(PRODUCTS_URL, {'count': 'estimate'})['count'], 19)
+
+    def test_keyset_iterator_reads_every_row_once(self):
+        # id is appended in the direction of the first column
+        for ordering, tie_break in (('price', 'id'), ('-rating', '-id'), ('-created_at', '-id')):
+            with self.subTest(ordering=ordering):
+                expected = list(Product.objects.order_by(ordering, tie_break))
+                self.assertEqual(list(keyset_iterator(Product.objects.order_by(ordering), chunk_size=3)), expected)
+
+
+@override_settings(**dict(TEST_SETTINGS, API_CACHE_ENABLED=True))
+class TagCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return {'build': self.builds}
+
+    def test_cached_until_a_tag_is_invalidated(self):
+        self.assertEqual(api_cache.cached('catalog', 'k', self.build, ('product', 'category')), {'build': 1})
+        self.assertEqual(api_cache.cached('catalog', 'k', self.build, ('product', 'category')), {'build': 1})
+        self.assertEqual(api_cache.cached('facets', 'k', self.build, ('category',)), {'build': 2})
+
+        api_cache.invalidate('product')
+        self.assertEqual(api_cache.cached('catalog', 'k', self.build, ('product', 'category')), {'build': 3})
+        # Entries that don't depend on the tag are kept
+        self.assertEqual(api_cache.cached('facets', 'k', self.build, ('category',)), {'build': 2})
+
+    def test_reader_racing_an_invalidation_cant_store_stale_data(self):
+        state = api_cache.tag_state(('product',))
+        api_cache.invalidate('product')
+        # Built from data read before the invalidation, stored under the old version
+        api_cache.cached('catalog', 'k', lambda: {'stale': True}, ('product',), state=state)
+        self.assertEqual(api_cache.cached('catalog', 'k', self.build, ('product',)), {'build': 1})
+
+    def test_invalidate_on_commit_waits_for_the_commit(self):
+        api_cache.cached('catalog', 'k', self.build, ('product',))
+        with self.captureOnCommitCallbacks(execute=True):
+            api_cache.invalidate_on_commit('product')
+            self.assertEqual(api_cache.cached('catalog', 'k', self.build, ('product',)), {'build': 1})
+        self.assertEqual(api_cache.cached('catalog', 'k', self.build, ('product',)), {'build': 2})
+
+    def test_tag_state_reports_last_invalidation(self):
+        versions, modified, enabled = api_cache.tag_state(('product',))
+        self.assertIsNone(modified)
+        self.assertTrue(enabled)
+        api_cache.invalidate('product')
+        new_versions, modified, _ = api_cache.tag_state(('product',))
+        self.assertEqual(new_versions, [versions[0] + 1])
+        self.assertIsNotNone(modified)
+
+    def test_default_timeout_is_the_caches(self):
+        with mock.patch.object(api_cache.cache, 'set') as cache_set:
+            api_cache.cached('catalog', 'k', self.build, ('product',))
+        self.assertIs(cache_set.call_args.args[2], DEFAULT_TIMEOUT)
+
+    def test_hit_and_miss_counts(self):
+        api_cache.reset_stats()
+        for _ in range(3):
+            api_cache.cached('catalog', 'k', self.build, ('product',))
+        self.assertEqual(api_cache.stats()['catalog'], {'hits': 2, 'misses': 1, 'hit_ratio': 0.6667})
+
+    def test_kill_switch(self):
+        api_cache.cached('catalog', 'k', self.build, ('product',))
+        call_command('api_cache', 'disable', stdout=StringIO())
+        self.assertFalse(api_cache.is_enabled())
+        self.assertEqual(api_cache.cached('catalog', 'k', self.build, ('product',)), {'build': 2})
+        self.assertEqual(api_cache.cached('catalog', 'k', self.build, ('product',)), {'build': 3})
+
+        # Invalidations while disabled still count, so nothing stale comes back
+        api_cache.invalidate('product')
+        call_command('api_cache', 'enable', stdout=StringIO())
+        self.assertTrue(api_cache.is_enabled())
+        self.assertEqual(api_cache.cached('catalog', 'k', self.build, ('product',)), {'build': 4})
+        self.assertEqual(api_cache.cached('catalog', 'k', self.build, ('product',)), {'build': 4})
+
+    @override_settings(API_CACHE_ENABLED=False)
+    def test_disabled_by_setting(self):
+        api_cache.cached('catalog', 'k', self.build, ('product',))
+        self.assertEqual(api_cache.cached('catalog', 'k', self.build, ('product',)), {'build': 2})
+
+    def test_cache_errors_fall_back_to_building(self):
+        self.addCleanup(setattr, api_cache, '_backoff_until', 0.0)
+        with mock.patch.object(api_cache.cache, 'get_many', side_effect=ConnectionError('down')), \
+                self.assertLogs('ecommerce.cache', 'WARNING'):
+            self.assertEqual(api_cache.cached('catalog', 'k', self.build, ('product',)), {'build': 1})
+        # Backed off: the cache isn't tried again for a while
+        with mock.patch.object(api_cache.cache, 'get_many') as get_many:
+            self.assertEqual(api_cache.cached('catalog', 'k', self.build, ('product',)), {'build': 2})
+        get_many.assert_not_called()
+
+    def test_command_invalidates_tags(self):
+        api_cache.cached('catalog', 'k', self.build, ('product',))
+        call_command('api_cache', 'invalidate', 'product', stdout=StringIO())
+        self.assertEqual(api_cache.cached('catalog', 'k', self.build, ('product',)), {'build': 2})
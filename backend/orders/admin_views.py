@@ -5,6 +5,8 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import NotFound
+from ecommerce.pagination import KeysetPagination
 from orders.models import Order, OrderItem, OrderTracking
 from products.models import ProductInteraction
 from django.db.models import Sum, Count, Q
@@ -92,30 +94,29 @@ def payment_dashboard_stats(request):
 @permission_classes([IsAdminUser])
 def pending_orders_list(request):
     """
-    Get list of all pending payment orders.
+    Get list of all pending payment orders, newest first.
     
     Query parameters:
-    - page: Page number (default: 1)
-    - page_size: Items per page (default: 20)
+    - cursor: Opaque cursor from the `next`/`previous` link of a previous page
+    - page_size: Items per page (default: 20, max: 100)
     - status: Filter by order status (pending, processing, shipped, delivered)
+    - count: 'exact' or 'estimate' to include the total count
     """
     try:
-        page = int(request.query_params.get('page', 1))
-        page_size = int(request.query_params.get('page_size', 20))
         order_status = request.query_params.get('status', None)
         
         # Base queryset: all pending payments
-        queryset = Order.objects.filter(payment_status='pending').order_by('-created_at')
+        queryset = Order.objects.filter(payment_status='pending').select_related('user').annotate(
+            items_count=Count('items')
+        ).order_by('-created_at')
         
         # Optional status filter
         if order_status:
             queryset = queryset.filter(status=order_status)
         
-        # Pagination
-        total_count = queryset.count()
-        start = (page - 1) * page_size
-        end = start + page_size
-        orders = queryset[start:end]
+        # Keyset pagination on (created_at, id)
+        paginator = KeysetPagination()
+        orders = paginator.paginate_queryset(queryset, request)
         
         # Serialize orders
         orders_data = []
@@ -129,17 +130,13 @@ def pending_orders_list(request):
                 'status': order.status,
                 'payment_status': order.payment_status,
                 'created_at': order.created_at.isoformat(),
-                'items_count': order.items.count()
+                'items_count': order.items_count
             })
         
-        return Response({
-            'count': total_count,
-            'page': page,
-            'page_size': page_size,
-            'total_pages': (total_count + page_size - 1) // page_size,
-            'results': orders_data
-        })
+        return paginator.get_paginated_response(orders_data)
     
+    except NotFound:
+        raise
     except Exception as e:
         logger.error(f"Error fetching pending orders: {e}")
         return Response(
@@ -155,10 +152,10 @@ def order_details(request, order_id):
     Get detailed information about a specific order including items.
     """
     try:
-        order = Order.objects.get(id=order_id)
+        order = Order.objects.select_related('user').get(id=order_id)
         
         # Get order items
-        items = order.items.all()
+        items = order.items.select_related('product')
         items_data = [
             {
                 'id': item.id,
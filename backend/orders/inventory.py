@@ -0,0 +1,141 @@
+"""
+Stock reservation for orders.
+
+Checkout reserves stock inside the order's transaction in two statements:
+
+    SELECT id, name, stock FROM product WHERE id IN (...) ORDER BY id FOR UPDATE
+    UPDATE product SET stock = stock - CASE id WHEN a THEN qa ... END
+    WHERE (id = a AND stock >= qa) OR (id = b AND stock >= qb) ...
+
+Only the order's product rows are locked, always in id order, so
+concurrent checkouts of the same product queue on that row and checkouts
+of overlapping carts can't deadlock. The UPDATE re-checks every quantity,
+so stock never goes below zero. If a product is short, OutOfStock is
+raised and the whole order rolls back.
+
+Stock goes back when a reserved order is cancelled, by the customer or by
+release_expired_reservations() (`manage.py release_expired_orders`) for
+orders left unpaid past ORDER_RESERVATION_MINUTES. Order.stock_reserved
+records that an order holds stock, so it is released at most once.
+
+Catalog lists don't show stock, so a stock change invalidates only the
+changed products' details (their product:<id> tags), not the catalog.
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+from ecommerce.cache import invalidate_on_commit
+from products.conditional import product_tag
+from products.models import Product
+from .models import Order, OrderTracking
+
+logger = logging.getLogger(__name__)
+
+
+class OutOfStock(Exception):
+    """Some products don't have the requested quantity in stock"""
+
+    def __init__(self, shortages):
+        # [{'product': id, 'name': ..., 'requested': n, 'available': n}]
+        self.shortages = shortages
+        super().__init__(f"Insufficient stock for products {[s['product'] for s in shortages]}")
+
+
+def _quantities(items):
+    """{product_id: total quantity} for objects with product_id and quantity"""
+    quantities = Counter()
+    for item in items:
+        quantities[item.product_id] += item.quantity
+    return quantities
+
+
+def _stock_delta(quantities):
+    return Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        default=Value(0), output_field=IntegerField(),
+    )
+
+
+def reserve_stock(items):
+    """
+    Decrement stock for the items (cart or order items), or raise
+    OutOfStock and change nothing
+    """
+    quantities = _quantities(items)
+    if not quantities:
+        return
+    with transaction.atomic():
+        rows = list(Product.objects.select_for_update().filter(pk__in=quantities).order_by('pk')
+                    .values_list('pk', 'name', 'stock'))
+        shortages = [
+            {'product': product_id, 'name': name, 'requested': quantities[product_id], 'available': stock}
+            for product_id, name, stock in rows
+            if stock < quantities[product_id]
+        ]
+        if shortages:
+            raise OutOfStock(shortages)
+
+        enough = Q()
+        for product_id, quantity in quantities.items():
+            enough |= Q(pk=product_id, stock__gte=quantity)
+        updated = Product.objects.filter(enough).update(stock=F('stock') - _stock_delta(quantities))
+        if updated < len(quantities):
+            # A product no longer exists; the savepoint undoes the partial update
+            found = {row[0] for row in rows}
+            raise OutOfStock([
+                {'product': product_id, 'name': None, 'requested': quantity, 'available': 0}
+                for product_id, quantity in quantities.items()
+                if product_id not in found
+            ])
+    invalidate_on_commit(*map(product_tag, quantities))
+
+
+def release_stock(order):
+    """
+    Return a reserved order's stock. Only the caller that flips
+    stock_reserved gets to restore it, so concurrent cancels can't
+    release twice. Returns True if stock was released.
+    """
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order.pk, stock_reserved=True).update(stock_reserved=False):
+            return False
+        order.stock_reserved = False
+        quantities = _quantities(order.items.all())
+        if quantities:
+            Product.objects.filter(pk__in=quantities).update(stock=F('stock') + _stock_delta(quantities))
+            invalidate_on_commit(*map(product_tag, quantities))
+    return True
+
+
+def release_expired_reservations(now=None):
+    """
+    Cancel pending orders still unpaid ORDER_RESERVATION_MINUTES after
+    checkout and release their stock. Returns the number cancelled.
+    """
+    cutoff = (now or timezone.now()) - timedelta(minutes=settings.ORDER_RESERVATION_MINUTES)
+    expired = Order.objects.filter(
+        stock_reserved=True, status='pending', payment_status__in=['pending', 'failed'],
+        created_at__lt=cutoff,
+    ).order_by('created_at', 'id')
+
+    cancelled = 0
+    for order in expired.iterator():
+        with transaction.atomic():
+            # Skip orders paid or cancelled since the query above
+            if not Order.objects.filter(pk=order.pk, status='pending', payment_status__in=['pending', 'failed']) \
+                    .update(status='cancelled', updated_at=timezone.now()):
+                continue
+            release_stock(order)
+            OrderTracking.objects.create(
+                order=order,
+                status='cancelled',
+                description='Order cancelled: payment not received in time'
+            )
+        cancelled += 1
+    if cancelled:
+        logger.info(f"Released stock for {cancelled} expired orders")
+    return cancelled
@@ -0,0 +1,71 @@
+import time
+import uuid
+import statistics
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+from carts.models import Cart, CartItem
+from orders.views import OrderViewSet
+from products.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Time OrderViewSet.create_from_cart for carts of several sizes. Runs inside '
+        'a transaction that is rolled back, so no data is kept and commit time is excluded.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,20,200', help='Comma-separated line item counts')
+        parser.add_argument('--runs', type=int, default=20, help='Timed checkouts per size')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        with transaction.atomic():
+            results = self.benchmark(sizes, options['runs'])
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'items':>6} {'median ms':>10} {'p95 ms':>8} {'queries':>8}")
+        for size, timings, queries in results:
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            self.stdout.write(f"{size:>6} {statistics.median(timings):>10.2f} {p95:>8.2f} {queries:>8}")
+
+    def benchmark(self, sizes, runs):
+        tag = uuid.uuid4().hex[:8]
+        user = User.objects.create(username=f'checkout-benchmark-{tag}')
+        category = Category.objects.create(name=f'checkout-benchmark-{tag}')
+        products = Product.objects.bulk_create([
+            Product(name=f'Benchmark product {i}', description='', category=category,
+                    price='19.99', stock=10 ** 6, sku=f'bench-{tag}-{i}')
+            for i in range(max(sizes))
+        ])
+        cart = Cart.objects.create(user=user)
+        view = OrderViewSet.as_view({'post': 'create_from_cart'})
+        factory = APIRequestFactory()
+
+        results = []
+        for size in sizes:
+            timings = []
+            # One untimed warm-up checkout per size
+            for run in range(runs + 1):
+                CartItem.objects.bulk_create([
+                    CartItem(cart=cart, product=product, quantity=2) for product in products[:size]
+                ])
+                request = factory.post('/api/orders/create_from_cart/', {'shipping_address': 'Benchmark'}, format='json')
+                request.session = SessionStore()
+                force_authenticate(request, user=user)
+
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = view(request)
+                    elapsed = (time.perf_counter() - started) * 1000
+                if response.status_code != 201:
+                    raise RuntimeError(f"Checkout failed with {response.status_code}: {response.data}")
+                if run:
+                    timings.append(elapsed)
+            results.append((size, timings, len(queries.captured_queries)))
+        return results
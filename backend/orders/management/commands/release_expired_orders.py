@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from orders.inventory import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Cancel orders unpaid for ORDER_RESERVATION_MINUTES after checkout and return their stock'
+
+    def handle(self, *args, **options):
+        cancelled = release_expired_reservations()
+        self.stdout.write(self.style.SUCCESS(f"Cancelled {cancelled} expired orders"))
@@ -25,6 +25,8 @@ class Order(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     tax_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     shipping_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Stock was decremented at checkout and not yet returned (orders/inventory.py)
+    stock_reserved = models.BooleanField(default=False)
 
     shipping_address = models.TextField()
     billing_address = models.TextField()
@@ -33,6 +35,19 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Keyset pagination: staff listing, a customer's orders, admin pending list
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['user', 'created_at', 'id']),
+            models.Index(fields=['payment_status', 'created_at', 'id']),
+            # Reservation expiry scans only unpaid orders still holding stock.
+            # Paid orders leave 'pending' (and the index) but keep
+            # stock_reserved, so cancelling them still returns their stock.
+            models.Index(fields=['created_at'], condition=models.Q(stock_reserved=True, status='pending'),
+                         name='order_pending_reserved_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.order_number}"
 
@@ -0,0 +1,297 @@
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from carts.models import Cart, CartItem
+from products.models import Category, Product, ProductInteraction, ProductReview
+from products import tracking
+from products.tests import TEST_SETTINGS, create_products
+from .inventory import release_expired_reservations
+from .models import Order, OrderItem
+
+
+@override_settings(**TEST_SETTINGS)
+class OrderQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='buyer')
+        cls.reviewers = [User.objects.create(username=f'reviewer{i}') for i in range(3)]
+        cls.category = Category.objects.create(name='Shirts')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_order(self, products):
+        order = Order.objects.create(
+            user=self.user, order_number=f'ORD-{Order.objects.count()}', total_amount=Decimal('0'),
+            shipping_address='1 Main St', billing_address='1 Main St',
+        )
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+            for reviewer in self.reviewers:
+                ProductReview.objects.get_or_create(product=product, user=reviewer,
+                                                    defaults={'rating': 4, 'title': 'Good', 'comment': ''})
+        order.tracking.create(status='pending', description='Order created')
+
+    def test_list_queries_do_not_grow_with_orders_or_items(self):
+        # Orders, items with products and categories, recent reviews, tracking
+        self.add_order(create_products(self.category, 2))
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/orders/')
+        self.assertEqual(len(response.data['results']), 1)
+
+        self.add_order(create_products(self.category, 5, start=2))
+        self.add_order(create_products(self.category, 3, start=7))
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/orders/')
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(len(response.data['results'][0]['items'][0]['product']['reviews']), 3)
+
+
+@override_settings(**TEST_SETTINGS)
+class CheckoutTests(TestCase):
+    url = '/api/orders/create_from_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='buyer')
+        cls.category = Category.objects.create(name='Shirts')
+        cls.cart = Cart.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client = APIClient(raise_request_exception=False)
+        self.client.force_authenticate(self.user)
+        # Purchases are queued on commit and written by flush() below
+        patcher = mock.patch.object(tracking.InteractionBuffer, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(tracking.buffer.flush)
+
+    def fill_cart(self, count):
+        products = create_products(self.category, count, start=Product.objects.count())
+        for i, product in enumerate(products):
+            CartItem.objects.create(cart=self.cart, product=product, quantity=i % 2 + 1)
+        return products
+
+    def checkout(self):
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'shipping_address': '1 Main St'}, format='json')
+        return response, [query['sql'] for query in queries.captured_queries]
+
+    def inserts(self, sql, model):
+        return [query for query in sql if query.startswith(f'INSERT INTO {connection.ops.quote_name(model._meta.db_table)}')]
+
+    def test_checkout_creates_order_items_and_tracking(self):
+        products = self.fill_cart(3)
+        response, sql = self.checkout()
+        self.assertEqual(response.status_code, 201)
+
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(response.data['order_number'], order.order_number)
+        self.assertTrue(order.stock_reserved)
+        # Subtotal 10x1 + 11x2 + 12x1, 10% tax, 10.00 shipping
+        self.assertEqual(order.tax_amount, Decimal('4.40'))
+        self.assertEqual(order.total_amount, Decimal('58.40'))
+        self.assertEqual(
+            sorted(order.items.values_list('product_id', 'quantity', 'price')),
+            [(p.pk, i % 2 + 1, p.price) for i, p in enumerate(products)],
+        )
+        self.assertEqual(list(order.tracking.values_list('status', flat=True)), ['pending'])
+        self.assertEqual(response.data['tracking'][0]['status'], 'pending')
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+        self.assertEqual(list(Product.objects.order_by('id').values_list('stock', flat=True)), [4, 3, 4])
+        # Order items go in with one INSERT, the purchases are queued
+        self.assertEqual(len(self.inserts(sql, OrderItem)), 1)
+        self.assertEqual(self.inserts(sql, ProductInteraction), [])
+        self.assertEqual(tracking.buffer.flush(), 3)
+        self.assertEqual(ProductInteraction.objects.filter(user=self.user, interaction_type='purchase').count(), 3)
+
+    @override_settings(TRACKING_BUFFER_ENABLED=False)
+    def test_unbuffered_purchases_are_one_insert(self):
+        self.fill_cart(3)
+        response, sql = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(self.inserts(sql, ProductInteraction)), 1)
+        self.assertEqual(ProductInteraction.objects.filter(interaction_type='purchase').count(), 3)
+
+    def test_queries_do_not_grow_with_cart_size(self):
+        self.fill_cart(2)
+        small = len(self.checkout()[1])
+        self.fill_cart(20)
+        response, sql = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['items']), 20)
+        self.assertEqual(len(sql), small)
+
+    def test_failure_rolls_back_everything(self):
+        self.fill_cart(3)
+        with mock.patch('orders.views.OrderTracking.objects.create', side_effect=RuntimeError('boom')):
+            response, _ = self.checkout()
+        self.assertEqual(response.status_code, 500)
+
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual(tracking.buffer.flush(), 0)
+        self.assertFalse(ProductInteraction.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart=self.cart).count(), 3)
+        self.assertEqual(set(Product.objects.values_list('stock', flat=True)), {5})
+
+    def test_out_of_stock_writes_nothing(self):
+        products = self.fill_cart(2)
+        Product.objects.filter(pk=products[1].pk).update(stock=1)
+        response, _ = self.checkout()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([s['product'] for s in response.data['products']], [products[1].pk])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(list(Product.objects.order_by('id').values_list('stock', flat=True)), [5, 1])
+
+    def test_empty_cart(self):
+        response, _ = self.checkout()
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(**TEST_SETTINGS)
+class ReservationExpiryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create(username='staff', is_staff=True)
+        cls.user = User.objects.create(username='buyer')
+        cls.product = create_products(Category.objects.create(name='Shirts'), 1)[0]
+
+    def reserve(self, order_number):
+        order = Order.objects.create(
+            user=self.user, order_number=order_number, total_amount=Decimal('20.00'),
+            shipping_address='1 Main St', billing_address='1 Main St', stock_reserved=True,
+        )
+        OrderItem.objects.create(order=order, product=self.product, quantity=2, price=self.product.price)
+        Product.objects.filter(pk=self.product.pk).update(stock=F('stock') - 2)
+        return order
+
+    def test_expiry_releases_unpaid_orders_only(self):
+        unpaid = self.reserve('ORD-UNPAID')
+        paid = self.reserve('ORD-PAID')
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        response = client.post(f'/api/orders/{paid.pk}/update_payment_status/', {'payment_status': 'paid'})
+        self.assertEqual(response.status_code, 200)
+        Order.objects.update(created_at=timezone.now() - timedelta(minutes=settings.ORDER_RESERVATION_MINUTES + 1))
+
+        self.assertEqual(release_expired_reservations(), 1)
+        unpaid.refresh_from_db()
+        paid.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual((unpaid.status, unpaid.stock_reserved), ('cancelled', False))
+        self.assertEqual((paid.status, paid.stock_reserved), ('processing', True))
+        self.assertEqual(self.product.stock, 3)
+
+    def test_expiry_scan_uses_pending_reservation_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN is SQLite only')
+        queryset = Order.objects.filter(stock_reserved=True, status='pending', created_at__lt=timezone.now())
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('order_pending_reserved_idx', plan)
+
+
+@override_settings(**dict(TEST_SETTINGS, API_CACHE_ENABLED=True))
+class StockInvalidationTests(TestCase):
+    """Stock changes show in the product's details at once, and leave lists cached"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='buyer')
+        cls.product = create_products(Category.objects.create(name='Shirts'), 1)[0]
+        Cart.objects.create(user=cls.user).items.create(product=cls.product, quantity=1)
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.buyer = APIClient()
+        self.buyer.force_authenticate(self.user)
+
+    def test_checkout_and_cancel_refresh_product_details(self):
+        detail = f'/api/products/products/{self.product.pk}/'
+        response = self.anonymous.get(detail)
+        self.assertEqual(response.data['stock'], 5)
+        detail_etag = response['ETag']
+        list_etag = self.anonymous.get('/api/products/products/')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = self.buyer.post('/api/orders/create_from_cart/', {'shipping_address': '1 Main St'}).data
+        response = self.anonymous.get(detail, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stock'], 4)
+        self.assertEqual(self.anonymous.get('/api/products/products/', HTTP_IF_NONE_MATCH=list_etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.buyer.post(f"/api/orders/{order['id']}/cancel/")
+        response = self.anonymous.get(detail, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stock'], 5)
+        tracking.buffer.flush()
+
+
+@override_settings(**TEST_SETTINGS)
+class StockReservationConcurrencyTests(TransactionTestCase):
+    """Concurrent checkouts of one SKU never sell more than its stock"""
+    STOCK = 5
+    BUYERS = 12
+
+    def setUp(self):
+        category = Category.objects.create(name='Shirts')
+        self.product = Product.objects.create(
+            name='Last few', description='', category=category, price=Decimal('20.00'),
+            sku='SKU-LAST', stock=self.STOCK,
+        )
+        self.buyers = []
+        for i in range(self.BUYERS):
+            user = User.objects.create(username=f'buyer{i}')
+            Cart.objects.create(user=user).items.create(product=self.product, quantity=1)
+            self.buyers.append(user)
+
+    def checkout(self, user, barrier, results):
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(user)
+        try:
+            barrier.wait()
+            deadline = time.monotonic() + 30
+            while True:
+                response = client.post('/api/orders/create_from_cart/', {'shipping_address': '1 Main St'})
+                # SQLite allows one writer: a checkout that lost the lock
+                # rolled back completely, so it is simply retried
+                if response.status_code != 500 or time.monotonic() > deadline:
+                    break
+                time.sleep(0.01)
+            results.append(response.status_code)
+        finally:
+            connection.close()
+
+    def test_concurrent_checkouts_do_not_oversell(self):
+        barrier = threading.Barrier(self.BUYERS)
+        results = []
+        threads = [threading.Thread(target=self.checkout, args=(user, barrier, results)) for user in self.buyers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Write the queued purchase interactions while the test database exists
+        tracking.buffer.flush()
+
+        self.product.refresh_from_db()
+        self.assertEqual(sorted(results), [201] * self.STOCK + [409] * (self.BUYERS - self.STOCK))
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(Order.objects.filter(stock_reserved=True).count(), self.STOCK)
+        self.assertEqual(OrderItem.objects.filter(product=self.product).count(), self.STOCK)
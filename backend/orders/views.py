@@ -3,92 +3,126 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import permission_classes
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from django.utils import timezone
+from decimal import Decimal, ROUND_HALF_UP
 import uuid
 import logging
+from ecommerce.pagination import KeysetPagination
 from .models import Order, OrderItem, OrderTracking
+from .inventory import OutOfStock, release_stock, reserve_stock
 from .serializers import OrderSerializer
-from products.models import ProductInteraction
+from products.serializers import recent_reviews_prefetch
+from products.tracking import track_interaction, track_interactions
 
 logger = logging.getLogger(__name__)
 
+TAX_RATE = Decimal('0.10')
+SHIPPING_COST = Decimal('10.00')
+CENTS = Decimal('0.01')
+
 
 class OrderViewSet(viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     filterset_fields = ['status', 'payment_status']
 
     def get_queryset(self):
         if self.request.user.is_staff:
-            return Order.objects.all().order_by('-created_at')
-        return Order.objects.filter(user=self.request.user).order_by('-created_at')
+            queryset = Order.objects.all()
+        else:
+            queryset = Order.objects.filter(user=self.request.user)
+        # Items, their products and categories, and the products' recent
+        # reviews in a fixed number of queries per page
+        return queryset.prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product__category')),
+            recent_reviews_prefetch('items__product__reviews'),
+            'tracking',
+        ).order_by('-created_at')
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
     @action(detail=False, methods=['post'])
     def create_from_cart(self, request):
-        from carts.models import Cart
+        """
+        Turn the user's cart into an order in one transaction: the cart
+        row is locked against a concurrent checkout, its items are read
+        once with their products, stock is reserved, and order items and
+        purchase interactions are inserted in bulk. Answers 409 with the
+        short products if any is out of stock.
+        """
+        from carts.models import Cart, CartItem
 
         try:
-            cart = Cart.objects.get(user=request.user)
-            if not cart.items.exists():
-                return Response(
-                    {'error': 'Cart is empty'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            with transaction.atomic():
+                cart = Cart.objects.select_for_update().get(user=request.user)
+                cart_items = list(cart.items.select_related('product__category').order_by('id'))
+                if not cart_items:
+                    return Response(
+                        {'error': 'Cart is empty'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
 
-            # Create order
-            order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
-            shipping_address = request.data.get('shipping_address', '')
-            billing_address = request.data.get('billing_address', shipping_address)
-
-            total_amount = cart.get_total()
-            tax_amount = float(total_amount) * 0.1
-            shipping_cost = 10.00
-
-            order = Order.objects.create(
-                user=request.user,
-                order_number=order_number,
-                total_amount=float(total_amount) + float(tax_amount) + float(shipping_cost),
-                tax_amount=tax_amount,
-                shipping_cost=shipping_cost,
-                shipping_address=shipping_address,
-                billing_address=billing_address,
-            )
+                # Reserve stock first: a short product fails before any writes
+                reserve_stock(cart_items)
+
+                # Create order
+                order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
+                shipping_address = request.data.get('shipping_address', '')
+                billing_address = request.data.get('billing_address', shipping_address)
+
+                # Totals from the rows just read, so they match the line items
+                subtotal = sum(item.product.price * item.quantity for item in cart_items)
+                tax_amount = (subtotal * TAX_RATE).quantize(CENTS, rounding=ROUND_HALF_UP)
+                shipping_cost = SHIPPING_COST
+
+                order = Order.objects.create(
+                    user=request.user,
+                    order_number=order_number,
+                    total_amount=subtotal + tax_amount + shipping_cost,
+                    tax_amount=tax_amount,
+                    shipping_cost=shipping_cost,
+                    shipping_address=shipping_address,
+                    billing_address=billing_address,
+                    stock_reserved=True,
+                )
+                order_items = OrderItem.objects.bulk_create([
+                    OrderItem(
+                        order=order,
+                        product=cart_item.product,
+                        quantity=cart_item.quantity,
+                        price=cart_item.product.price
+                    )
+                    for cart_item in cart_items
+                ])
 
-            # Create order items and track purchase interactions
-            session_id = request.session.session_key
-            for cart_item in cart.items.all():
-                OrderItem.objects.create(
+                # Create initial tracking
+                tracking = OrderTracking.objects.create(
                     order=order,
-                    product=cart_item.product,
-                    quantity=cart_item.quantity,
-                    price=cart_item.product.price
+                    status='pending',
+                    description='Order received'
                 )
-                
-                # Track purchase interaction for each product
+
+                # Clear cart
+                CartItem.objects.filter(cart=cart).delete()
+
+                # Track purchase interactions, queued once the order commits
                 try:
-                    ProductInteraction.objects.create(
-                        user=request.user,
-                        product=cart_item.product,
-                        interaction_type='purchase',
-                        session_id=session_id
+                    track_interactions(
+                        request.user, 'purchase', [item.product_id for item in cart_items],
+                        session_id=request.session.session_key,
                     )
-                    logger.info(f"Tracked purchase for user {request.user.id}, product {cart_item.product.id}")
+                    logger.info(f"Tracked {len(cart_items)} purchases for user {request.user.id}, order {order_number}")
                 except Exception as e:
-                    logger.error(f"Failed to track purchase interaction: {e}")
-
-            # Create initial tracking
-            OrderTracking.objects.create(
-                order=order,
-                status='pending',
-                description='Order received'
-            )
-
-            # Clear cart
-            cart.items.all().delete()
+                    logger.error(f"Failed to track purchase interactions: {e}")
 
+            # Serialize from the rows in hand rather than reading the order back;
+            # only the products' recent reviews need a query
+            prefetch_related_objects([item.product for item in order_items], recent_reviews_prefetch())
+            order._prefetched_objects_cache = {'items': order_items, 'tracking': [tracking]}
             return Response(
                 OrderSerializer(order).data,
                 status=status.HTTP_201_CREATED
@@ -99,6 +133,11 @@ class OrderViewSet(viewsets.ModelViewSet):
                 {'error': 'Cart not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        except OutOfStock as e:
+            return Response(
+                {'error': 'Insufficient stock', 'products': e.shortages},
+                status=status.HTTP_409_CONFLICT
+            )
 
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
@@ -109,13 +148,16 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        order.status = 'cancelled'
-        order.save()
-        OrderTracking.objects.create(
-            order=order,
-            status='cancelled',
-            description='Order cancelled'
-        )
+        with transaction.atomic():
+            order.status = 'cancelled'
+            # Only the changed fields: a full save would write back stock_reserved
+            order.save(update_fields=['status', 'updated_at'])
+            release_stock(order)
+            OrderTracking.objects.create(
+                order=order,
+                status='cancelled',
+                description='Order cancelled'
+            )
         return Response(OrderSerializer(order).data)
 
     @action(detail=True, methods=['post'])
@@ -153,12 +195,12 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         # Update payment status
         order.payment_status = new_payment_status
-        order.save()
+        order.save(update_fields=['payment_status', 'updated_at'])
         
         # If payment is now confirmed as paid, update order status
         if new_payment_status == 'paid' and order.status == 'pending':
             order.status = 'processing'
-            order.save()
+            order.save(update_fields=['status', 'updated_at'])
             OrderTracking.objects.create(
                 order=order,
                 status='processing',
@@ -173,13 +215,8 @@ class OrderViewSet(viewsets.ModelViewSet):
             }
             interaction_type = interaction_type_mapping.get(new_payment_status, 'payment_status_change')
             
-            ProductInteraction.objects.create(
-                user=order.user,
-                product=None,  # Payment is order-level, not product-specific
-                interaction_type=interaction_type,
-                rating=None,
-                session_id=f"order_{order.id}"
-            )
+            # Payment is order-level, not product-specific
+            track_interaction(order.user, interaction_type, session_id=f"order_{order.id}")
             logger.info(f"Tracked payment status change for order {order.order_number}: {old_payment_status} → {new_payment_status}")
         except Exception as e:
             logger.error(f"Failed to track payment status change: {e}")
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Product, Category, ProductInteraction, ProductReview
+from .models import Product, Category, ProductInteraction, ProductReview, ProductStats, ProductDailyStats
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -11,7 +11,7 @@ class ProductAdmin(admin.ModelAdmin):
     list_display = ['name', 'category', 'price', 'gender', 'stock', 'rating', 'is_active']
     list_filter = ['category', 'gender', 'is_active', 'created_at']
     search_fields = ['name', 'sku']
-    readonly_fields = ['created_at', 'updated_at', 'rating']
+    readonly_fields = ['created_at', 'updated_at', 'rating', 'review_count']
     
     fieldsets = (
         ('Basic Information', {
@@ -30,7 +30,7 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('image',)
         }),
         ('Metadata', {
-            'fields': ('rating', 'created_at', 'updated_at'),
+            'fields': ('rating', 'review_count', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
@@ -50,4 +50,16 @@ class ProductReviewAdmin(admin.ModelAdmin):
 class ProductInteractionAdmin(admin.ModelAdmin):
     list_display = ['product', 'user', 'interaction_type', 'created_at']
     list_filter = ['interaction_type', 'created_at']
-    search_fields = ['product__name', 'user__username']
\ No newline at end of file
+    search_fields = ['product__name', 'user__username']
+
+@admin.register(ProductStats)
+class ProductStatsAdmin(admin.ModelAdmin):
+    list_display = ['product', 'review_count', 'avg_rating', 'interaction_count', 'purchase_count', 'updated_at']
+    search_fields = ['product__name']
+    readonly_fields = [f.name for f in ProductStats._meta.fields]
+
+@admin.register(ProductDailyStats)
+class ProductDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ['product', 'date', 'views', 'add_to_carts', 'purchases', 'unique_viewers']
+    list_filter = ['date']
+    search_fields = ['product__name']
@@ -1,5 +1,34 @@
+import os
+import sys
 from django.apps import AppConfig
 
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from django.db.models.signals import post_migrate
+        post_migrate.connect(_ensure_search_backend, sender=self)
+        if _serving():
+            from .suggest import index as suggest_index
+            suggest_index.start_build()
+
+
+def _serving():
+    """False for manage.py commands other than runserver, which don't answer queries"""
+    if os.path.basename(sys.argv[0]) != 'manage.py':
+        return True
+    return sys.argv[1:2] == ['runserver']
+
+
+def _ensure_search_backend(using, **kwargs):
+    """
+    SQLite drops triggers when a migration rebuilds a table, so re-check
+    the FTS5 triggers after every migrate.
+    """
+    from django.db import connections
+    from .search import install_search_backend
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        install_search_backend(connection)
@@ -0,0 +1,74 @@
+"""
+Conditional GET (ETag / Last-Modified) for catalog reads.
+
+A response's ETag is a hash of the versions of the cache tags it depends
+on ('product', 'category', and 'product:<id>' for a product's details;
+see ecommerce/cache.py) and of what else shapes
+it (path and query string, host, staff or not, format). Checking a
+client's If-None-Match costs one cache round trip and no queries or
+serialization. Response data is cached under the same versions, and
+responses are gzipped by GZipMiddleware.
+
+If the cache is unavailable the endpoints answer normally without validators.
+"""
+import hashlib
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+from ecommerce.cache import cached, tag_state
+
+
+def product_tag(product_id):
+    """Tag of one product's details, for changes lists don't show (stock)"""
+    return f'product:{product_id}'
+
+
+class ConditionalCatalogMixin:
+    """
+    Viewset mixin: conditional_response(request, build) answers 304 when
+    the client's copy is current and otherwise returns build()'s data,
+    cached under its ETag. Sets ETag, Last-Modified and Cache-Control.
+    """
+    catalog_tags = ('product', 'category')
+
+    def list(self, request, *args, **kwargs):
+        parent = super().list
+        return self.conditional_response(request, lambda: parent(request, *args, **kwargs).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        parent = super().retrieve
+        return self.conditional_response(request, lambda: parent(request, *args, **kwargs).data)
+
+    def conditional_response(self, request, build, tags=()):
+        """`tags` are extra tags the response depends on, beyond catalog_tags"""
+        tags = self.catalog_tags + tuple(tags)
+        state = tag_state(tags)
+        if state is None:
+            return Response(build())
+        versions, last_modified, _ = state
+        validators = settings.CATALOG_CONDITIONAL_GET_ENABLED
+
+        fingerprint = repr((
+            versions, request.get_host(), request.get_full_path(),
+            request.user.is_staff, request.accepted_renderer.format,
+        ))
+        etag = quote_etag(hashlib.md5(fingerprint.encode()).hexdigest())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified) if validators else None
+        if response is None:
+            data = cached('catalog', etag, build, tags,
+                          timeout=settings.CATALOG_PAYLOAD_CACHE_SECONDS, state=state)
+            response = Response(data)
+        if not validators:
+            return response
+
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        if request.user.is_authenticated:
+            # Per-user (staff see inactive products; views are tracked): revalidate every time
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True, max_age=settings.CATALOG_CACHE_MAX_AGE)
+        patch_vary_headers(response, ['Accept', 'Authorization'])
+        return response
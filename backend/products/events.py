@@ -0,0 +1,71 @@
+"""
+Publishes ProductInteraction events to a Redis Stream so the ML recommender
+can update in-session recommendations without waiting for the nightly retrain.
+"""
+import logging
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds to stop publishing after a Redis error, so an outage costs one
+# connect timeout per window instead of one per request
+PUBLISH_BACKOFF_SECONDS = 30
+
+_redis_client = None
+_backoff_until = 0.0
+
+
+def get_redis_client():
+    """Return the shared Redis client for interaction events"""
+    global _redis_client
+    if _redis_client is None:
+        import redis
+        _redis_client = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            decode_responses=True,
+            socket_connect_timeout=1,
+            socket_timeout=1,
+        )
+    return _redis_client
+
+
+def publish_interaction(interaction):
+    """
+    Append an interaction to the stream. Publishing is best effort: a Redis
+    outage must never fail the request that produced the interaction.
+    """
+    publish_interactions([interaction])
+
+
+def publish_interactions(interactions):
+    """Append a batch of interactions to the stream in one round trip"""
+    global _backoff_until
+    # Order-level events (payments) carry no item signal
+    interactions = [i for i in interactions if i.product_id is not None]
+    if not settings.INTERACTION_STREAM_ENABLED or not interactions or time.monotonic() < _backoff_until:
+        return
+
+    client = get_redis_client()
+
+    try:
+        pipe = client.pipeline(transaction=False)
+        for interaction in interactions:
+            pipe.xadd(
+                settings.INTERACTION_STREAM_KEY,
+                {
+                    'user_id': interaction.user_id,
+                    'product_id': interaction.product_id,
+                    'interaction_type': interaction.interaction_type,
+                    'session_id': interaction.session_id or '',
+                    'created_at': interaction.created_at.timestamp(),
+                },
+                maxlen=settings.INTERACTION_STREAM_MAXLEN,
+                approximate=True,
+            )
+        pipe.execute()
+    except Exception as e:
+        _backoff_until = time.monotonic() + PUBLISH_BACKOFF_SECONDS
+        logger.warning(f"Failed to publish {len(interactions)} interactions to stream: {e}")
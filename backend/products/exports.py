@@ -0,0 +1,211 @@
+"""
+Streaming export of ML training data.
+
+Rows are read in keyset-ordered chunks and written to the response as they
+arrive, so memory stays flat no matter how large the export window is.
+"""
+import csv
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.renderers import BaseRenderer
+from ecommerce.pagination import keyset_iterator
+from .models import Product, ProductInteraction
+
+EXPORT_CHUNK_SIZE = 2000
+# Rows per chunk handed to the WSGI server, to avoid one write per row
+LINES_PER_WRITE = 500
+# Incremental exports re-read this much before the watermark. Transactions
+# commit out of order (concurrent checkouts and reviews, tracking flushes
+# from several workers), so a row can become visible after an export whose
+# watermark is already past its id or timestamp; clients de-duplicate by id.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+PRODUCT_FIELDS = [
+    'id', 'name', 'description', 'category__name', 'price',
+    'gender', 'color', 'material', 'size', 'stock',
+    'avg_rating', 'review_count', 'interaction_count',
+    'is_active', 'updated_at', 'changed_at',
+]
+INTERACTION_FIELDS = ['id', 'user_id', 'product_id', 'interaction_type', 'rating', 'created_at']
+
+
+def product_export_queryset(since_timestamp=None, include_inactive=False):
+    """
+    Products with their ProductStats figures, optionally only those whose
+    row or stats changed since a timestamp. One LEFT JOIN on the stats
+    primary key; products without a stats row yet export zero counts.
+    changed_at is the later of the product's and its stats' updated_at.
+    """
+    products = Product.objects.all() if include_inactive else Product.objects.filter(is_active=True)
+    products = products.annotate(
+        avg_rating=F('stats__avg_rating'),
+        interaction_count=Coalesce('stats__interaction_count', 0),
+        changed_at=Greatest('updated_at', Coalesce('stats__updated_at', 'updated_at')),
+    )
+    if since_timestamp:
+        products = products.filter(changed_at__gt=since_timestamp - WATERMARK_OVERLAP)
+    return products.order_by('id')
+
+
+def interaction_export_queryset(days, since_id=None, since_timestamp=None):
+    """
+    Interactions of the last `days` days, optionally only those after a
+    watermark, less WATERMARK_OVERLAP: with an id watermark, rows created
+    up to the overlap before the watermark row are re-read as well.
+    """
+    date_threshold = timezone.now() - timedelta(days=days)
+    interactions = ProductInteraction.objects.filter(created_at__gte=date_threshold)
+    if since_id is not None:
+        after = Q(id__gt=since_id)
+        anchor = ProductInteraction.objects.filter(id=since_id).values_list('created_at', flat=True).first()
+        if anchor is not None:
+            after |= Q(created_at__gte=anchor - WATERMARK_OVERLAP)
+        return interactions.filter(after).order_by('id')
+    if since_timestamp:
+        interactions = interactions.filter(created_at__gt=since_timestamp - WATERMARK_OVERLAP)
+    # Matches the (created_at, id) index, so chunks are index range scans
+    return interactions.order_by('created_at', 'id')
+
+
+class _StreamingExportRenderer(BaseRenderer):
+    """
+    Lets `?format=...` through DRF content negotiation. Exports are streamed
+    by the view itself; this only renders error payloads.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, default=_export_default).encode('utf-8')
+
+
+class NDJSONRenderer(_StreamingExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class CSVRenderer(_StreamingExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+def _export_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def parse_watermark(value):
+    """
+    Parse a `since` watermark into (interaction_id, product_updated_at).
+
+    Accepts the token returned by a previous export,
+    "<last interaction id>|<last product updated_at>", or a bare ISO
+    timestamp, which then applies to interaction created_at as well.
+    Either part may be None. Raises ValueError on malformed input.
+    """
+    if '|' in value:
+        id_part, timestamp_part = value.split('|', 1)
+        interaction_id = int(id_part) if id_part else None
+    else:
+        interaction_id, timestamp_part = None, value
+
+    timestamp = None
+    if timestamp_part:
+        timestamp = parse_datetime(timestamp_part)
+        if timestamp is None:
+            raise ValueError(f"Invalid watermark timestamp: {timestamp_part}")
+        if timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp, timezone.utc)
+    return interaction_id, timestamp
+
+
+def make_watermark(interaction_id, product_updated_at):
+    """Format the watermark token that the next incremental export passes back"""
+    timestamp = product_updated_at.isoformat() if product_updated_at else ''
+    return f"{interaction_id or ''}|{timestamp}"
+
+
+class WatermarkTracker:
+    """Tracks the highest interaction id and product changed_at seen in an export"""
+
+    def __init__(self, since=(None, None)):
+        self.interaction_id, self.product_updated_at = since
+
+    def see_product(self, row):
+        changed_at = row.get('changed_at')
+        if changed_at and (self.product_updated_at is None or changed_at > self.product_updated_at):
+            self.product_updated_at = changed_at
+
+    def see_interaction(self, row):
+        if self.interaction_id is None or row['id'] > self.interaction_id:
+            self.interaction_id = row['id']
+
+    @property
+    def token(self):
+        return make_watermark(self.interaction_id, self.product_updated_at)
+
+
+def _batched(lines):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= LINES_PER_WRITE:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def ndjson_stream(products, interactions, metadata, since=(None, None)):
+    """
+    Yield products, then interactions, then a metadata trailer, one JSON
+    object per line, each tagged with a "type". Totals and the next
+    watermark are computed while streaming instead of with extra queries.
+    """
+    def lines():
+        watermark = WatermarkTracker(since)
+        totals = {'product': 0, 'interaction': 0}
+        for record_type, queryset, see in (
+            ('product', products, watermark.see_product),
+            ('interaction', interactions, watermark.see_interaction),
+        ):
+            for row in keyset_iterator(queryset, EXPORT_CHUNK_SIZE):
+                see(row)
+                row['type'] = record_type
+                totals[record_type] += 1
+                yield json.dumps(row, default=_export_default) + '\n'
+        trailer = dict(metadata, type='metadata',
+                       total_products=totals['product'],
+                       total_interactions=totals['interaction'],
+                       watermark=watermark.token)
+        yield json.dumps(trailer, default=_export_default) + '\n'
+
+    return _batched(lines())
+
+
+class _Echo:
+    """File-like object whose write() returns the line, for csv.writer"""
+    def write(self, value):
+        return value
+
+
+def csv_stream(queryset, fields):
+    """Yield a header row and one CSV row per queryset row"""
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow(fields)
+        for row in keyset_iterator(queryset, EXPORT_CHUNK_SIZE):
+            yield writer.writerow([
+                value.isoformat() if isinstance(value, (datetime, date)) else value
+                for value in (row[field] for field in fields)
+            ])
+
+    return _batched(lines())
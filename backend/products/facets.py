@@ -0,0 +1,82 @@
+"""
+Facet counts for the product list filters.
+
+For each dimension (category, gender, size, color, price) the counts come
+from one grouped query over the products matching every filter applied
+except the dimension's own. So with ?color=Black the color counts still
+list every other color ("what would I get instead"), and the other
+dimensions count only black products. Results are cached per filter
+combination for FACETS_CACHE_SECONDS, and dropped as soon as a product or
+category changes.
+"""
+import hashlib
+from django.conf import settings
+from django.db.models import Count, Q
+from ecommerce.cache import cached
+from .models import Product
+
+# Dimension -> model field grouped on
+FACET_FIELDS = {
+    'category': 'category',
+    'gender': 'gender',
+    'size': 'size',
+    'color': 'color',
+}
+# [min, max) price buckets; None means unbounded
+PRICE_RANGES = [(0, 25), (25, 50), (50, 100), (100, 200), (200, None)]
+GENDER_LABELS = dict(Product.GENDER_CHOICES)
+
+
+def cache_key(params, is_staff):
+    """Cache key for one filter combination, independent of parameter order"""
+    items = sorted((key, value) for key in params for value in params.getlist(key))
+    digest = hashlib.md5(repr((is_staff, items)).encode()).hexdigest()
+    return digest
+
+
+def _grouped_counts(queryset, field):
+    rows = queryset.order_by()
+    if field == 'category':
+        rows = rows.values('category', 'category__name').annotate(count=Count('pk'))
+        return [{'value': r['category'], 'label': r['category__name'], 'count': r['count']} for r in rows]
+    # Products without a size or color have no value to filter on
+    rows = rows.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+    rows = rows.values(field).annotate(count=Count('pk'))
+    labels = GENDER_LABELS if field == 'gender' else {}
+    return [
+        {'value': r[field], 'label': labels.get(r[field], r[field]), 'count': r['count']}
+        for r in rows
+    ]
+
+
+def _price_counts(queryset):
+    buckets = {}
+    for i, (low, high) in enumerate(PRICE_RANGES):
+        condition = Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        buckets[f'bucket_{i}'] = Count('pk', filter=condition)
+    counts = queryset.order_by().aggregate(**buckets)
+    return [
+        {'min': low, 'max': high, 'count': counts[f'bucket_{i}']}
+        for i, (low, high) in enumerate(PRICE_RANGES)
+    ]
+
+
+def facet_counts(filtered):
+    """
+    Build the facet payload. `filtered(dimension)` returns the product
+    queryset with every requested filter applied except those on
+    `dimension` (None applies them all).
+    """
+    facets = {}
+    for dimension, field in FACET_FIELDS.items():
+        counts = _grouped_counts(filtered(dimension), field)
+        facets[dimension] = sorted(counts, key=lambda c: (-c['count'], str(c['label'])))
+    facets['price'] = _price_counts(filtered('price'))
+    return {'count': filtered(None).order_by().count(), 'facets': facets}
+
+
+def cached_facet_counts(key, filtered):
+    return cached('facets', key, lambda: facet_counts(filtered), ('product', 'category'),
+                  timeout=settings.FACETS_CACHE_SECONDS)
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from products.snapshots import write_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Write a columnar (.npy) snapshot of products and interactions for ML training'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90,
+                            help='Interactions from the last N days (default: 90)')
+        parser.add_argument('--output-dir', default=None,
+                            help='Snapshot root directory (default: TRAINING_SNAPSHOT_DIR)')
+        parser.add_argument('--keep', type=int, default=None,
+                            help='Number of snapshots to keep (default: TRAINING_SNAPSHOT_KEEP)')
+
+    def handle(self, *args, **options):
+        root = options['output_dir'] or settings.TRAINING_SNAPSHOT_DIR
+        manifest = write_snapshot(days=options['days'], root=root, keep=options['keep'])
+        tables = manifest['tables']
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {manifest['name']} to {root}: {tables['products']['rows']} products, "
+            f"{tables['interactions']['rows']} interactions"
+        ))
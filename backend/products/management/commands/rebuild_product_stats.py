@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from products.stats import rebuild_product_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute ProductStats (review and interaction aggregates) for every product'
+
+    def handle(self, *args, **options):
+        rows = rebuild_product_stats()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {rows} products"))
@@ -0,0 +1,22 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from products.popularity import rollup_day
+
+
+class Command(BaseCommand):
+    help = 'Copy one day of Redis popularity counters into ProductDailyStats (default: yesterday, UTC)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', default=None, help='UTC day to roll up, YYYY-MM-DD')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                day = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['date']}")
+        else:
+            day = timezone.now().date() - timedelta(days=1)
+        rows = rollup_day(day)
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {rows} products for {day}"))
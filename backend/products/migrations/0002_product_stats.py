@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:52
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+
+def backfill_stats(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductReview = apps.get_model('products', 'ProductReview')
+    ProductInteraction = apps.get_model('products', 'ProductInteraction')
+    ProductStats = apps.get_model('products', 'ProductStats')
+
+    stats = {pid: ProductStats(product_id=pid) for pid in Product.objects.values_list('id', flat=True)}
+    for row in ProductReview.objects.values('product_id').annotate(n=Count('id'), total=Sum('rating')).order_by():
+        entry = stats[row['product_id']]
+        entry.review_count, entry.rating_sum = row['n'], row['total'] or 0
+        entry.avg_rating = entry.rating_sum / entry.review_count
+    for row in ProductInteraction.objects.filter(product__isnull=False).values(
+        'product_id', 'interaction_type'
+    ).annotate(n=Count('id')).order_by():
+        entry = stats[row['product_id']]
+        entry.interaction_count += row['n']
+        if row['interaction_type'] in ('view', 'add_to_cart', 'purchase', 'rate'):
+            setattr(entry, f"{row['interaction_type']}_count", row['n'])
+    ProductStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='products.product')),
+                ('review_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('avg_rating', models.FloatField(blank=True, null=True)),
+                ('interaction_count', models.IntegerField(default=0)),
+                ('view_count', models.IntegerField(default=0)),
+                ('add_to_cart_count', models.IntegerField(default=0)),
+                ('purchase_count', models.IntegerField(default=0)),
+                ('rate_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Product stats',
+                'indexes': [models.Index(fields=['updated_at'], name='products_pr_updated_2d85ce_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:54
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_ratings(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductStats = apps.get_model('products', 'ProductStats')
+    stats = ProductStats.objects.filter(product_id=OuterRef('pk'))
+    Product.objects.update(
+        rating=Coalesce(Subquery(stats.values('avg_rating')[:1]), 0.0),
+        review_count=Coalesce(Subquery(stats.values('review_count')[:1]), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['rating'], name='products_pr_rating_c3ba71_idx'),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
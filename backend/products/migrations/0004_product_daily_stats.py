@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_review_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('views', models.IntegerField(default=0)),
+                ('add_to_carts', models.IntegerField(default=0)),
+                ('purchases', models.IntegerField(default=0)),
+                ('unique_viewers', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='products.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Product daily stats',
+                'indexes': [models.Index(fields=['date'], name='products_pr_date_11c27e_idx')],
+                'unique_together': {('product', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:58
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def install_search(apps, schema_editor):
+    from products.search import install_search_backend
+    install_search_backend(schema_editor.connection)
+
+
+def remove_search(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("DROP TRIGGER IF EXISTS products_product_search_vector_trigger ON products_product")
+            cursor.execute("DROP FUNCTION IF EXISTS products_product_search_vector_update()")
+            cursor.execute("DROP INDEX IF EXISTS products_product_search_vector_gin")
+        elif connection.vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS products_product_fts_{suffix}")
+            cursor.execute("DROP TABLE IF EXISTS products_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_daily_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(install_search, remove_search),
+    ]
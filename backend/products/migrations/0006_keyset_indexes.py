@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_search'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='productinteraction',
+            name='products_pr_created_64f935_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at', 'id'], name='products_pr_created_3be21c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productinteraction',
+            index=models.Index(fields=['created_at', 'id'], name='products_pr_created_c32842_idx'),
+        ),
+    ]
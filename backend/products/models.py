@@ -1,4 +1,5 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import User
 
 class Category(models.Model):
@@ -30,6 +31,10 @@ class Product(models.Model):
     color = models.CharField(max_length=50, blank=True, null=True)
     material = models.CharField(max_length=100, blank=True, null=True)
     rating = models.FloatField(default=0, help_text='Average rating from 0 to 5')
+    review_count = models.IntegerField(default=0)
+    # Maintained by a database trigger on PostgreSQL (GIN-indexed); unused
+    # on SQLite, which searches an FTS5 table instead. See search.py.
+    search_vector = SearchVectorField(null=True, editable=False)
     stock = models.IntegerField(default=0)
     image = models.ImageField(upload_to='products/')
     sku = models.CharField(max_length=100, unique=True)
@@ -37,6 +42,28 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Public queries only ever see active products, so the listing
+        # indexes are partial: smaller, and no is_active column to skip.
+        # Each ends in id to serve keyset pagination in either direction.
+        indexes = [
+            # Default listing, newest first
+            models.Index(fields=['created_at', 'id'], condition=models.Q(is_active=True),
+                         name='product_active_created_idx'),
+            # Category pages, newest first
+            models.Index(fields=['category', 'created_at', 'id'], condition=models.Q(is_active=True),
+                         name='product_active_cat_created_idx'),
+            # ?ordering=price and price__gte / price__lte ranges
+            models.Index(fields=['price', 'id'], condition=models.Q(is_active=True),
+                         name='product_active_price_idx'),
+            # ?ordering=-rating and rating__gte
+            models.Index(fields=['rating', 'id'], condition=models.Q(is_active=True),
+                         name='product_active_rating_idx'),
+            # Attribute filters within a category
+            models.Index(fields=['category', 'gender', 'size', 'color'], condition=models.Q(is_active=True),
+                         name='product_active_attrs_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -53,6 +80,10 @@ class ProductReview(models.Model):
     
     class Meta:
         unique_together = ('product', 'user')
+        indexes = [
+            # A product's reviews, newest first (reviews action, detail embed)
+            models.Index(fields=['product', 'created_at', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.rating} stars"
@@ -86,7 +117,7 @@ class ProductInteraction(models.Model):
         indexes = [
             models.Index(fields=['user', 'created_at']),
             models.Index(fields=['product', 'interaction_type']),
-            models.Index(fields=['created_at']),
+            models.Index(fields=['created_at', 'id']),
             models.Index(fields=['interaction_type']),
         ]
         ordering = ['-created_at']
@@ -96,3 +127,50 @@ class ProductInteraction(models.Model):
         return f"{self.user.username} - {self.get_interaction_type_display()} - {product_name}"
     
 
+
+class ProductStats(models.Model):
+    """
+    Per-product review and interaction aggregates, one row per product.
+    Kept current by signals on review and interaction writes (see stats.py)
+    and rebuilt from scratch by `manage.py rebuild_product_stats`, so readers
+    get the numbers with a single join instead of aggregating the
+    reviews and interactions tables.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    review_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    avg_rating = models.FloatField(blank=True, null=True)
+    interaction_count = models.IntegerField(default=0)
+    view_count = models.IntegerField(default=0)
+    add_to_cart_count = models.IntegerField(default=0)
+    purchase_count = models.IntegerField(default=0)
+    rate_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Product stats'
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
+
+    def __str__(self):
+        return f"Stats for product {self.product_id}"
+
+class ProductDailyStats(models.Model):
+    """Daily rollup of the Redis popularity counters (see popularity.py)"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    views = models.IntegerField(default=0)
+    add_to_carts = models.IntegerField(default=0)
+    purchases = models.IntegerField(default=0)
+    unique_viewers = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Product daily stats'
+        unique_together = ('product', 'date')
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"Product {self.product_id} on {self.date}"
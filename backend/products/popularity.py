@@ -0,0 +1,193 @@
+"""
+Real-time popularity counters in Redis.
+
+Every product interaction increments an hourly sorted set per counted type
+(member: product id, score: count), and views add the user to a daily
+HyperLogLog per product for unique-viewer counts:
+
+    pop:{type}:{hour}          ZSET  product_id -> interactions that hour
+    pop:uv:{date}:{product_id} HLL   users who viewed the product that day
+
+Hour buckets are UTC hours since the epoch and expire after
+POPULARITY_RETENTION_HOURS; HyperLogLogs after POPULARITY_UNIQUE_DAYS days.
+Trending merges the last N hour buckets with ZUNIONSTORE and caches the
+merged set for the rest of the current minute. rollup_day() copies one day
+of counters into ProductDailyStats (`manage.py rollup_popularity`).
+"""
+import time
+import logging
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from .events import get_redis_client, PUBLISH_BACKOFF_SECONDS
+from .models import Product, ProductDailyStats
+
+logger = logging.getLogger(__name__)
+
+BUCKET_SECONDS = 3600
+TRENDING_CACHE_SECONDS = 60
+COUNTER_FIELDS = {
+    'view': 'views',
+    'add_to_cart': 'add_to_carts',
+    'purchase': 'purchases',
+}
+# Relative weight of each type in the combined trending score
+TRENDING_WEIGHTS = {
+    'view': 1,
+    'add_to_cart': 3,
+    'purchase': 5,
+}
+
+_backoff_until = 0.0
+
+
+def _hour(timestamp):
+    return int(timestamp // BUCKET_SECONDS)
+
+
+def _counter_key(interaction_type, hour):
+    return f'pop:{interaction_type}:{hour}'
+
+
+def _unique_key(day, product_id):
+    return f'pop:uv:{day.isoformat()}:{product_id}'
+
+
+def _available():
+    return settings.POPULARITY_COUNTERS_ENABLED and time.monotonic() >= _backoff_until
+
+
+def _failed(e):
+    global _backoff_until
+    _backoff_until = time.monotonic() + PUBLISH_BACKOFF_SECONDS
+    logger.warning(f"Popularity counters unavailable: {e}")
+
+
+def record_interactions(interactions):
+    """Count a batch of committed interactions (best effort)"""
+    interactions = [
+        i for i in interactions
+        if i.product_id is not None and i.interaction_type in COUNTER_FIELDS
+    ]
+    if not interactions or not _available():
+        return
+
+    retention = settings.POPULARITY_RETENTION_HOURS * BUCKET_SECONDS
+    unique_ttl = settings.POPULARITY_UNIQUE_DAYS * 86400
+    try:
+        pipe = get_redis_client().pipeline(transaction=False)
+        touched = set()
+        for interaction in interactions:
+            timestamp = interaction.created_at.timestamp()
+            key = _counter_key(interaction.interaction_type, _hour(timestamp))
+            pipe.zincrby(key, 1, interaction.product_id)
+            touched.add((key, retention))
+            if interaction.interaction_type == 'view':
+                day = datetime.fromtimestamp(timestamp, dt_timezone.utc).date()
+                unique_key = _unique_key(day, interaction.product_id)
+                pipe.pfadd(unique_key, interaction.user_id)
+                touched.add((unique_key, unique_ttl))
+        for key, ttl in touched:
+            pipe.expire(key, ttl)
+        pipe.execute()
+    except Exception as e:
+        _failed(e)
+
+
+def trending(hours=24, interaction_type=None, limit=10):
+    """
+    Return [(product_id, score)] for the top products over the last `hours`
+    hours, by one interaction type or by the weighted sum of all of them.
+    Returns None if the counters are unavailable.
+    """
+    if not _available():
+        return None
+    now_hour = _hour(time.time())
+    types = [interaction_type] if interaction_type else list(COUNTER_FIELDS)
+    minute = int(time.time() // TRENDING_CACHE_SECONDS)
+    merged_key = f"pop:trending:{interaction_type or 'all'}:{hours}:{minute}"
+
+    try:
+        client = get_redis_client()
+        if not client.exists(merged_key):
+            weights = {
+                _counter_key(t, hour): TRENDING_WEIGHTS[t] if interaction_type is None else 1
+                for t in types
+                for hour in range(now_hour - hours + 1, now_hour + 1)
+            }
+            pipe = client.pipeline()
+            pipe.zunionstore(merged_key, weights)
+            pipe.expire(merged_key, TRENDING_CACHE_SECONDS * 2)
+            pipe.execute()
+        rows = client.zrevrange(merged_key, 0, limit - 1, withscores=True)
+    except Exception as e:
+        _failed(e)
+        return None
+    return [(int(product_id), score) for product_id, score in rows]
+
+
+def product_counts(product_id, hours=24, days=7):
+    """
+    Interaction counts for one product over the last `hours` hours, and
+    unique viewers over the last `days` days. None if unavailable.
+    """
+    if not _available():
+        return None
+    now_hour = _hour(time.time())
+    today = datetime.now(dt_timezone.utc).date()
+    try:
+        client = get_redis_client()
+        pipe = client.pipeline(transaction=False)
+        for interaction_type in COUNTER_FIELDS:
+            for hour in range(now_hour - hours + 1, now_hour + 1):
+                pipe.zscore(_counter_key(interaction_type, hour), product_id)
+        pipe.pfcount(*[_unique_key(today - timedelta(days=d), product_id) for d in range(days)])
+        results = pipe.execute()
+    except Exception as e:
+        _failed(e)
+        return None
+
+    counts = {'hours': hours}
+    for i, field in enumerate(COUNTER_FIELDS.values()):
+        scores = results[i * hours:(i + 1) * hours]
+        counts[field] = int(sum(score or 0 for score in scores))
+    counts['unique_viewers'] = results[-1]
+    counts['unique_viewer_days'] = days
+    return counts
+
+
+def rollup_day(day: date):
+    """
+    Write one UTC day of counters into ProductDailyStats, replacing any
+    earlier rollup of that day. Returns the number of products written.
+    The day's hour buckets must still be within POPULARITY_RETENTION_HOURS.
+    """
+    start = _hour(datetime(day.year, day.month, day.day, tzinfo=dt_timezone.utc).timestamp())
+    client = get_redis_client()
+
+    rows = {}
+    for interaction_type, field in COUNTER_FIELDS.items():
+        day_key = f'pop:rollup:{interaction_type}:{day.isoformat()}'
+        pipe = client.pipeline()
+        pipe.zunionstore(day_key, [_counter_key(interaction_type, h) for h in range(start, start + 24)])
+        pipe.zrange(day_key, 0, -1, withscores=True)
+        pipe.delete(day_key)
+        for product_id, count in pipe.execute()[1]:
+            product_id = int(product_id)
+            rows.setdefault(product_id, ProductDailyStats(product_id=product_id, date=day))
+            setattr(rows[product_id], field, int(count))
+
+    product_ids = sorted(rows)
+    pipe = client.pipeline(transaction=False)
+    for product_id in product_ids:
+        pipe.pfcount(_unique_key(day, product_id))
+    for product_id, unique_viewers in zip(product_ids, pipe.execute()):
+        rows[product_id].unique_viewers = unique_viewers
+
+    # Products deleted since the interactions were counted have no row to reference
+    existing = set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+    stats = [row for product_id, row in rows.items() if product_id in existing]
+    ProductDailyStats.objects.bulk_create(
+        stats, batch_size=1000, update_conflicts=True, unique_fields=['product', 'date'],
+        update_fields=['views', 'add_to_carts', 'purchases', 'unique_viewers'],
+    )
+    return len(stats)
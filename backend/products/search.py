@@ -0,0 +1,162 @@
+"""
+Full-text product search.
+
+PostgreSQL: Product.search_vector is a tsvector kept current by a trigger
+(name weighted A, material B, description C) and indexed with GIN.
+SQLite: an external-content FTS5 table, products_product_fts, kept in sync
+by triggers. Either way ?search= terms are prefix-matched (every term must
+match), results carry a search_rank annotation, and searches are ordered by
+it unless the client asks for another ordering. Other databases fall back
+to DRF's icontains search.
+"""
+import re
+import logging
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+logger = logging.getLogger(__name__)
+
+MAX_SEARCH_TERMS = 8
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+PRODUCT_TABLE = 'products_product'
+FTS_TABLE = 'products_product_fts'
+# bm25 column weights for (name, material, description)
+FTS_WEIGHTS = '10.0, 4.0, 1.0'
+
+POSTGRES_SEARCH_SQL = [
+    f"""
+    CREATE OR REPLACE FUNCTION {PRODUCT_TABLE}_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.material, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"DROP TRIGGER IF EXISTS {PRODUCT_TABLE}_search_vector_trigger ON {PRODUCT_TABLE}",
+    f"""
+    CREATE TRIGGER {PRODUCT_TABLE}_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF name, material, description ON {PRODUCT_TABLE}
+        FOR EACH ROW EXECUTE FUNCTION {PRODUCT_TABLE}_search_vector_update()
+    """,
+    f"CREATE INDEX IF NOT EXISTS {PRODUCT_TABLE}_search_vector_gin ON {PRODUCT_TABLE} USING gin (search_vector)",
+    # Touching every row fires the trigger once to backfill
+    f"UPDATE {PRODUCT_TABLE} SET name = name",
+]
+
+SQLITE_TRIGGERS_SQL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {PRODUCT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, material, description)
+        VALUES (new.id, new.name, new.material, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {PRODUCT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, material, description)
+        VALUES ('delete', old.id, old.name, old.material, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, material, description ON {PRODUCT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, material, description)
+        VALUES ('delete', old.id, old.name, old.material, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, material, description)
+        VALUES (new.id, new.name, new.material, new.description);
+    END
+    """,
+]
+
+
+def install_search_backend(conn):
+    """
+    Create the trigger/index (PostgreSQL) or FTS5 table and triggers
+    (SQLite) for a database connection. Idempotent; on SQLite it also
+    restores triggers lost when a migration rebuilt the products table, and
+    reindexes if it had to.
+    """
+    with conn.cursor() as cursor:
+        if conn.vendor == 'postgresql':
+            for sql in POSTGRES_SEARCH_SQL:
+                cursor.execute(sql)
+        elif conn.vendor == 'sqlite':
+            tables = conn.introspection.table_names(cursor)
+            if PRODUCT_TABLE not in tables:
+                return
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"name, material, description, content='{PRODUCT_TABLE}', content_rowid='id', "
+                f"tokenize='porter unicode61')"
+            )
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s AND name LIKE %s",
+                [PRODUCT_TABLE, f'{FTS_TABLE}_%'],
+            )
+            if cursor.fetchone()[0] < len(SQLITE_TRIGGERS_SQL):
+                for sql in SQLITE_TRIGGERS_SQL:
+                    cursor.execute(sql)
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def search_terms(text):
+    return TERM_RE.findall(text.lower())[:MAX_SEARCH_TERMS]
+
+
+def search_products(queryset, text):
+    """
+    Filter a Product queryset to full-text matches of `text` (every term
+    as a prefix) and annotate search_rank, higher is better. Returns None
+    if the database has no full-text backend.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config='english')
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        )
+    if connection.vendor == 'sqlite':
+        match = ' AND '.join(f'"{term}"*' for term in terms)
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f"SELECT -bm25({FTS_TABLE}, {FTS_WEIGHTS}) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = {PRODUCT_TABLE}.id",
+                [match], output_field=FloatField(),
+            )
+        )
+    return None
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """`?search=` through the full-text backend, icontains where there is none"""
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '')
+        if not text.strip():
+            return queryset
+        results = search_products(queryset, text)
+        if results is None:
+            return super().filter_queryset(request, queryset, view)
+        return results
+
+
+class ProductOrderingFilter(filters.OrderingFilter):
+    """Orders searches by relevance unless `?ordering=` says otherwise"""
+
+    def get_default_ordering(self, view):
+        ordering = super().get_default_ordering(view)
+        request = view.request
+        search_param = ProductSearchFilter.search_param
+        if (connection.vendor in ('postgresql', 'sqlite')
+                and search_terms(request.query_params.get(search_param, ''))):
+            return ['-search_rank', *(ordering or [])]
+        return ordering
@@ -1,6 +1,22 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import Product, Category, ProductReview, ProductInteraction
 
+# Reviews embedded in product details; the rest are paged by the reviews action
+RECENT_REVIEWS = 5
+
+
+def recent_reviews_prefetch(lookup='reviews'):
+    """
+    Prefetch the RECENT_REVIEWS newest reviews of each product, with their
+    users, into `recent_reviews`: one query for any number of products.
+    """
+    return Prefetch(
+        lookup,
+        queryset=ProductReview.objects.select_related('user').order_by('-created_at', '-id')[:RECENT_REVIEWS],
+        to_attr='recent_reviews',
+    )
+
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -31,15 +47,23 @@ class ProductInteractionSerializer(serializers.ModelSerializer):
 class ProductSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     category_id = serializers.IntegerField(write_only=True)
-    reviews = ProductReviewSerializer(many=True, read_only=True)
+    reviews = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'description', 'category', 'category_id', 'price',
-            'cost_price', 'gender', 'size', 'color', 'material', 'rating',
+            'cost_price', 'gender', 'size', 'color', 'material', 'rating', 'review_count',
             'stock', 'image', 'sku', 'is_active', 'reviews', 'created_at', 'updated_at'
         ]
+        read_only_fields = ['rating', 'review_count']
+
+    def get_reviews(self, obj):
+        """The newest reviews; use recent_reviews_prefetch() when serializing many"""
+        reviews = getattr(obj, 'recent_reviews', None)
+        if reviews is None:
+            reviews = obj.reviews.select_related('user').order_by('-created_at', '-id')[:RECENT_REVIEWS]
+        return ProductReviewSerializer(reviews, many=True).data
 
 
 class ProductListSerializer(serializers.ModelSerializer):
@@ -47,4 +71,4 @@ class ProductListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = ['id', 'name', 'price', 'gender', 'size', 'color', 'rating', 'image', 'category']
+        fields = ['id', 'name', 'price', 'gender', 'size', 'color', 'rating', 'review_count', 'image', 'category']
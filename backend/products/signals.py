@@ -0,0 +1,98 @@
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from .models import Category, Product, ProductInteraction, ProductReview, ProductStats
+from .events import publish_interactions
+from . import popularity
+from .suggest import index as suggest_index
+from ecommerce.cache import invalidate_on_commit
+from .stats import record_interactions, record_review_change
+
+
+def interactions_created(interactions):
+    """
+    Count new interactions into ProductStats, and once committed stream
+    them to the ML service and add them to the popularity counters. Called
+    per row by the post_save receiver and per batch by the tracking buffer,
+    whose bulk_create sends no signals.
+    """
+    counts = {}
+    for interaction in interactions:
+        if interaction.product_id:
+            per_type = counts.setdefault(interaction.product_id, {})
+            per_type[interaction.interaction_type] = per_type.get(interaction.interaction_type, 0) + 1
+    for product_id in sorted(counts):
+        record_interactions(product_id, counts[product_id])
+
+    def after_commit():
+        publish_interactions(interactions)
+        popularity.record_interactions(interactions)
+    transaction.on_commit(after_commit)
+
+
+@receiver(post_save, sender=ProductInteraction)
+def interaction_created(sender, instance, created, **kwargs):
+    if created:
+        interactions_created([instance])
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, raw=False, **kwargs):
+    """Give every product a stats row up front and re-index it for suggestions"""
+    if raw:
+        return
+    if created:
+        ProductStats.objects.get_or_create(product=instance)
+    transaction.on_commit(lambda: suggest_index.update(instance))
+    invalidate_on_commit('product')
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    product_id = instance.id
+    transaction.on_commit(lambda: suggest_index.remove(product_id))
+    invalidate_on_commit('product')
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    """Category names are suggestion keys; re-index after a rename"""
+    if not created:
+        transaction.on_commit(suggest_index.invalidate)
+    # Products embed their category
+    invalidate_on_commit('category', 'product')
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    invalidate_on_commit('category', 'product')
+
+
+@receiver(post_init, sender=ProductReview)
+def review_loaded(sender, instance, **kwargs):
+    """Remember the rating as loaded, so an edit can apply the difference"""
+    instance._loaded_rating = instance.rating
+
+
+@receiver(post_save, sender=ProductReview)
+def review_saved(sender, instance, created, raw=False, **kwargs):
+    """Keep the product's review count and average in step with its reviews"""
+    if raw:
+        return
+    if created:
+        record_review_change(instance.product_id, 1, instance.rating)
+    elif instance.rating != instance._loaded_rating:
+        record_review_change(instance.product_id, 0, instance.rating - instance._loaded_rating)
+    instance._loaded_rating = instance.rating
+    # Product details embed recent reviews
+    invalidate_on_commit('product')
+
+
+@receiver(post_delete, sender=ProductReview)
+def review_deleted(sender, instance, origin=None, **kwargs):
+    origin_model = getattr(origin, 'model', type(origin))
+    if origin_model is Product:
+        # Cascade from deleting the product; its stats row goes with it
+        return
+    record_review_change(instance.product_id, -1, -instance._loaded_rating)
+    invalidate_on_commit('product')
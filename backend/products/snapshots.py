@@ -0,0 +1,237 @@
+"""
+Columnar training snapshots for the ML service.
+
+A snapshot is a directory with one .npy file per column plus a
+manifest.json. Columns are typed (int64, float64 with NaN for NULL, bool,
+datetime64[us] in UTC) and text columns are dictionary-encoded: an int32
+code array, -1 for NULL, next to a JSON list of the distinct values. Rows
+are copied from the DB cursor into memory-mapped arrays chunk by chunk, so
+neither side ever holds the rows as Python objects, and the ML service
+can np.load(..., mmap_mode='r') the columns directly.
+
+Layout:
+    <TRAINING_SNAPSHOT_DIR>/
+        LATEST                       name of the newest complete snapshot
+        snapshot-20240101T000000Z/
+            manifest.json
+            products.id.npy
+            products.category.npy
+            products.category.dict.json
+            ...
+
+Snapshots are written into a hidden temporary directory and renamed into
+place, then LATEST is replaced atomically, so readers never see a partial
+bundle.
+"""
+import os
+import json
+import shutil
+import logging
+import numpy as np
+from datetime import timezone as dt_timezone
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from .exports import product_export_queryset, interaction_export_queryset, make_watermark
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_PREFIX = 'snapshot-'
+LATEST_FILE = 'LATEST'
+SNAPSHOT_CHUNK_SIZE = 5000
+
+# (queryset field, column name, kind)
+PRODUCT_COLUMNS = [
+    ('id', 'id', 'int'),
+    ('name', 'name', 'str'),
+    ('description', 'description', 'str'),
+    ('category__name', 'category', 'str'),
+    ('price', 'price', 'float'),
+    ('gender', 'gender', 'str'),
+    ('color', 'color', 'str'),
+    ('material', 'material', 'str'),
+    ('size', 'size', 'str'),
+    ('stock', 'stock', 'int'),
+    ('avg_rating', 'avg_rating', 'float'),
+    ('review_count', 'review_count', 'int'),
+    ('interaction_count', 'interaction_count', 'int'),
+    ('is_active', 'is_active', 'bool'),
+    ('updated_at', 'updated_at', 'datetime'),
+    ('changed_at', 'changed_at', 'datetime'),
+]
+
+INTERACTION_COLUMNS = [
+    ('id', 'id', 'int'),
+    ('user_id', 'user_id', 'int'),
+    ('product_id', 'product_id', 'int'),
+    ('interaction_type', 'interaction_type', 'str'),
+    ('rating', 'rating', 'float'),
+    ('created_at', 'created_at', 'datetime'),
+]
+
+COLUMN_DTYPES = {
+    'int': np.dtype('int64'),
+    'float': np.dtype('float64'),
+    'bool': np.dtype('bool'),
+    'datetime': np.dtype('datetime64[us]'),
+    'str': np.dtype('int32'),
+}
+
+
+def _naive_utc(value):
+    if value is None:
+        return np.datetime64('NaT')
+    if timezone.is_aware(value):
+        value = value.astimezone(dt_timezone.utc).replace(tzinfo=None)
+    return np.datetime64(value, 'us')
+
+
+class _ColumnWriter:
+    """Fills one memory-mapped column; text values are dictionary-encoded"""
+
+    def __init__(self, directory, table, name, kind, capacity):
+        self.name = name
+        self.kind = kind
+        self.dtype = COLUMN_DTYPES[kind]
+        self.file = f'{table}.{name}.npy'
+        self.array = np.lib.format.open_memmap(
+            os.path.join(directory, self.file), mode='w+', dtype=self.dtype, shape=(capacity,)
+        )
+        self.codes = {} if kind == 'str' else None
+
+    def _encode(self, value):
+        if value is None:
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.codes)
+        return code
+
+    def write(self, start, values):
+        if self.kind == 'str':
+            chunk = np.fromiter((self._encode(v) for v in values), dtype=self.dtype, count=len(values))
+        elif self.kind == 'float':
+            chunk = np.array([np.nan if v is None else float(v) for v in values], dtype=self.dtype)
+        elif self.kind == 'datetime':
+            chunk = np.array([_naive_utc(v) for v in values], dtype=self.dtype)
+        else:
+            chunk = np.array(values, dtype=self.dtype)
+        self.array[start:start + len(chunk)] = chunk
+
+    def close(self, directory, table):
+        """Flush the column and write its dictionary; returns the manifest entry"""
+        self.array.flush()
+        del self.array
+        entry = {'name': self.name, 'file': self.file, 'dtype': str(self.dtype), 'encoding': 'plain'}
+        if self.codes is not None:
+            dictionary_file = f'{table}.{self.name}.dict.json'
+            with open(os.path.join(directory, dictionary_file), 'w') as f:
+                json.dump(list(self.codes), f)
+            entry.update(encoding='dictionary', dictionary=dictionary_file, null_code=-1)
+        return entry
+
+
+def _write_table(directory, table, queryset, columns):
+    """
+    Stream a queryset into one column file per field. The queryset must be
+    bounded (e.g. by id) so its count is the capacity of the columns; rows
+    that appear after counting are left for the next snapshot.
+    """
+    fields = [field for field, _, _ in columns]
+    capacity = queryset.count()
+    writers = [_ColumnWriter(directory, table, name, kind, capacity) for _, name, kind in columns]
+
+    rows = 0
+    chunk = []
+
+    def flush():
+        for i, writer in enumerate(writers):
+            writer.write(rows, [row[i] for row in chunk])
+        return len(chunk)
+
+    for row in queryset.values_list(*fields).iterator(chunk_size=SNAPSHOT_CHUNK_SIZE):
+        if rows + len(chunk) >= capacity:
+            break
+        chunk.append(row)
+        if len(chunk) >= SNAPSHOT_CHUNK_SIZE:
+            rows += flush()
+            chunk = []
+    if chunk:
+        rows += flush()
+
+    # Rows deleted while copying leave unused tail slots; the manifest row
+    # count tells readers where the data ends
+    return {'rows': rows, 'columns': [writer.close(directory, table) for writer in writers]}
+
+
+def write_snapshot(days=90, root=None, keep=None):
+    """
+    Write a products + interactions snapshot of the last `days` days and
+    point LATEST at it. Returns the manifest.
+    """
+    root = str(root or settings.TRAINING_SNAPSHOT_DIR)
+    keep = settings.TRAINING_SNAPSHOT_KEEP if keep is None else keep
+    os.makedirs(root, exist_ok=True)
+
+    generated_at = timezone.now()
+    name = SNAPSHOT_PREFIX + generated_at.strftime('%Y%m%dT%H%M%S%fZ')
+    tmp_dir = os.path.join(root, f'.{name}.tmp')
+    os.makedirs(tmp_dir)
+
+    try:
+        # Bound both tables by the ids present now so counts match contents.
+        # Interactions without a product (order-level events) carry no item
+        # signal and are left out.
+        interactions = interaction_export_queryset(days).filter(product__isnull=False)
+        max_interaction_id = interactions.aggregate(max_id=Max('id'))['max_id'] or 0
+        interactions = interactions.filter(id__lte=max_interaction_id).order_by('id')
+
+        products = product_export_queryset()
+        bounds = products.order_by().aggregate(max_id=Max('id'), max_changed=Max('changed_at'))
+        products = products.filter(id__lte=bounds['max_id'] or 0)
+
+        manifest = {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'generated_at': generated_at.isoformat(),
+            'date_range_days': days,
+            'watermark': make_watermark(max_interaction_id or None, bounds['max_changed']),
+            'tables': {
+                'products': _write_table(tmp_dir, 'products', products, PRODUCT_COLUMNS),
+                'interactions': _write_table(tmp_dir, 'interactions', interactions, INTERACTION_COLUMNS),
+            },
+        }
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        os.rename(tmp_dir, os.path.join(root, name))
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    latest_tmp = os.path.join(root, f'.{LATEST_FILE}.tmp')
+    with open(latest_tmp, 'w') as f:
+        f.write(name)
+    os.replace(latest_tmp, os.path.join(root, LATEST_FILE))
+
+    manifest['name'] = name
+    logger.info(
+        f"Wrote training snapshot {name}: {manifest['tables']['products']['rows']} products, "
+        f"{manifest['tables']['interactions']['rows']} interactions"
+    )
+    prune_snapshots(root, keep)
+    return manifest
+
+
+def prune_snapshots(root, keep):
+    """Delete all but the `keep` newest snapshots (never the one in LATEST)"""
+    try:
+        with open(os.path.join(root, LATEST_FILE)) as f:
+            latest = f.read().strip()
+    except FileNotFoundError:
+        latest = None
+
+    names = sorted(n for n in os.listdir(root) if n.startswith(SNAPSHOT_PREFIX))
+    for name in names[:max(len(names) - keep, 0)]:
+        if name != latest:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
@@ -0,0 +1,121 @@
+"""
+Maintenance of the ProductStats aggregate and the Product.rating and
+Product.review_count columns derived from it.
+
+Interaction and review writes apply their deltas with F() expressions
+inside the writing transaction, so concurrent writers serialize on the
+stats row instead of overwriting each other. rebuild_product_stats()
+recomputes every row from two grouped queries (reviews and interactions
+aggregated separately, so no join fan-out) and is the periodic rollup that
+corrects any drift, e.g. from rows deleted in bulk.
+"""
+import logging
+from django.db.models import Case, Count, F, FloatField, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+from .models import Product, ProductReview, ProductInteraction, ProductStats
+from ecommerce.cache import invalidate_on_commit
+
+logger = logging.getLogger(__name__)
+
+# Interaction types with their own counter column
+COUNTED_INTERACTION_TYPES = {
+    'view': 'view_count',
+    'add_to_cart': 'add_to_cart_count',
+    'purchase': 'purchase_count',
+    'rate': 'rate_count',
+}
+REBUILD_BATCH_SIZE = 1000
+
+
+def _upsert(product_id, **updates):
+    """Apply updates to a product's stats row, creating the row if missing"""
+    updates['updated_at'] = timezone.now()
+    if ProductStats.objects.filter(product_id=product_id).update(**updates):
+        return
+    ProductStats.objects.get_or_create(product_id=product_id)
+    ProductStats.objects.filter(product_id=product_id).update(**updates)
+
+
+def record_interactions(product_id, counts):
+    """Add {interaction_type: n} to a product's interaction counters"""
+    updates = {}
+    total = 0
+    for interaction_type, n in counts.items():
+        total += n
+        column = COUNTED_INTERACTION_TYPES.get(interaction_type)
+        if column:
+            updates[column] = F(column) + n
+    if total:
+        _upsert(product_id, interaction_count=F('interaction_count') + total, **updates)
+
+
+def record_review_change(product_id, count_delta, rating_delta):
+    """
+    Apply a review create (+1, +rating), delete (-1, -rating) or rating
+    edit (0, new - old) to the product's stats, then copy the new average
+    and count onto the product row.
+    """
+    review_count = F('review_count') + count_delta
+    rating_sum = F('rating_sum') + rating_delta
+    _upsert(
+        product_id,
+        review_count=review_count,
+        rating_sum=rating_sum,
+        # Right-hand sides see the row as it was before this UPDATE
+        avg_rating=Case(
+            When(review_count__gt=-count_delta,
+                 then=Cast(rating_sum, FloatField()) / review_count),
+            default=None,
+            output_field=FloatField(),
+        ),
+    )
+    sync_product_ratings(Product.objects.filter(pk=product_id))
+
+
+def sync_product_ratings(products=None):
+    """Copy avg_rating and review_count from ProductStats onto Product rows"""
+    products = Product.objects.all() if products is None else products
+    stats = ProductStats.objects.filter(product_id=OuterRef('pk'))
+    return products.update(
+        rating=Coalesce(Subquery(stats.values('avg_rating')[:1]), 0.0),
+        review_count=Coalesce(Subquery(stats.values('review_count')[:1]), 0),
+    )
+
+
+def rebuild_product_stats():
+    """Recompute all ProductStats rows; returns the number of rows written"""
+    stats = {pid: ProductStats(product_id=pid) for pid in Product.objects.values_list('id', flat=True)}
+
+    for row in ProductReview.objects.values('product_id').annotate(
+        review_count=Count('id'), rating_sum=Sum('rating')
+    ).order_by():
+        entry = stats.get(row['product_id'])
+        if entry:
+            entry.review_count = row['review_count']
+            entry.rating_sum = row['rating_sum'] or 0
+            entry.avg_rating = entry.rating_sum / entry.review_count
+
+    for row in ProductInteraction.objects.filter(product__isnull=False).values(
+        'product_id', 'interaction_type'
+    ).annotate(n=Count('id')).order_by():
+        entry = stats.get(row['product_id'])
+        if entry:
+            entry.interaction_count += row['n']
+            column = COUNTED_INTERACTION_TYPES.get(row['interaction_type'])
+            if column:
+                setattr(entry, column, row['n'])
+
+    now = timezone.now()
+    for entry in stats.values():
+        entry.updated_at = now
+    fields = ['review_count', 'rating_sum', 'avg_rating', 'interaction_count',
+              *COUNTED_INTERACTION_TYPES.values(), 'updated_at']
+    ProductStats.objects.bulk_create(
+        stats.values(), batch_size=REBUILD_BATCH_SIZE,
+        update_conflicts=True, unique_fields=['product'], update_fields=fields,
+    )
+    sync_product_ratings()
+    invalidate_on_commit('product')
+    logger.info(f"Rebuilt stats for {len(stats)} products")
+    return len(stats)
@@ -0,0 +1,174 @@
+"""
+In-memory prefix index for search-as-you-type suggestions.
+
+Every active product contributes sorted (key, tier, product_id) entries:
+its normalized name (tier 0), each later word-boundary suffix of the name
+(tier 1, so "shirt" and "blue t" both find "Classic Blue T-Shirt"), its SKU
+(tier 2) and its category name (tier 3). A prefix lookup is a binary search
+to the first key >= the query followed by a scan while keys still start
+with it, so queries never touch the database.
+
+Each process starts building the index in a background thread when the
+app loads (ProductsConfig.ready) and answers with no suggestions until it
+is ready, so no request waits for a build. The index is kept current by
+product save/delete signals in that process, and rebuilt in the background
+every SUGGEST_INDEX_TTL seconds to pick up writes made by other processes.
+"""
+import re
+import time
+import bisect
+import logging
+import threading
+import unicodedata
+from django.conf import settings
+from django.db import connection
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+# Entries examined per query before ranking; bounds very short prefixes
+MAX_SCAN = 256
+NON_ALNUM_RE = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse punctuation to single spaces"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = text.encode('ascii', 'ignore').decode('ascii').lower()
+    return NON_ALNUM_RE.sub(' ', text).strip()
+
+
+def _product_keys(name, sku, category):
+    normalized = normalize(name)
+    keys = [(normalized, 0)] if normalized else []
+    words = normalized.split(' ')
+    keys.extend((' '.join(words[i:]), 1) for i in range(1, len(words)))
+    if sku:
+        keys.append((normalize(sku), 2))
+    if category:
+        keys.append((normalize(category), 3))
+    return [(key, tier) for key, tier in keys if key]
+
+
+class SuggestIndex:
+    """Sorted-array prefix index over product names, SKUs and categories"""
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._entries = []
+        self._names = {}
+        self._keys = {}
+        self._built_at = None
+        self._stale = False
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._rebuilding = False
+
+    def build(self):
+        """(Re)load all active products; the swap is atomic for readers"""
+        started = time.perf_counter()
+        # Cleared before reading, so an invalidate() during the build still counts
+        self._stale = False
+        entries, names, keys = [], {}, {}
+        rows = Product.objects.filter(is_active=True).values_list(
+            'id', 'name', 'sku', 'category__name'
+        ).iterator(chunk_size=5000)
+        for product_id, name, sku, category in rows:
+            product_keys = _product_keys(name, sku, category)
+            names[product_id] = name
+            keys[product_id] = product_keys
+            entries.extend((key, tier, product_id) for key, tier in product_keys)
+        entries.sort()
+        with self._lock:
+            self._entries, self._names, self._keys = entries, names, keys
+            self._built_at = time.monotonic()
+            self._rebuilding = False
+        logger.info(f"Built suggest index: {len(names)} products, {len(entries)} keys "
+                    f"in {time.perf_counter() - started:.2f}s")
+
+    def start_build(self):
+        """Build or rebuild in a background thread, unless one is running"""
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._background_build, name='suggest-index', daemon=True).start()
+
+    def _ensure_fresh(self):
+        if self._built_at is None or self._stale or time.monotonic() - self._built_at > self.ttl:
+            self.start_build()
+
+    def _background_build(self):
+        try:
+            with self._build_lock:
+                self.build()
+        except Exception as e:
+            logger.error(f"Suggest index build failed: {e}")
+            self._rebuilding = False
+        finally:
+            connection.close()
+
+    def update(self, product):
+        """Re-index one product; inactive products are removed"""
+        if self._built_at is None:
+            return
+        category = product.category.name if product.category_id else None
+        product_keys = _product_keys(product.name, product.sku, category) if product.is_active else []
+        with self._lock:
+            self._remove_locked(product.id)
+            if product_keys:
+                self._names[product.id] = product.name
+                self._keys[product.id] = product_keys
+                for key, tier in product_keys:
+                    bisect.insort(self._entries, (key, tier, product.id))
+
+    def remove(self, product_id):
+        if self._built_at is None:
+            return
+        with self._lock:
+            self._remove_locked(product_id)
+
+    def _remove_locked(self, product_id):
+        for key, tier in self._keys.pop(product_id, ()):
+            entry = (key, tier, product_id)
+            i = bisect.bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+        self._names.pop(product_id, None)
+
+    def invalidate(self):
+        """Rebuild in the background on the next query (e.g. after a category rename)"""
+        self._stale = True
+
+    def suggest(self, query, limit=8):
+        """
+        Return up to `limit` {'id', 'name'} dicts for a prefix query; none
+        until the first build has finished
+        """
+        self._ensure_fresh()
+        prefix = normalize(query)
+        if not prefix:
+            return []
+
+        with self._lock:
+            entries, names = self._entries, self._names
+            best = {}
+            i = bisect.bisect_left(entries, (prefix,))
+            end = min(len(entries), i + MAX_SCAN)
+            while i < end and entries[i][0].startswith(prefix):
+                _, tier, product_id = entries[i]
+                if tier < best.get(product_id, 4):
+                    best[product_id] = tier
+                i += 1
+            ranked = sorted(best.items(), key=lambda item: (item[1], len(names[item[0]]), names[item[0]]))
+            return [{'id': product_id, 'name': names[product_id]} for product_id, _ in ranked[:limit]]
+
+    def stats(self):
+        return {
+            'products': len(self._names),
+            'keys': len(self._entries),
+            'age_seconds': None if self._built_at is None else time.monotonic() - self._built_at,
+        }
+
+
+index = SuggestIndex(ttl=settings.SUGGEST_INDEX_TTL)
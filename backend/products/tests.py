@@ -0,0 +1,660 @@
+import threading
+from unittest import mock, skipUnless
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection, models
+from django.http import QueryDict
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+from ecommerce.cache import invalidate
+from . import events, search as search_module
+from .facets import cache_key
+from .models import Category, Product, ProductInteraction, ProductReview
+from .serializers import RECENT_REVIEWS
+from .suggest import SuggestIndex
+from .tracking import InteractionBuffer, write_interactions
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+# Local cache, no payload caching: every request runs its queries
+TEST_SETTINGS = dict(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    API_CACHE_ENABLED=False,
+    POPULARITY_COUNTERS_ENABLED=False,
+    INTERACTION_STREAM_ENABLED=False,
+)
+
+
+def create_products(category, count, start=0):
+    return [
+        Product.objects.create(
+            name=f'Product {i}', description='', category=category, price=10 + i,
+            sku=f'SKU-{i}', stock=5, gender='M', size='M', color='Black',
+        )
+        for i in range(start, start + count)
+    ]
+
+
+@override_settings(**TEST_SETTINGS)
+class ProductQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Shirts')
+        cls.users = [User.objects.create(username=f'user{i}') for i in range(3)]
+        cls.products = create_products(cls.category, 3)
+        for product in cls.products:
+            cls.add_reviews(product)
+
+    @classmethod
+    def add_reviews(cls, product):
+        for user in cls.users:
+            ProductReview.objects.create(product=product, user=user, rating=4, title='Good', comment='')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_list_queries_do_not_grow_with_products(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/products/products/')
+        self.assertEqual(len(response.data['results']), 3)
+
+        for product in create_products(self.category, 7, start=3):
+            self.add_reviews(product)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/products/products/')
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_detail_loads_recent_reviews_in_one_query(self):
+        product = self.products[0]
+        for i in range(RECENT_REVIEWS):
+            user = User.objects.create(username=f'reviewer{i}')
+            ProductReview.objects.create(product=product, user=user, rating=5, title='Great', comment='')
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/products/products/{product.pk}/')
+        self.assertEqual(len(response.data['reviews']), RECENT_REVIEWS)
+
+
+class ProductListingIndexTests(TestCase):
+    """The public listings are served by the partial indexes on active products"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Shirts')
+        create_products(category, 20)
+
+    def assertUsesIndex(self, queryset, index):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN is SQLite only')
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn(index, plan)
+
+    def test_default_listing(self):
+        self.assertUsesIndex(
+            Product.objects.filter(is_active=True).order_by('-created_at', '-id'),
+            'product_active_created_idx',
+        )
+
+    def test_category_listing(self):
+        self.assertUsesIndex(
+            Product.objects.filter(is_active=True, category=1).order_by('-created_at', '-id'),
+            'product_active_cat_created_idx',
+        )
+
+    def test_price_range(self):
+        self.assertUsesIndex(
+            Product.objects.filter(is_active=True, price__gte=12, price__lte=20).order_by('price', 'id'),
+            'product_active_price_idx',
+        )
+
+    def test_rating_filter(self):
+        self.assertUsesIndex(
+            Product.objects.filter(is_active=True, rating__gte=4).order_by('-rating', '-id'),
+            'product_active_rating_idx',
+        )
+
+
+class InteractionBufferTests(TestCase):
+    def setUp(self):
+        worker = mock.patch.object(InteractionBuffer, '_ensure_worker')
+        worker.start()
+        self.addCleanup(worker.stop)
+        self.writes = []
+        self.bad = set()
+        write = mock.patch('products.tracking.write_interactions', side_effect=self.write)
+        write.start()
+        self.addCleanup(write.stop)
+
+    def write(self, events):
+        if self.bad & {event['product_id'] for event in events}:
+            raise ValueError('bad event')
+        self.writes.append([event['product_id'] for event in events])
+        return events
+
+    def event(self, product_id, interaction_type='add_to_cart', user_id=1, session_id='s1'):
+        return {'user_id': user_id, 'product_id': product_id, 'interaction_type': interaction_type,
+                'session_id': session_id, 'rating': None}
+
+    def test_repeat_views_are_collapsed(self):
+        buffer = InteractionBuffer()
+        self.assertTrue(buffer.add(self.event(1, 'view')))
+        self.assertFalse(buffer.add(self.event(1, 'view')))
+        self.assertTrue(buffer.add(self.event(1, 'view', session_id='s2')))
+        self.assertTrue(buffer.add(self.event(1, 'view', user_id=2)))
+        self.assertTrue(buffer.add(self.event(1)))
+        self.assertTrue(buffer.add(self.event(1)))
+        self.assertEqual(buffer.stats()['pending'], 5)
+
+    def test_repeat_view_counts_again_after_dedup_window(self):
+        buffer = InteractionBuffer(view_dedup_seconds=60)
+        with mock.patch('products.tracking.time.monotonic', return_value=1000):
+            buffer.add(self.event(1, 'view'))
+        with mock.patch('products.tracking.time.monotonic', return_value=1061):
+            self.assertTrue(buffer.add(self.event(1, 'view')))
+
+    def test_full_batch_wakes_the_flusher(self):
+        buffer = InteractionBuffer(batch_size=3)
+        buffer.add(self.event(1))
+        buffer.add(self.event(2))
+        self.assertFalse(buffer._wakeup.is_set())
+        buffer.add(self.event(3))
+        self.assertTrue(buffer._wakeup.is_set())
+
+    def test_flusher_writes_every_interval(self):
+        buffer = InteractionBuffer(flush_interval=0.01)
+        flushed = threading.Event()
+        with mock.patch.object(buffer, 'flush', side_effect=flushed.set):
+            threading.Thread(target=buffer._run, daemon=True).start()
+            self.assertTrue(flushed.wait(5))
+
+    def test_flush_writes_in_batches(self):
+        buffer = InteractionBuffer(batch_size=2)
+        for product_id in range(1, 6):
+            buffer.add(self.event(product_id))
+        self.assertEqual(buffer.flush(), 5)
+        self.assertEqual(self.writes, [[1, 2], [3, 4], [5]])
+        self.assertEqual(buffer.stats()['pending'], 0)
+
+    def test_bad_event_is_dropped_and_counted(self):
+        buffer = InteractionBuffer(batch_size=4)
+        self.bad = {3}
+        for product_id in range(1, 6):
+            buffer.add(self.event(product_id))
+        with self.assertLogs('products.tracking', 'WARNING') as logs:
+            self.assertEqual(buffer.flush(), 4)
+        self.assertEqual(sorted(sum(self.writes, [])), [1, 2, 4, 5])
+        self.assertEqual(buffer.stats()['pending'], 0)
+        self.assertEqual(buffer.stats()['dropped'], 1)
+        self.assertIn("'product_id': 3", '\n'.join(logs.output))
+
+    def test_batches_wait_while_database_is_down(self):
+        buffer = InteractionBuffer(batch_size=2, max_pending=4)
+        self.bad = {1, 2, 3, 4}
+        for product_id in range(1, 5):
+            buffer.add(self.event(product_id))
+        with mock.patch('products.tracking._database_reachable', return_value=False), \
+                self.assertLogs('products.tracking', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.stats()['pending'], 4)
+        self.assertEqual(buffer.stats()['dropped'], 0)
+
+        self.bad = set()
+        self.assertEqual(buffer.flush(), 4)
+        self.assertEqual(sorted(sum(self.writes, [])), [1, 2, 3, 4])
+
+    def test_full_buffer_counts_dropped_events(self):
+        buffer = InteractionBuffer(batch_size=2, max_pending=3)
+        for product_id in range(1, 5):
+            buffer.add(self.event(product_id))
+        self.assertEqual(buffer.stats()['dropped'], 1)
+
+        # Events queued while a failed batch was out overflow it on requeue
+        batch = [buffer._pending.popleft(), buffer._pending.popleft()]
+        buffer.add(self.event(5))
+        buffer.add(self.event(6))
+        buffer._requeue(batch)
+        self.assertEqual(buffer.stats()['pending'], 3)
+        self.assertEqual(buffer.stats()['dropped'], 3)
+
+
+@skipUnless(fakeredis, 'fakeredis is not installed')
+@override_settings(**dict(TEST_SETTINGS, INTERACTION_STREAM_ENABLED=True, INTERACTION_STREAM_KEY='test:stream'))
+class InteractionStreamTests(TestCase):
+    """Interactions reach the stream in the format the ML service reads"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='shopper')
+        cls.products = create_products(Category.objects.create(name='Shirts'), 2)
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        patcher = mock.patch.object(events, '_redis_client', self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, events, '_backoff_until', 0.0)
+
+    def entries(self):
+        return [fields for _, fields in self.redis.xrange('test:stream')]
+
+    def test_interactions_are_published_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = ProductInteraction.objects.create(
+                user=self.user, product=self.products[0], interaction_type='view', session_id='abc',
+            )
+            write_interactions([
+                {'user_id': self.user.pk, 'product_id': product.pk, 'interaction_type': 'purchase',
+                 'session_id': None, 'rating': None}
+                for product in self.products
+            ])
+            self.assertEqual(self.entries(), [])
+
+        entries = self.entries()
+        self.assertEqual(entries[0], {
+            'user_id': str(self.user.pk), 'product_id': str(self.products[0].pk), 'interaction_type': 'view',
+            'session_id': 'abc', 'created_at': str(first.created_at.timestamp()),
+        })
+        self.assertEqual([(int(e['product_id']), e['interaction_type'], e['session_id']) for e in entries[1:]],
+                         [(product.pk, 'purchase', '') for product in self.products])
+        self.assertTrue(all(float(e['created_at']) > 0 for e in entries))
+
+    def test_order_level_events_are_not_published(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductInteraction.objects.create(user=self.user, interaction_type='purchase', session_id='ORD-1')
+        self.assertEqual(self.entries(), [])
+
+    def test_outage_backs_off_without_failing_the_write(self):
+        with mock.patch.object(self.redis, 'pipeline', side_effect=ConnectionError('down')) as pipeline, \
+                self.assertLogs('products.events', 'WARNING'):
+            for product in self.products:
+                with self.captureOnCommitCallbacks(execute=True):
+                    ProductInteraction.objects.create(user=self.user, product=product, interaction_type='view')
+        # The second event falls in the backoff window
+        self.assertEqual(pipeline.call_count, 1)
+        self.assertEqual(ProductInteraction.objects.count(), 2)
+
+    @override_settings(INTERACTION_STREAM_ENABLED=False)
+    def test_disabled(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductInteraction.objects.create(user=self.user, product=self.products[0], interaction_type='view')
+        self.assertEqual(self.entries(), [])
+
+
+def search(client, text, **params):
+    response = client.get('/api/products/products/', {'search': text, **params})
+    return [product['name'] for product in response.data['results']]
+
+
+@skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'No full-text backend')
+@override_settings(**TEST_SETTINGS)
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Jackets')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def create(self, name, material='', description='', price=50):
+        return Product.objects.create(
+            name=name, description=description, material=material, category=self.category,
+            price=price, sku=name.upper().replace(' ', '-'), stock=1,
+        )
+
+    def test_results_follow_create_update_and_delete(self):
+        self.assertEqual(search(self.client, 'parka'), [])
+        product = self.create('Winter Parka')
+        self.assertEqual(search(self.client, 'parka'), ['Winter Parka'])
+
+        product.name = 'Winter Anorak'
+        product.save()
+        self.assertEqual(search(self.client, 'parka'), [])
+        self.assertEqual(search(self.client, 'anorak'), ['Winter Anorak'])
+
+        product.delete()
+        self.assertEqual(search(self.client, 'anorak'), [])
+
+    def test_terms_are_prefixes_and_all_must_match(self):
+        self.create('Denim Jacket', material='Cotton')
+        self.create('Leather Jacket', material='Leather')
+        self.assertEqual(sorted(search(self.client, 'jack')), ['Denim Jacket', 'Leather Jacket'])
+        self.assertEqual(search(self.client, 'jack cott'), ['Denim Jacket'])
+        self.assertEqual(search(self.client, 'jacket wool'), [])
+
+    def test_ranked_by_field_weight_unless_ordered(self):
+        self.create('Plain Tee', description='Goes well with a wool scarf', price=20)
+        self.create('Wool Coat', price=80)
+        self.create('Field Sweater', material='Wool', price=60)
+        self.assertEqual(search(self.client, 'wool'), ['Wool Coat', 'Field Sweater', 'Plain Tee'])
+        self.assertEqual(search(self.client, 'wool', ordering='price'), ['Plain Tee', 'Field Sweater', 'Wool Coat'])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'FTS5 triggers are SQLite only')
+@override_settings(**TEST_SETTINGS)
+class SearchTriggerTests(TransactionTestCase):
+    def triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s",
+                           [search_module.PRODUCT_TABLE])
+            return {row[0] for row in cursor.fetchall()}
+
+    def test_triggers_restored_after_table_rebuild(self):
+        category = Category.objects.create(name='Jackets')
+        product = Product.objects.create(name='Rain Shell', description='', category=category,
+                                         price=90, sku='SHELL', stock=1)
+        expected = self.triggers()
+        self.assertEqual(len(expected), len(search_module.SQLITE_TRIGGERS_SQL))
+
+        # A migration that alters a column makes SQLite copy the table,
+        # which drops its triggers
+        old_field = Product._meta.get_field('material')
+        new_field = models.CharField(max_length=120, blank=True, null=True)
+        new_field.set_attributes_from_name('material')
+        with connection.schema_editor() as editor:
+            editor.alter_field(Product, old_field, new_field)
+        self.assertEqual(self.triggers(), set())
+
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+        self.assertEqual(self.triggers(), expected)
+        client = APIClient()
+        self.assertEqual(search(client, 'shell'), ['Rain Shell'])
+        product.name = 'Storm Shell'
+        product.save()
+        self.assertEqual(search(client, 'storm'), ['Storm Shell'])
+
+        with connection.schema_editor() as editor:
+            editor.alter_field(Product, new_field, old_field)
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+
+
+@override_settings(**TEST_SETTINGS)
+class FacetsTests(TestCase):
+    url = '/api/products/products/facets/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shirts = Category.objects.create(name='Shirts')
+        cls.jackets = Category.objects.create(name='Jackets')
+        for sku, (category, gender, size, color, price, material) in enumerate([
+            (cls.shirts, 'M', 'M', 'Black', 20, 'cotton'),
+            (cls.shirts, 'M', 'L', 'White', 30, 'cotton'),
+            (cls.shirts, 'W', 'S', 'Black', 60, 'linen'),
+            (cls.jackets, 'W', 'M', 'Black', 150, 'wool'),
+            (cls.jackets, 'U', None, 'Red', 250, 'wool'),
+        ]):
+            Product.objects.create(
+                name=f'Product {sku}', description='', category=category, gender=gender, size=size,
+                color=color, price=price, material=material, sku=f'SKU-{sku}', stock=5,
+            )
+        Product.objects.create(
+            name='Hidden', description='', category=cls.shirts, gender='M', size='M', color='Black',
+            price=20, material='cotton', sku='SKU-hidden', stock=5, is_active=False,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def counts(self, data, dimension):
+        return {c['value']: c['count'] for c in data['facets'][dimension]}
+
+    def price_counts(self, data):
+        return [c['count'] for c in data['facets']['price']]
+
+    def test_counts_without_filters(self):
+        data = self.get()
+        self.assertEqual(data['count'], 5)
+        self.assertEqual(data['facets']['category'], [
+            {'value': self.shirts.pk, 'label': 'Shirts', 'count': 3},
+            {'value': self.jackets.pk, 'label': 'Jackets', 'count': 2},
+        ])
+        self.assertEqual(data['facets']['gender'][0], {'value': 'M', 'label': 'Men', 'count': 2})
+        self.assertEqual(self.counts(data, 'gender'), {'M': 2, 'W': 2, 'U': 1})
+        # Products without a size aren't counted under an empty value
+        self.assertEqual(self.counts(data, 'size'), {'M': 2, 'L': 1, 'S': 1})
+        self.assertEqual(self.counts(data, 'color'), {'Black': 3, 'White': 1, 'Red': 1})
+        self.assertEqual(self.price_counts(data), [1, 1, 1, 1, 1])
+
+    def test_each_dimension_ignores_its_own_filter(self):
+        data = self.get(color='Black')
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(self.counts(data, 'color'), {'Black': 3, 'White': 1, 'Red': 1})
+        self.assertEqual(self.counts(data, 'gender'), {'M': 1, 'W': 2})
+        self.assertEqual(self.counts(data, 'category'), {self.shirts.pk: 2, self.jackets.pk: 1})
+
+        data = self.get(color='Black', gender='W')
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(self.counts(data, 'color'), {'Black': 2})
+        self.assertEqual(self.counts(data, 'gender'), {'M': 1, 'W': 2})
+        self.assertEqual(self.counts(data, 'size'), {'S': 1, 'M': 1})
+
+    def test_price_range_filters(self):
+        data = self.get(price__gte=50, price__lte=200)
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(self.price_counts(data), [1, 1, 1, 1, 1])
+        self.assertEqual(self.counts(data, 'color'), {'Black': 2})
+
+    @skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'No full-text backend')
+    def test_search_is_applied_to_every_dimension(self):
+        data = self.get(search='wool')
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(self.counts(data, 'category'), {self.jackets.pk: 2})
+        self.assertEqual(self.counts(data, 'color'), {'Black': 1, 'Red': 1})
+        self.assertEqual(self.price_counts(data), [0, 0, 0, 1, 1])
+
+    def test_invalid_filters_are_rejected(self):
+        for params in ({'price__gte': 'cheap'}, {'category': 9999}, {'gender': 'X'}):
+            with self.subTest(**params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+    def test_cache_key_ignores_order_but_not_staff(self):
+        self.assertEqual(cache_key(QueryDict('color=Black&size=M'), False),
+                         cache_key(QueryDict('size=M&color=Black'), False))
+        self.assertNotEqual(cache_key(QueryDict('color=Black'), False), cache_key(QueryDict('color=Black'), True))
+        self.assertNotEqual(cache_key(QueryDict('color=Black'), False), cache_key(QueryDict('color=Red'), False))
+
+    @override_settings(API_CACHE_ENABLED=True)
+    def test_staff_counts_are_cached_separately(self):
+        cache.clear()
+        self.assertEqual(self.get()['count'], 5)
+        self.client.force_authenticate(User.objects.create(username='staff', is_staff=True))
+        # Staff see inactive products too
+        self.assertEqual(self.get()['count'], 6)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.get()['count'], 5)
+
+    @override_settings(API_CACHE_ENABLED=True)
+    def test_cached_counts_are_dropped_when_a_product_changes(self):
+        cache.clear()
+        self.assertEqual(self.get(color='Red')['count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            hidden = Product.objects.get(name='Hidden')
+            hidden.is_active, hidden.color = True, 'Red'
+            hidden.save()
+        self.assertEqual(self.get(color='Red')['count'], 2)
+
+
+@override_settings(**TEST_SETTINGS)
+class SuggestIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        shirts = Category.objects.create(name='Shirts')
+        jackets = Category.objects.create(name='Jackets')
+        cls.tee = cls.create('Classic Blue T-Shirt', shirts, 'CBT-001')
+        cls.shirt = cls.create('Shirt', shirts, 'SH-002')
+        cls.blouse = cls.create('Blue Blouse', shirts, 'BL-003')
+        cls.cafe = cls.create('Café Crème Polo', shirts, 'CP-004')
+        cls.parka = cls.create('Parka', jackets, 'PK-005')
+        cls.hidden = cls.create('Blue Hidden Shirt', shirts, 'BH-006', is_active=False)
+
+    @classmethod
+    def create(cls, name, category, sku, is_active=True):
+        return Product.objects.create(
+            name=name, description='', category=category, price=20, sku=sku, stock=5, is_active=is_active,
+        )
+
+    def setUp(self):
+        self.index = SuggestIndex(ttl=300)
+        # Builds run in the test's thread, so they see its transaction
+        patcher = mock.patch.object(self.index, 'start_build')
+        self.start_build = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.index.build()
+
+    def names(self, query, limit=8):
+        return [result['name'] for result in self.index.suggest(query, limit=limit)]
+
+    def test_nothing_until_built(self):
+        index = SuggestIndex(ttl=300)
+        with mock.patch.object(index, 'start_build') as start_build:
+            self.assertEqual(index.suggest('shirt'), [])
+        start_build.assert_called_once()
+
+    def test_prefix_of_name_or_later_word(self):
+        self.assertEqual(self.names('class'), ['Classic Blue T-Shirt'])
+        self.assertEqual(self.names('blue t'), ['Classic Blue T-Shirt'])
+        self.assertEqual(self.names('Cafe CR'), ['Café Crème Polo'])
+        self.assertEqual(self.names('  PARK!'), ['Parka'])
+        self.assertEqual(self.names('lue'), [])
+        self.assertEqual(self.names(''), [])
+
+    def test_inactive_products_are_not_indexed(self):
+        self.assertNotIn('Blue Hidden Shirt', self.names('blue'))
+
+    def test_name_matches_rank_before_word_matches(self):
+        # Tier first (name, then later word), then shorter names
+        self.assertEqual(self.names('shirt', limit=2), ['Shirt', 'Classic Blue T-Shirt'])
+        self.assertEqual(self.names('blue'), ['Blue Blouse', 'Classic Blue T-Shirt'])
+
+    def test_sku_and_category_matches(self):
+        self.assertEqual(self.names('sh 002'), ['Shirt'])
+        self.assertEqual(self.names('jack'), ['Parka'])
+        # Category matches rank after every name match
+        self.assertEqual(self.names('shirt', limit=20),
+                         ['Shirt', 'Classic Blue T-Shirt', 'Blue Blouse', 'Café Crème Polo'])
+
+    def test_limit(self):
+        self.assertEqual(self.names('shirt', limit=2), ['Shirt', 'Classic Blue T-Shirt'])
+        self.assertEqual(len(self.names('shirt', limit=1)), 1)
+
+    def test_update_and_remove(self):
+        self.parka.name = 'Blue Parka'
+        self.index.update(self.parka)
+        self.assertEqual(self.names('blue p'), ['Blue Parka'])
+        self.assertEqual(self.names('parka'), ['Blue Parka'])
+        self.assertEqual(self.names('pk 005'), ['Blue Parka'])
+
+        self.parka.is_active = False
+        self.index.update(self.parka)
+        self.assertEqual(self.names('blue p'), [])
+
+        self.index.remove(self.shirt.pk)
+        self.assertEqual(self.names('shirt', limit=2), ['Classic Blue T-Shirt', 'Blue Blouse'])
+
+    def test_rebuild_after_ttl_or_invalidation(self):
+        self.index.suggest('shirt')
+        self.start_build.assert_not_called()
+
+        built_at = self.index._built_at
+        with mock.patch('products.suggest.time.monotonic', return_value=built_at + 301):
+            self.assertEqual(self.names('shirt', limit=1), ['Shirt'])
+        self.start_build.assert_called_once()
+
+        self.start_build.reset_mock()
+        self.index.invalidate()
+        self.index.suggest('shirt')
+        self.start_build.assert_called_once()
+
+    def test_rebuild_picks_up_other_writes(self):
+        Product.objects.filter(pk=self.parka.pk).update(name='Anorak')
+        self.assertEqual(self.names('anor'), [])
+        self.index.build()
+        self.assertEqual(self.names('anor'), ['Anorak'])
+
+    def test_endpoint(self):
+        with mock.patch('products.views.suggest_index', self.index), self.assertNumQueries(0):
+            response = APIClient().get('/api/products/products/suggest/', {'q': 'shirt', 'n': 1})
+        self.assertEqual(response.data, {'query': 'shirt', 'results': [{'id': self.shirt.pk, 'name': 'Shirt'}]})
+        self.assertEqual(APIClient().get('/api/products/products/suggest/', {'n': 'x'}).status_code, 400)
+
+
+@override_settings(**dict(TEST_SETTINGS, API_CACHE_ENABLED=True, CATALOG_CACHE_MAX_AGE=60))
+class ConditionalCatalogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Shirts')
+        cls.products = create_products(cls.category, 3)
+        cls.staff = User.objects.create(username='staff', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_validators_and_cache_control(self):
+        response = self.client.get('/api/products/products/')
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertIn('Accept', response['Vary'])
+
+        self.client.force_authenticate(self.staff)
+        response = self.client.get('/api/products/products/')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_if_none_match_answers_304(self):
+        for url in ('/api/products/products/', f'/api/products/products/{self.products[0].pk}/',
+                    '/api/products/categories/'):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_if_modified_since_answers_304(self):
+        invalidate('product', 'category')
+        response = self.client.get('/api/products/products/')
+        last_modified = response['Last-Modified']
+        self.assertEqual(self.client.get('/api/products/products/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get('/api/products/products/', HTTP_IF_MODIFIED_SINCE=http_date(0)).status_code, 200)
+
+    def test_etag_varies_with_staff_format_and_query(self):
+        url = '/api/products/products/'
+        anonymous = self.client.get(url)['ETag']
+        self.assertNotEqual(self.client.get(url, {'ordering': 'price'})['ETag'], anonymous)
+        self.assertNotEqual(self.client.get(url, HTTP_ACCEPT='text/html')['ETag'], anonymous)
+        self.client.force_authenticate(self.staff)
+        self.assertNotEqual(self.client.get(url)['ETag'], anonymous)
+
+    def test_payload_cached_until_a_write(self):
+        url = '/api/products/products/'
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.client.get(url).data['results']), 3)
+
+        product = self.products[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = 'Renamed'
+            product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Renamed', [p['name'] for p in response.data['results']])
+
+    def test_category_write_changes_product_etags(self):
+        url = f'/api/products/products/{self.products[0].pk}/'
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.description = 'Updated'
+            self.category.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
@@ -0,0 +1,257 @@
+"""
+Buffered interaction tracking.
+
+Views call track_interaction(), which appends the event to an in-process
+buffer and returns. A daemon thread per process writes the buffer with
+bulk_create every TRACKING_FLUSH_INTERVAL seconds, or sooner once
+TRACKING_BATCH_SIZE events are waiting, so requests no longer pay for an
+indexed INSERT each.
+
+Repeat views of a product within one session (or by one user, without a
+session) are collapsed for TRACKING_VIEW_DEDUP_SECONDS.
+
+Loss window: if a process dies without a clean shutdown, at most the
+events of the last flush interval are lost. The buffer is flushed at exit,
+and it holds at most TRACKING_MAX_PENDING events. While the database is
+unreachable, unwritten batches wait for the next flush, and events are
+dropped once the buffer is full. A batch that fails while the database is
+up is retried in halves, so a bad event only drops itself. Dropped events
+are logged and counted in stats().
+
+With TRACKING_BUFFER_ENABLED=False every event is written synchronously.
+"""
+import os
+import time
+import atexit
+import logging
+import threading
+from collections import OrderedDict, deque
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from .models import ProductInteraction
+from .signals import interactions_created
+
+logger = logging.getLogger(__name__)
+
+# Remembered (user, session, product) views for deduplication
+MAX_RECENT_VIEWS = 100000
+
+
+def write_interactions(events):
+    """Insert a batch of event dicts and run the post-insert bookkeeping"""
+    try:
+        with transaction.atomic():
+            created = ProductInteraction.objects.bulk_create(
+                [ProductInteraction(**event) for event in events]
+            )
+            interactions_created(created)
+        return created
+    except IntegrityError:
+        if len(events) == 1:
+            logger.error(f"Discarding invalid interaction {events[0]}")
+            return []
+    # One bad row (e.g. a deleted product) must not hold back the batch
+    created = []
+    for event in events:
+        created.extend(write_interactions([event]))
+    return created
+
+
+def _database_reachable():
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        return True
+    except Exception:
+        return False
+
+
+class InteractionBuffer:
+    """In-process queue of interaction events with a background flusher"""
+
+    def __init__(self, batch_size=500, flush_interval=2.0, max_pending=10000,
+                 view_dedup_seconds=1800):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.view_dedup_seconds = view_dedup_seconds
+        self._pending = deque(maxlen=max_pending)
+        self._recent_views = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.dropped = 0
+        self.dropped_total = 0
+
+    def add(self, event):
+        """Queue an event; returns False if it was collapsed as a repeat view"""
+        with self._lock:
+            if event['interaction_type'] == 'view' and self._is_repeat_view(event):
+                return False
+            if len(self._pending) == self._pending.maxlen:
+                self._drop(1)
+            self._pending.append(event)
+            full = len(self._pending) >= self.batch_size
+        self._ensure_worker()
+        if full:
+            self._wakeup.set()
+        return True
+
+    def _is_repeat_view(self, event):
+        """Record a view and report whether it repeats a recent one (lock held)"""
+        now = time.monotonic()
+        while self._recent_views:
+            key, seen_at = next(iter(self._recent_views.items()))
+            if now - seen_at <= self.view_dedup_seconds and len(self._recent_views) < MAX_RECENT_VIEWS:
+                break
+            del self._recent_views[key]
+
+        key = (event['user_id'], event.get('session_id') or '', event['product_id'])
+        if key in self._recent_views:
+            return True
+        self._recent_views[key] = now
+        return False
+
+    def _ensure_worker(self):
+        # Checked per process: gunicorn forks workers after the module loads
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                atexit.register(self.flush)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='interaction-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Write everything queued so far; returns the number of rows written"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                if not batch:
+                    break
+                try:
+                    write_interactions(batch)
+                except Exception as e:
+                    if not _database_reachable():
+                        logger.error(f"Failed to write {len(batch)} interactions, will retry: {e}")
+                        self._requeue(batch)
+                        break
+                    logger.warning(f"Failed to write {len(batch)} interactions, retrying in parts: {e}")
+                    written += self._write_or_split(batch)
+                    continue
+                written += len(batch)
+        if self.dropped:
+            logger.warning(f"Interaction buffer dropped {self.dropped} events")
+            self.dropped = 0
+        return written
+
+    def _write_or_split(self, batch):
+        """
+        Retry a batch that failed although the database is up, halving it
+        on each failure; an event that fails on its own is dropped.
+        Returns the number of events written.
+        """
+        try:
+            write_interactions(batch)
+            return len(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                if not _database_reachable():
+                    self._requeue(batch)
+                    return 0
+                logger.error(f"Dropping interaction {batch[0]}: {e}")
+                with self._lock:
+                    self._drop(1)
+                return 0
+        middle = len(batch) // 2
+        return self._write_or_split(batch[:middle]) + self._write_or_split(batch[middle:])
+
+    def _requeue(self, batch):
+        """Put a batch back at the front; the bounded deque drops the newest if full"""
+        with self._lock:
+            overflow = len(self._pending) + len(batch) - self._pending.maxlen
+            if overflow > 0:
+                self._drop(overflow)
+            self._pending.extendleft(reversed(batch))
+
+    def _drop(self, count):
+        # Lock held
+        self.dropped += count
+        self.dropped_total += count
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'recent_views': len(self._recent_views),
+                'max_pending': self._pending.maxlen,
+                'dropped': self.dropped_total,
+            }
+
+
+buffer = InteractionBuffer(
+    batch_size=settings.TRACKING_BATCH_SIZE,
+    flush_interval=settings.TRACKING_FLUSH_INTERVAL,
+    max_pending=settings.TRACKING_MAX_PENDING,
+    view_dedup_seconds=settings.TRACKING_VIEW_DEDUP_SECONDS,
+)
+
+
+def track_interaction(user, interaction_type, product=None, session_id=None, rating=None):
+    """
+    Record a user interaction without blocking the request. `user` and
+    `product` may be instances or primary keys. Inside a transaction the
+    event is queued only once it commits.
+    """
+    event = {
+        'user_id': getattr(user, 'pk', user),
+        'product_id': getattr(product, 'pk', product),
+        'interaction_type': interaction_type,
+        'session_id': session_id,
+        'rating': rating,
+    }
+    if not settings.TRACKING_BUFFER_ENABLED:
+        ProductInteraction.objects.create(**event)
+        return
+    transaction.on_commit(lambda: buffer.add(event))
+
+
+def track_interactions(user, interaction_type, products, session_id=None):
+    """
+    Record one interaction per product (instances or primary keys), e.g.
+    the purchases of an order: queued together, or written with a single
+    bulk insert when buffering is off.
+    """
+    events = [
+        {
+            'user_id': getattr(user, 'pk', user),
+            'product_id': getattr(product, 'pk', product),
+            'interaction_type': interaction_type,
+            'session_id': session_id,
+            'rating': None,
+        }
+        for product in products
+    ]
+    if not settings.TRACKING_BUFFER_ENABLED:
+        write_interactions(events)
+        return
+
+    def queue():
+        for event in events:
+            buffer.add(event)
+    transaction.on_commit(queue)
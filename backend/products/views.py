@@ -1,33 +1,65 @@
-from rest_framework import viewsets, filters, status
+from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
+from rest_framework.permissions import IsAdminUser
+from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Prefetch, F, Count, Avg
+from django.db.models import Prefetch, F
 from django.utils import timezone
-from datetime import timedelta
 import json
-from .models import Product, Category, ProductReview, ProductInteraction
-from .serializers import ProductSerializer, CategorySerializer, ProductListSerializer, ProductReviewSerializer
+from ecommerce.pagination import KeysetPagination
+from .models import Product, Category, ProductReview
+from .serializers import (
+    ProductSerializer, CategorySerializer, ProductListSerializer, ProductReviewSerializer,
+)
+from .exports import (
+    NDJSONRenderer, CSVRenderer, PRODUCT_FIELDS, INTERACTION_FIELDS,
+    WatermarkTracker, parse_watermark, ndjson_stream, csv_stream,
+    product_export_queryset, interaction_export_queryset,
+)
+from .snapshots import write_snapshot
+from .tracking import track_interaction
+from . import popularity
+from .facets import cache_key as facets_cache_key, cached_facet_counts
+from .search import ProductSearchFilter, ProductOrderingFilter
+from .conditional import ConditionalCatalogMixin, product_tag
+from .suggest import index as suggest_index
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ConditionalCatalogMixin, viewsets.ModelViewSet):
     #print('CategoryViewSet initialized  ')
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    catalog_tags = ('category',)
 
 
-class ProductViewSet(viewsets.ModelViewSet):
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category', 'gender', 'size', 'color', 'price']
+class ProductViewSet(ConditionalCatalogMixin, viewsets.ModelViewSet):
+    pagination_class = KeysetPagination
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, ProductOrderingFilter]
+    filterset_fields = {
+        'category': ['exact'],
+        'gender': ['exact'],
+        'size': ['exact'],
+        'color': ['exact'],
+        'price': ['gte', 'lte'],
+        'rating': ['gte'],
+    }
     search_fields = ['name', 'description', 'material']
-    ordering_fields = ['price', 'rating', 'created_at']
+    ordering_fields = ['price', 'rating', 'review_count', 'created_at']
     ordering = ['-created_at']
 
     def get_queryset(self):
         # Show only active products for non-staff users
         if self.request.user.is_staff:
-            return Product.objects.all()
-        return Product.objects.filter(is_active=True)
+            queryset = Product.objects.all()
+        else:
+            queryset = Product.objects.filter(is_active=True)
+        # Single products load their recent reviews in the serializer, and
+        # only when not answering 304
+        return queryset.select_related('category')
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -44,91 +76,224 @@ class ProductViewSet(viewsets.ModelViewSet):
         # Track the view interaction if user is authenticated
         if request.user.is_authenticated:
             session_id = request.session.session_key
-            ProductInteraction.objects.create(
-                user=request.user,
-                product=product,
-                interaction_type='view',
-                session_id=session_id
-            )
+            track_interaction(request.user, 'view', product=product, session_id=session_id)
         
-        return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(request, lambda: self.get_serializer(product).data,
+                                         tags=(product_tag(product.pk),))
 
     @action(detail=True, methods=['get'])
     def reviews(self, request, pk=None):
+        """All reviews of a product, newest first, cursor-paginated"""
         product = self.get_object()
-        reviews = product.reviews.all()
-        serializer = ProductReviewSerializer(reviews, many=True)
-        return Response(serializer.data)
+        reviews = product.reviews.select_related('user').order_by('-created_at', '-id')
+        page = self.paginate_queryset(reviews)
+        serializer = ProductReviewSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['post'])
     def add_review(self, request, pk=None):
         product = self.get_object()
         serializer = ProductReviewSerializer(data=request.data)
         if serializer.is_valid():
-            review = serializer.save(product=product, user=request.user)
+            # The post_save signal updates the product's stats; commit both or neither
+            with transaction.atomic():
+                review = serializer.save(product=product, user=request.user)
             
             # Track the rating interaction
             if request.user.is_authenticated:
-                ProductInteraction.objects.create(
-                    user=request.user,
-                    product=product,
-                    interaction_type='rate',
-                    rating=review.rating
-                )
+                track_interaction(request.user, 'rate', product=product, rating=review.rating)
             
             return Response(serializer.data, status=201)
         return Response(serializer.errors, status=400)
 
-    @action(detail=False, methods=['get'], permission_classes=[])
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Counts per category, gender, size, color and price range for the
+        products matching the list filters in the query string (same params
+        as the list, including ?search=). Each dimension ignores its own
+        filter, so the UI can show the alternatives for a selected value.
+        """
+        params = request.query_params
+        base = ProductSearchFilter().filter_queryset(request, self.get_queryset(), self)
+        filterset_class = DjangoFilterBackend().get_filterset_class(self, base)
+        filterset = filterset_class(params, queryset=base, request=request)
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=400)
+
+        def filtered(dimension):
+            own = [key for key in params if key == dimension or key.startswith(f'{dimension}__')]
+            if not own:
+                return filterset.qs
+            data = params.copy()
+            for key in own:
+                del data[key]
+            return filterset_class(data, queryset=base, request=request).qs
+
+        key = facets_cache_key(params, request.user.is_staff)
+        return Response(cached_facet_counts(key, filtered))
+
+    @action(detail=False, methods=['get'], authentication_classes=[], permission_classes=[])
+    def suggest(self, request):
+        """
+        Search-as-you-type suggestions from the in-memory prefix index over
+        product names, SKUs and category names; no database access.
+        Query params:
+        - q: Prefix typed so far
+        - n: Number of suggestions (default: 8, max: 20)
+        """
+        try:
+            n = min(max(int(request.query_params.get('n', 8)), 1), 20)
+        except ValueError:
+            return Response({'error': 'n must be an integer'}, status=400)
+        query = request.query_params.get('q', '')
+        return Response({'query': query, 'results': suggest_index.suggest(query, limit=n)})
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """
+        Top products by recent interactions, read from the Redis popularity
+        counters only.
+        Query params:
+        - hours: Window in hours (default: 24, max: POPULARITY_RETENTION_HOURS)
+        - type: 'view', 'add_to_cart' or 'purchase' (default: weighted sum of all)
+        - n: Number of products (default: 10, max: 50)
+        """
+        try:
+            hours = min(max(int(request.query_params.get('hours', 24)), 1), settings.POPULARITY_RETENTION_HOURS)
+            n = min(max(int(request.query_params.get('n', 10)), 1), 50)
+        except ValueError:
+            return Response({'error': 'hours and n must be integers'}, status=400)
+        interaction_type = request.query_params.get('type')
+        if interaction_type and interaction_type not in popularity.COUNTER_FIELDS:
+            return Response({'error': f"type must be one of {', '.join(popularity.COUNTER_FIELDS)}"}, status=400)
+
+        # Over-fetch so inactive products can be dropped without a second round trip
+        ranked = popularity.trending(hours=hours, interaction_type=interaction_type, limit=n * 2)
+        if ranked is None:
+            return Response({'error': 'Popularity counters unavailable'}, status=503)
+
+        products = self.get_queryset().select_related('category').in_bulk([pid for pid, _ in ranked])
+        results = []
+        for product_id, score in ranked:
+            product = products.get(product_id)
+            if product is None:
+                continue
+            results.append(dict(ProductListSerializer(product, context={'request': request}).data, score=score))
+            if len(results) == n:
+                break
+        return Response({'hours': hours, 'type': interaction_type or 'all', 'results': results})
+
+    @action(detail=True, methods=['get'])
+    def popularity(self, request, pk=None):
+        """
+        View, add-to-cart and purchase counts over the last `hours` hours
+        (default: 24) and unique viewers over the last 7 days, for badges.
+        """
+        product = self.get_object()
+        try:
+            hours = min(max(int(request.query_params.get('hours', 24)), 1), settings.POPULARITY_RETENTION_HOURS)
+        except ValueError:
+            return Response({'error': 'hours must be an integer'}, status=400)
+        counts = popularity.product_counts(product.id, hours=hours)
+        if counts is None:
+            return Response({'error': 'Popularity counters unavailable'}, status=503)
+        return Response(dict(counts, product_id=product.id))
+
+    @action(
+        detail=False, methods=['get'], permission_classes=[],
+        renderer_classes=[JSONRenderer, NDJSONRenderer, CSVRenderer],
+    )
     def training_data(self, request):
         """
         Export training data for ML recommender system.
         Returns aggregated product features and user interaction history.
         Query params:
         - days: Number of recent days to include (default: 90)
-        - format: 'json' or 'csv' (default: 'json')
+        - format: 'json', 'ndjson' or 'csv' (default: 'json')
+        - table: 'products' or 'interactions', for csv (default: 'interactions')
+        - since: watermark from a previous export's metadata (or an ISO
+          timestamp). Only interactions after it and products updated after
+          it are returned, inactive ones included so clients can drop them.
+
+        ndjson and csv are streamed with constant memory; json builds the whole
+        payload in memory and is only suitable for small windows. The next
+        watermark is in the json metadata and the ndjson trailer.
         """
         days = int(request.query_params.get('days', 90))
-        date_threshold = timezone.now() - timedelta(days=days)
-
-        # Get all products with aggregated ratings
-        products = Product.objects.filter(is_active=True).annotate(
-            avg_rating=Avg('reviews__rating'),
-            review_count=Count('reviews'),
-            interaction_count=Count('interactions')
-        ).values(
-            'id', 'name', 'description', 'category__name', 'price',
-            'gender', 'color', 'material', 'size', 'stock',
-            'avg_rating', 'review_count', 'interaction_count'
-        )
+        since = request.query_params.get('since')
+        try:
+            since_id, since_timestamp = parse_watermark(since) if since else (None, None)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+
+        # Get products with aggregated ratings; incremental exports only
+        # carry products changed since the watermark
+        products = product_export_queryset(
+            since_timestamp=since_timestamp, include_inactive=bool(since)
+        ).values(*PRODUCT_FIELDS)
 
         # Get user interactions
-        interactions = ProductInteraction.objects.filter(
-            created_at__gte=date_threshold
-        ).values(
-            'user_id', 'product_id', 'interaction_type', 'rating', 'created_at'
-        ).order_by('user_id', '-created_at')
+        interactions = interaction_export_queryset(
+            days, since_id=since_id, since_timestamp=since_timestamp
+        ).values(*INTERACTION_FIELDS)
 
-        # Format response for ML training
-        training_data = {
-            'products': list(products),
-            'interactions': list(interactions),
-            'metadata': {
-                'total_products': products.count(),
-                'total_interactions': interactions.count(),
-                'date_range_days': days,
-                'generated_at': timezone.now().isoformat()
-            }
+        metadata = {
+            'date_range_days': days,
+            'generated_at': timezone.now().isoformat(),
+            'since': since,
         }
 
         response_format = request.query_params.get('format', 'json')
+        if response_format == 'ndjson':
+            return StreamingHttpResponse(
+                ndjson_stream(products, interactions, metadata, since=(since_id, since_timestamp)),
+                content_type='application/x-ndjson'
+            )
+
         if response_format == 'csv':
-            # Return as downloadable CSV (optional)
-            import csv
-            from django.http import HttpResponse
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = 'attachment; filename="training_data.csv"'
-            # CSV conversion logic here
+            table = request.query_params.get('table', 'interactions')
+            if table not in ('products', 'interactions'):
+                return Response({'error': "table must be 'products' or 'interactions'"}, status=400)
+            queryset, fields = (
+                (products, PRODUCT_FIELDS) if table == 'products'
+                else (interactions, INTERACTION_FIELDS)
+            )
+            response = StreamingHttpResponse(csv_stream(queryset, fields), content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="training_data_{table}.csv"'
             return response
 
+        # Format response for ML training
+        products = list(products)
+        interactions = list(interactions)
+        watermark = WatermarkTracker((since_id, since_timestamp))
+        for row in products:
+            watermark.see_product(row)
+        for row in interactions:
+            watermark.see_interaction(row)
+        training_data = {
+            'products': products,
+            'interactions': interactions,
+            'metadata': dict(
+                metadata,
+                total_products=len(products),
+                total_interactions=len(interactions),
+                watermark=watermark.token,
+            )
+        }
         return Response(training_data)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def training_snapshot(self, request):
+        """
+        Write a columnar training snapshot to TRAINING_SNAPSHOT_DIR (staff only).
+        Same as `manage.py export_training_snapshot`; the ML service picks up
+        the new snapshot on its next retrain.
+        Body: {"days": 90}
+        """
+        try:
+            days = int(request.data.get('days', 90))
+        except (TypeError, ValueError):
+            return Response({'error': 'days must be an integer'}, status=400)
+        manifest = write_snapshot(days=days)
+        return Response(manifest, status=201)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class UserAccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'user_accounts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,21 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from ecommerce.cache import invalidate_on_commit
+from .models import UserProfile, Address
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    """Drop the cached `me` payload; it embeds the profile and addresses too"""
+    if not created and not raw:
+        invalidate_on_commit(f'user:{instance.id}')
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_save, sender=Address)
+@receiver(post_delete, sender=Address)
+def profile_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_on_commit(f'user:{instance.user_id}')
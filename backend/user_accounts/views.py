@@ -5,6 +5,8 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.authtoken.models import Token
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
+from django.conf import settings
+from ecommerce.cache import cached
 from .models import UserProfile, Address
 from .serializers import UserSerializer, UserRegisterSerializer, AddressSerializer
 
@@ -26,8 +28,14 @@ class UserViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def me(self, request):
-        serializer = self.get_serializer(request.user)
-        return Response(serializer.data)
+        """The current user with profile and addresses, cached until any of them changes"""
+        user = request.user
+        data = cached(
+            'profile', f'{user.id}:{request.accepted_renderer.format}',
+            lambda: self.get_serializer(user).data, (f'user:{user.id}',),
+            timeout=settings.PROFILE_CACHE_SECONDS,
+        )
+        return Response(data)
 
     @action(detail=False, methods=['put', 'patch'])
     def update_profile(self, request):
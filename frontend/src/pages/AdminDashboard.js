@@ -1,6 +1,9 @@
 import React, { useState, useEffect } from 'react';
 import { adminAPI } from '../services';
 
+// The `cursor` query param of a next/previous page link
+const cursorFrom = (link) => (link ? new URL(link).searchParams.get('cursor') : null);
+
 export default function AdminDashboard() {
   const [activeTab, setActiveTab] = useState('dashboard');
   const [stats, setStats] = useState(null);
@@ -11,11 +14,12 @@ export default function AdminDashboard() {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [updating, setUpdating] = useState(false);
-  const [page, setPage] = useState(1);
+  const [cursor, setCursor] = useState(null);
+  const [pageLinks, setPageLinks] = useState({ next: null, previous: null });
 
   useEffect(() => {
     fetchData();
-  }, [activeTab, page]);
+  }, [activeTab, cursor]);
 
   const fetchData = async () => {
     try {
@@ -26,8 +30,9 @@ export default function AdminDashboard() {
         const response = await adminAPI.getDashboardStats();
         setStats(response.data);
       } else if (activeTab === 'pending') {
-        const response = await adminAPI.getPendingOrders(page);
-        setPendingOrders(response.data);
+        const response = await adminAPI.getPendingOrders(cursor);
+        setPendingOrders(response.data.results);
+        setPageLinks({ next: response.data.next, previous: response.data.previous });
       } else if (activeTab === 'analytics') {
         const response = await adminAPI.getPaymentAnalytics();
         setAnalytics(response.data);
@@ -74,19 +79,19 @@ export default function AdminDashboard() {
       <div className="admin-tabs">
         <button 
           className={`tab-btn ${activeTab === 'dashboard' ? 'active' : ''}`}
-          onClick={() => { setActiveTab('dashboard'); setPage(1); }}
+          onClick={() => { setActiveTab('dashboard'); setCursor(null); }}
         >
           📊 Dashboard
         </button>
         <button 
           className={`tab-btn ${activeTab === 'pending' ? 'active' : ''}`}
-          onClick={() => { setActiveTab('pending'); setPage(1); }}
+          onClick={() => { setActiveTab('pending'); setCursor(null); }}
         >
           ⏳ Pending Orders
         </button>
         <button 
           className={`tab-btn ${activeTab === 'analytics' ? 'active' : ''}`}
-          onClick={() => { setActiveTab('analytics'); setPage(1); }}
+          onClick={() => { setActiveTab('analytics'); setCursor(null); }}
         >
           📈 Payment Analytics
         </button>
@@ -177,15 +182,15 @@ export default function AdminDashboard() {
               <div className="pagination">
                 <button 
                   className="btn btn-small"
-                  onClick={() => setPage(Math.max(1, page - 1))}
-                  disabled={page === 1}
+                  onClick={() => setCursor(cursorFrom(pageLinks.previous))}
+                  disabled={!pageLinks.previous}
                 >
                   Previous
                 </button>
-                <span>Page {page}</span>
                 <button 
                   className="btn btn-small"
-                  onClick={() => setPage(page + 1)}
+                  onClick={() => setCursor(cursorFrom(pageLinks.next))}
+                  disabled={!pageLinks.next}
                 >
                   Next
                 </button>
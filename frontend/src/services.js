@@ -144,8 +144,9 @@ export const adminAPI = {
     api.get('/orders/admin/dashboard/stats/'),
   
   // Pending Orders
-  getPendingOrders: (page = 1, pageSize = 20, status = null) => {
-    const params = { page, page_size: pageSize };
+  getPendingOrders: (cursor = null, pageSize = 20, status = null) => {
+    const params = { page_size: pageSize };
+    if (cursor) params.cursor = cursor;
     if (status) params.status = status;
     return api.get('/orders/admin/pending/', { params });
   },
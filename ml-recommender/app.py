@@ -1,10 +1,13 @@
 import os
-import json
-from flask import Flask, request, jsonify
+import time
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
 from recommender import ProductRecommender
+from session_store import SessionStore
+from encoding import encode_json, json_response, ENCODER
+from metrics import REQUEST_LATENCY, CACHE_EVENTS, record_model, render_metrics
 import logging
-from threading import Thread
+from threading import Thread, Lock
 from apscheduler.schedulers.background import BackgroundScheduler
 import redis
 
@@ -15,48 +18,94 @@ CORS(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Redis for caching
-try:
-    redis_host = os.getenv('REDIS_HOST', 'localhost')
-    redis_port = int(os.getenv('REDIS_PORT', 6379))
-    redis_db = int(os.getenv('REDIS_DB', 0))
-    redis_client = redis.Redis(
-        host=redis_host,
-        port=redis_port,
-        db=redis_db,
-        decode_responses=True,
-        socket_connect_timeout=5,
-        socket_keepalive=True
-    )
-    # Test connection
-    redis_client.ping()
-    logger.info(f"Connected to Redis at {redis_host}:{redis_port}")
-    REDIS_AVAILABLE = True
-except Exception as e:
-    logger.warning(f"Redis not available: {e}. Caching disabled.")
-    redis_client = None
-    REDIS_AVAILABLE = False
-
-# Initialize recommender with backend URL from environment
+# Redis for caching; connected in the background by start_background_services()
+# so importing this module does no network I/O
+redis_client = None
+REDIS_AVAILABLE = False
+
+
+def connect_redis():
+    """Connect to Redis for caching"""
+    global redis_client, REDIS_AVAILABLE
+    try:
+        redis_host = os.getenv('REDIS_HOST', 'localhost')
+        redis_port = int(os.getenv('REDIS_PORT', 6379))
+        redis_db = int(os.getenv('REDIS_DB', 0))
+        client = redis.Redis(
+            host=redis_host,
+            port=redis_port,
+            db=redis_db,
+            # Cached values are pre-encoded JSON bytes served verbatim
+            decode_responses=False,
+            socket_connect_timeout=5,
+            socket_keepalive=True
+        )
+        # Test connection
+        client.ping()
+        redis_client = client
+        REDIS_AVAILABLE = True
+        logger.info(f"Connected to Redis at {redis_host}:{redis_port}")
+    except Exception as e:
+        logger.warning(f"Redis not available: {e}. Caching disabled.")
+        redis_client = None
+        REDIS_AVAILABLE = False
+
+
+# Recommender is constructed without I/O; the model is loaded (last saved
+# artifact first, training only if there is none) in a background thread
 backend_url = os.getenv('BACKEND_URL', 'http://localhost:8000')
-recommender = ProductRecommender(backend_url=backend_url)
+recommender = ProductRecommender(
+    backend_url=backend_url,
+    auto_load=False,
+    snapshot_dir=os.getenv('TRAINING_SNAPSHOT_DIR') or None,
+    snapshot_max_age_hours=float(os.getenv('TRAINING_SNAPSHOT_MAX_AGE_HOURS', 26)),
+)
+background_services_started = False
+background_services_lock = Lock()
 
 # Initialize background scheduler for periodic retraining
 scheduler = BackgroundScheduler()
 scheduler_started = False
 
+# Upper bound on candidates per /api/ml/rerank request
+MAX_RERANK_CANDIDATES = int(os.getenv('MAX_RERANK_CANDIDATES', 5000))
+
 # Cache configuration
 CACHE_TTL = 3600  # 1 hour
-POPULAR_CACHE_TTL = 1800  # 30 minutes
 USER_CACHE_TTL = 600  # 10 minutes
-
-
-def get_cache(key):
-    """Get value from Redis cache"""
+CACHE_FILL_MARKER_TTL = 30  # seconds a miss is considered "being computed"
+
+# Real-time session tracking fed by the backend's interaction stream.
+# The backend publishes to its own Redis DB, which may differ from ours.
+STREAM_KEY = os.getenv('INTERACTION_STREAM_KEY', 'interactions:stream')
+STREAM_REDIS_DB = int(os.getenv('INTERACTION_STREAM_REDIS_DB', 0))
+session_store = SessionStore(
+    max_events=int(os.getenv('SESSION_MAX_EVENTS', 50)),
+    max_sessions=int(os.getenv('SESSION_MAX_COUNT', 100000)),
+    idle_seconds=int(os.getenv('SESSION_IDLE_SECONDS', 1800)),
+    half_life_seconds=int(os.getenv('SESSION_HALF_LIFE_SECONDS', 900)),
+)
+stream_consumer_started = False
+
+
+def get_cache(key, tier=None):
+    """
+    Get raw bytes from Redis cache. With a tier, count the hit or miss, and
+    count a stampede when another request is already computing the same
+    missing key (its fill marker is still set).
+    """
     if not REDIS_AVAILABLE or redis_client is None:
         return None
     try:
-        return redis_client.get(key)
+        value = redis_client.get(key)
+        if tier is not None:
+            if value is not None:
+                CACHE_EVENTS.labels(tier, 'hit').inc()
+            else:
+                CACHE_EVENTS.labels(tier, 'miss').inc()
+                if not redis_client.set(f"{key}:filling", 1, nx=True, ex=CACHE_FILL_MARKER_TTL):
+                    CACHE_EVENTS.labels(tier, 'stampede').inc()
+        return value
     except Exception as e:
         logger.warning(f"Cache get error: {e}")
         return None
@@ -94,7 +143,6 @@ def scheduled_retrain():
         # Clear all recommendation caches when model is retrained
         clear_cache_pattern("rec:product:*")
         clear_cache_pattern("rec:user:*")
-        clear_cache_pattern("rec:popular:*")
     else:
         logger.error("Scheduled retraining failed")
 
@@ -117,17 +165,125 @@ def start_scheduler():
         logger.info("Background scheduler started for daily model retraining")
 
 
+def session_key(session_id, user_id):
+    """Sessions without a session id are tracked per user"""
+    return session_id or f"user-{user_id}"
+
+
+def consume_interaction_stream():
+    """
+    Tail the interaction stream and feed each event into the session store.
+    Every worker reads the whole stream (no consumer group) so any worker
+    can answer for any session.
+    """
+    stream_client = redis.Redis(
+        host=os.getenv('REDIS_HOST', 'localhost'),
+        port=int(os.getenv('REDIS_PORT', 6379)),
+        db=STREAM_REDIS_DB,
+        decode_responses=True,
+        socket_connect_timeout=5,
+        socket_keepalive=True
+    )
+    last_id = '$'
+    while True:
+        try:
+            last_id = read_interaction_stream(stream_client, last_id)
+        except Exception as e:
+            logger.warning(f"Interaction stream read error: {e}")
+            time.sleep(5)
+
+
+def read_interaction_stream(stream_client, last_id, block=5000):
+    """
+    Read the events after last_id (waiting up to `block` ms for new ones)
+    into the session store; returns the id to read from next
+    """
+    batches = stream_client.xread({STREAM_KEY: last_id}, count=500, block=block)
+    for _, entries in batches or []:
+        for entry_id, fields in entries:
+            last_id = entry_id
+            session_store.add(
+                session_key(fields.get('session_id'), fields.get('user_id')),
+                int(fields['product_id']),
+                fields.get('interaction_type', 'view'),
+                float(fields['created_at']) if fields.get('created_at') else None,
+            )
+    return last_id
+
+
+def start_stream_consumer():
+    """Start the background thread that tails the interaction stream"""
+    global stream_consumer_started
+    if stream_consumer_started or not REDIS_AVAILABLE:
+        return
+    thread = Thread(target=consume_interaction_stream, name='interaction-stream', daemon=True)
+    thread.start()
+    stream_consumer_started = True
+    logger.info(f"Consuming interaction stream {STREAM_KEY} from Redis DB {STREAM_REDIS_DB}")
+
+
+def connect_cache_and_stream():
+    connect_redis()
+    start_stream_consumer()
+
+
+def start_background_services():
+    """
+    Start model loading, Redis connection, stream consumer and scheduler.
+    Called once per worker, from the gunicorn post_worker_init hook or on
+    the first request; returns immediately.
+    """
+    global background_services_started
+    with background_services_lock:
+        if background_services_started:
+            return
+        background_services_started = True
+
+    Thread(target=recommender.load_or_train, name='model-loader', daemon=True).start()
+    Thread(target=connect_cache_and_stream, name='redis-connect', daemon=True).start()
+    start_scheduler()
+
+
+@app.before_request
+def ensure_background_services():
+    if not background_services_started:
+        start_background_services()
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Label by route pattern, not path, to keep label cardinality bounded
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.labels(endpoint, request.method, response.status_code).observe(
+            time.perf_counter() - started
+        )
+    return response
+
+
+def model_not_ready():
+    """503 response for endpoints that need a loaded model"""
+    return jsonify({
+        'error': 'Model not ready',
+        'load': recommender.load_state
+    }), 503
+
+
 @app.route('/health', methods=['GET'])
 def health():
-    """Health check endpoint"""
-    # Start scheduler on first request if not already started
-    start_scheduler()
-    model_info = recommender.get_model_info()
-    
+    """Liveness probe: the process is up and serving requests"""
     return jsonify({
         'status': 'healthy',
         'service': 'ml-recommender',
-        'model': model_info,
+        'model': recommender.get_model_info(),
+        'sessions': session_store.stats(),
+        'json_encoder': ENCODER,
         'cache': {
             'enabled': REDIS_AVAILABLE,
             'host': os.getenv('REDIS_HOST', 'localhost'),
@@ -136,6 +292,29 @@ def health():
     }), 200
 
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """
+    Readiness probe: 200 once a model is loaded, 503 with progress until
+    then. train_model() and load_model() publish a complete model in one
+    assignment, so a non-None model is ready to serve.
+    """
+    is_ready = recommender.model is not None
+    return jsonify({
+        'ready': is_ready,
+        'load': recommender.load_state,
+    }), 200 if is_ready else 503
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics, aggregated across gunicorn workers"""
+    if recommender.model is not None:
+        record_model(recommender.model)
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+
 @app.route('/api/ml/model/info', methods=['GET'])
 def model_info():
     """Get current model information"""
@@ -147,6 +326,9 @@ def model_info():
 def get_product_recommendations(product_id):
     """Get recommendations based on product similarity with caching"""
     try:
+        if recommender.model is None:
+            return model_not_ready()
+
         n_recommendations = request.args.get('n', 5, type=int)
         gender = request.args.get('gender', None)
         size = request.args.get('size', None)
@@ -159,10 +341,10 @@ def get_product_recommendations(product_id):
             cache_key += f":s{size}"
 
         # Check cache first
-        cached_result = get_cache(cache_key)
+        cached_result = get_cache(cache_key, tier='product')
         if cached_result:
             logger.info(f"Cache hit for product {product_id} recommendations")
-            return json.loads(cached_result), 200
+            return json_response(cached_result, cache_hit=True)
 
         # Not in cache, compute recommendations
         user_preferences = {}
@@ -185,9 +367,10 @@ def get_product_recommendations(product_id):
         }
 
         # Store in cache
-        set_cache(cache_key, json.dumps(result), CACHE_TTL)
+        body = encode_json(result)
+        set_cache(cache_key, body, CACHE_TTL)
 
-        return jsonify(result), 200
+        return json_response(body)
 
     except Exception as e:
         logger.error(f"Error getting recommendations: {str(e)}")
@@ -198,16 +381,19 @@ def get_product_recommendations(product_id):
 def get_user_recommendations(user_id):
     """Get personalized recommendations for a user with caching"""
     try:
+        if recommender.model is None:
+            return model_not_ready()
+
         n_recommendations = request.args.get('n', 5, type=int)
 
         # Create cache key
         cache_key = f"rec:user:{user_id}:n{n_recommendations}"
 
         # Check cache first
-        cached_result = get_cache(cache_key)
+        cached_result = get_cache(cache_key, tier='user')
         if cached_result:
             logger.info(f"Cache hit for user {user_id} recommendations")
-            return json.loads(cached_result), 200
+            return json_response(cached_result, cache_hit=True)
 
         # Not in cache, compute recommendations
         recommendations = recommender.get_personalized_recommendations(
@@ -223,51 +409,129 @@ def get_user_recommendations(user_id):
         }
 
         # Store in cache with shorter TTL for user-specific data
-        set_cache(cache_key, json.dumps(result), USER_CACHE_TTL)
+        body = encode_json(result)
+        set_cache(cache_key, body, USER_CACHE_TTL)
 
-        return jsonify(result), 200
+        return json_response(body)
 
     except Exception as e:
         logger.error(f"Error getting personalized recommendations: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/ml/recommendations/popular', methods=['GET'])
-def get_popular_products():
-    """Get highest-rated products with caching"""
+@app.route('/api/ml/recommendations/session/<session_id>', methods=['GET'])
+def get_session_recommendations(session_id):
+    """
+    Get recommendations from the session's recent interactions.
+    Not cached: the result changes with every interaction in the session.
+    """
     try:
+        if recommender.model is None:
+            return model_not_ready()
+
         n_recommendations = request.args.get('n', 5, type=int)
+        weighted_items = session_store.get_weighted_items(session_id)
 
-        # Create cache key
-        cache_key = f"rec:popular:n{n_recommendations}"
+        recommendations = recommender.get_session_recommendations(
+            weighted_items=weighted_items,
+            n_recommendations=n_recommendations
+        )
+        if not recommendations:
+            # Nothing usable in the session yet: cold start
+            recommendations = recommender.get_popular_products(n_recommendations)
 
-        # Check cache first
-        cached_result = get_cache(cache_key)
-        if cached_result:
-            logger.info(f"Cache hit for popular products")
-            return json.loads(cached_result), 200
+        return json_response(encode_json({
+            'session_id': session_id,
+            'recommendations': recommendations,
+            'count': len(recommendations),
+            'session_items': len(weighted_items),
+            'cached': False
+        }))
+
+    except Exception as e:
+        logger.error(f"Error getting session recommendations: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/ml/recommendations/popular', methods=['GET'])
+def get_popular_products():
+    """
+    Get the most popular in-stock products, optionally for a gender and/or
+    category segment. Served from lists precomputed at training time, so
+    there is nothing worth caching.
+    """
+    try:
+        n_recommendations = request.args.get('n', 5, type=int)
+        gender = request.args.get('gender', None)
+        category = request.args.get('category', None)
 
-        # Get top products by rating
         if recommender.model is None:
-            return jsonify({'error': 'Model not trained'}), 503
+            return model_not_ready()
 
-        product_col = 'id' if 'id' in recommender.model['products'].columns else 'product_id'
-        top_products = recommender.model['products'].nlargest(n_recommendations, 'avg_rating')
-        popular = top_products[[product_col, 'name', 'category', 'price', 'avg_rating']].to_dict('records')
+        popular = recommender.get_popular_products(
+            n_recommendations=n_recommendations,
+            gender=gender,
+            category=category
+        )
 
-        result = {
+        return json_response(encode_json({
             'recommendations': popular,
             'count': len(popular),
             'cached': False
-        }
+        }))
 
-        # Store in cache with shorter TTL for popular products
-        set_cache(cache_key, json.dumps(result), POPULAR_CACHE_TTL)
+    except Exception as e:
+        logger.error(f"Error getting popular products: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/ml/rerank', methods=['POST'])
+def rerank():
+    """
+    Order a caller-supplied candidate list for a user or seed products.
+
+    Request body:
+    {
+        "candidate_ids": [12, 7, 45, ...],
+        "user_id": 3,              # and/or
+        "product_ids": [1, 2]      # seed products, take precedence over user_id
+    }
+    """
+    try:
+        if recommender.model is None:
+            return model_not_ready()
+
+        data = request.get_json(silent=True) or {}
+        candidate_ids = data.get('candidate_ids')
+        user_id = data.get('user_id')
+        seed_product_ids = data.get('product_ids') or []
+
+        if not isinstance(candidate_ids, list) or not candidate_ids:
+            return jsonify({'error': 'candidate_ids must be a non-empty list'}), 400
+        if len(candidate_ids) > MAX_RERANK_CANDIDATES:
+            return jsonify({'error': f'At most {MAX_RERANK_CANDIDATES} candidate_ids are allowed'}), 400
+        try:
+            candidate_ids = [int(product_id) for product_id in candidate_ids]
+            seed_product_ids = [int(product_id) for product_id in seed_product_ids]
+            user_id = int(user_id) if user_id is not None else None
+        except (TypeError, ValueError):
+            return jsonify({'error': 'candidate_ids, product_ids and user_id must be integers'}), 400
+
+        result = recommender.rerank(
+            candidate_ids=candidate_ids,
+            user_id=user_id,
+            seed_product_ids=seed_product_ids
+        )
 
-        return jsonify(result), 200
+        return json_response(encode_json({
+            'user_id': user_id,
+            'ranked': result['ranked'],
+            'unknown': result['unknown'],
+            'count': len(result['ranked']),
+        }))
 
     except Exception as e:
-        logger.error(f"Error getting popular products: {str(e)}")
+        logger.error(f"Error re-ranking candidates: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
@@ -340,5 +604,6 @@ def retrain_model():
 
 
 if __name__ == '__main__':
+    start_background_services()
     port = int(os.getenv('PORT', 8001))
     app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
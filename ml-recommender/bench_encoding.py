@@ -0,0 +1,58 @@
+"""
+Microbenchmark: JSON encode cost per recommendation response size.
+
+Compares the response encoder in use (orjson when installed) with the
+stdlib json module and Flask's jsonify, which the API used before.
+
+Usage: python bench_encoding.py
+"""
+import json
+import timeit
+import numpy as np
+from flask import Flask, jsonify
+from encoding import encode_json, ENCODER
+
+SIZES = [5, 20, 100, 500]
+
+
+def make_payload(n):
+    """A response shaped like /api/ml/recommendations/product/<id>"""
+    rng = np.random.default_rng(42)
+    recommendations = [
+        {
+            'product_id': i,
+            'name': f'Product {i}',
+            'category': 'T-Shirts',
+            'gender': 'U',
+            'color': 'Black',
+            'price': float(round(rng.uniform(20, 200), 2)),
+            'rating': float(round(rng.uniform(3, 5), 1)),
+            'similarity_score': float(rng.random()),
+        }
+        for i in range(n)
+    ]
+    return {'product_id': 1, 'recommendations': recommendations, 'count': n, 'cached': False}
+
+
+def per_call_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    app = Flask(__name__)
+    print(f"Encoder in use: {ENCODER}\n")
+    print(f"{'recs':>5} {'bytes':>8} {ENCODER + ' us':>12} {'json us':>10} {'jsonify us':>11}")
+
+    with app.app_context():
+        for n in SIZES:
+            payload = make_payload(n)
+            number = max(10, 20000 // n)
+            size = len(encode_json(payload))
+            fast = per_call_us(lambda: encode_json(payload), number)
+            stdlib = per_call_us(lambda: json.dumps(payload).encode(), number)
+            flask = per_call_us(lambda: jsonify(payload).get_data(), number)
+            print(f"{n:>5} {size:>8} {fast:>12.1f} {stdlib:>10.1f} {flask:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
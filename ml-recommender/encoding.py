@@ -0,0 +1,41 @@
+"""
+JSON encoding for API responses.
+
+Responses are encoded to bytes once and those bytes are what gets cached in
+Redis, so a cache hit is served as-is without a decode/re-encode round trip.
+orjson is used when installed; the stdlib encoder is the fallback.
+"""
+import json
+import numpy as np
+from flask import Response
+
+try:
+    import orjson
+
+    ENCODER = 'orjson'
+
+    def encode_json(payload) -> bytes:
+        """Encode a payload to compact JSON bytes"""
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+except ImportError:
+    ENCODER = 'json'
+
+    def _default(obj):
+        if isinstance(obj, np.generic):
+            return obj.item()
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    def encode_json(payload) -> bytes:
+        """Encode a payload to compact JSON bytes"""
+        return json.dumps(payload, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+def json_response(body: bytes, status: int = 200, cache_hit: bool = False) -> Response:
+    """Wrap already-encoded JSON bytes in a response without touching them"""
+    response = Response(body, status=status, mimetype='application/json')
+    if cache_hit:
+        response.headers['X-Cache'] = 'HIT'
+    return response
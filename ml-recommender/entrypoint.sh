@@ -2,8 +2,13 @@
 # Initialize models directory
 mkdir -p models
 
-# Train initial model if it doesn't exist
-python -c "from recommender import ProductRecommender; ProductRecommender()"
+# Shared directory where gunicorn workers write Prometheus samples, so
+# /metrics aggregates all workers. Cleared on start to drop stale workers.
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
 
-# Start Flask app with Gunicorn
-gunicorn --bind 0.0.0.0:8001 --workers 2 --timeout 120 app:app
+# Start Flask app with Gunicorn. Workers accept connections immediately and
+# load the model (last saved artifact, or a fresh training run) in the
+# background; /ready turns 200 once it is loaded.
+gunicorn -c gunicorn.conf.py app:app
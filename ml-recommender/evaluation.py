@@ -0,0 +1,208 @@
+"""
+Offline evaluation of the recommender.
+
+Splits the interaction log by time (the most recent fraction is held out),
+trains on the older part, and measures how well each engine predicts the
+held-out items: precision@K, recall@K, NDCG@K and catalog coverage, next to
+per-query latency.
+
+Users are evaluated in parallel. The trained model is built once in the
+parent and worker processes are forked from it, so the model arrays are
+shared copy-on-write instead of being pickled to every worker.
+
+Usage:
+    python evaluation.py --source backend --days 90 --k 10 --workers 8
+    python evaluation.py --source dummy --engines profile popular
+"""
+import os
+import time
+import argparse
+import logging
+import multiprocessing
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+from recommender import ProductRecommender, SEGMENT_TOP_N
+
+logger = logging.getLogger(__name__)
+
+
+def _profile_engine(recommender, user_id, k):
+    """Blend of the user's whole history, scored once against the catalog"""
+    history = recommender.user_items.get(user_id, [])
+    return [r['product_id'] for r in recommender.get_session_recommendations(history, k)]
+
+
+def _item_knn_engine(recommender, user_id, k):
+    """The production personalized path: neighbours of each history item"""
+    return [r['product_id'] for r in recommender.get_personalized_recommendations(user_id, k)]
+
+
+def _popular_engine(recommender, user_id, k):
+    """Non-personalized baseline from the precomputed segment lists"""
+    seen = {product_id for product_id, _ in recommender.user_items.get(user_id, [])}
+    popular = recommender.get_popular_products(SEGMENT_TOP_N)
+    ids = [record.get('id', record.get('product_id')) for record in popular]
+    return [product_id for product_id in ids if product_id not in seen][:k]
+
+
+ENGINES = {
+    'profile': _profile_engine,
+    'item_knn': _item_knn_engine,
+    'popular': _popular_engine,
+}
+
+# Set in the parent before the pool forks; read-only in the workers
+_shared: Dict = {}
+
+
+def time_split(interactions: pd.DataFrame, test_fraction: float):
+    """Hold out the most recent test_fraction of interactions"""
+    created_at = pd.to_datetime(interactions['created_at'], utc=True, errors='coerce')
+    order = np.argsort(created_at.values, kind='stable')
+    cutoff = int(len(order) * (1 - test_fraction))
+    return interactions.iloc[order[:cutoff]], interactions.iloc[order[cutoff:]]
+
+
+def relevant_items(train: pd.DataFrame, test: pd.DataFrame, product_index: Dict) -> Dict[int, set]:
+    """
+    Held-out items per user, restricted to users with training history,
+    products the model knows, and items the user hadn't seen in training.
+    """
+    seen = train.groupby('user_id')['product_id'].agg(set).to_dict()
+    relevant = {}
+    for user_id, product_ids in test.groupby('user_id')['product_id']:
+        history = seen.get(user_id)
+        if not history:
+            continue
+        items = {
+            int(pid) for pid in product_ids
+            if pid == pid and int(pid) in product_index and pid not in history
+        }
+        if items:
+            relevant[int(user_id)] = items
+    return relevant
+
+
+def _evaluate_chunk(args):
+    """Score one chunk of users with one engine (runs in a worker)"""
+    engine, user_ids, k = args
+    recommender = _shared['recommender']
+    relevant = _shared['relevant']
+    recommend = ENGINES[engine]
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+
+    precision = recall = ndcg = 0.0
+    recommended = set()
+    latencies = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        recs = recommend(recommender, user_id, k)[:k]
+        latencies.append(time.perf_counter() - start)
+
+        items = relevant[user_id]
+        gains = np.array([1.0 if pid in items else 0.0 for pid in recs])
+        hits = gains.sum()
+        precision += hits / k
+        recall += hits / len(items)
+        ideal = discounts[:min(len(items), k)].sum()
+        ndcg += float(np.dot(gains, discounts[:len(gains)])) / ideal
+        recommended.update(recs)
+
+    return precision, recall, ndcg, recommended, latencies
+
+
+def evaluate(recommender: ProductRecommender, test: pd.DataFrame, engines: List[str],
+             k: int = 10, workers: int = None, max_users: int = None, chunk_size: int = 200) -> Dict:
+    """
+    Evaluate engines on held-out interactions. The recommender must already
+    be trained on the matching training split.
+    """
+    train = recommender.user_interactions
+    relevant = relevant_items(train, test, recommender.product_index)
+    user_ids = sorted(relevant)
+    if max_users and len(user_ids) > max_users:
+        rng = np.random.default_rng(42)
+        user_ids = sorted(rng.choice(user_ids, max_users, replace=False).tolist())
+    if not user_ids:
+        logger.warning("No users with both training history and held-out items")
+        return {}
+
+    _shared['recommender'] = recommender
+    _shared['relevant'] = relevant
+    workers = workers or os.cpu_count() or 1
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        # Workers rely on inheriting the model; evaluate in-process instead
+        workers = 1
+
+    chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+    catalog_size = len(recommender.model['products'])
+    report = {}
+    pool = multiprocessing.get_context('fork').Pool(workers) if workers > 1 else None
+    try:
+        for engine in engines:
+            tasks = [(engine, chunk, k) for chunk in chunks]
+            started = time.perf_counter()
+            results = pool.map(_evaluate_chunk, tasks) if pool else [_evaluate_chunk(t) for t in tasks]
+            wall = time.perf_counter() - started
+
+            recommended = set().union(*(r[3] for r in results))
+            latencies = np.concatenate([r[4] for r in results]) * 1000
+            n_users = len(user_ids)
+            report[engine] = {
+                f'precision@{k}': sum(r[0] for r in results) / n_users,
+                f'recall@{k}': sum(r[1] for r in results) / n_users,
+                f'ndcg@{k}': sum(r[2] for r in results) / n_users,
+                'coverage': len(recommended) / catalog_size,
+                'users': n_users,
+                'latency_p50_ms': float(np.percentile(latencies, 50)),
+                'latency_p95_ms': float(np.percentile(latencies, 95)),
+                'wall_seconds': wall,
+            }
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        _shared.clear()
+    return report
+
+
+def print_report(report: Dict, k: int):
+    columns = [f'precision@{k}', f'recall@{k}', f'ndcg@{k}', 'coverage', 'latency_p50_ms', 'latency_p95_ms']
+    print(f"{'engine':<10} {'users':>7} " + ' '.join(f'{c:>15}' for c in columns) + f" {'wall_s':>8}")
+    for engine, row in report.items():
+        print(f"{engine:<10} {row['users']:>7} " + ' '.join(f'{row[c]:>15.4f}' for c in columns)
+              + f" {row['wall_seconds']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline evaluation of the recommender')
+    parser.add_argument('--source', choices=['backend', 'dummy'], default='backend')
+    parser.add_argument('--backend-url', default=os.getenv('BACKEND_URL', 'http://localhost:8000'))
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--test-fraction', type=float, default=0.2)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--engines', nargs='+', choices=sorted(ENGINES), default=['profile', 'popular'])
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-users', type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    recommender = ProductRecommender(backend_url=args.backend_url, auto_load=False)
+    if args.source == 'backend':
+        recommender.fetch_data_from_database(days=args.days)
+    else:
+        recommender.generate_dummy_data(days=args.days)
+
+    train, test = time_split(recommender.user_interactions, args.test_fraction)
+    logger.info(f"Time split: {len(train)} training and {len(test)} held-out interactions")
+    recommender.user_interactions = train
+    recommender.train_model()
+
+    report = evaluate(recommender, test, args.engines, k=args.k,
+                      workers=args.workers, max_users=args.max_users)
+    print_report(report, args.k)
+
+
+if __name__ == '__main__':
+    main()
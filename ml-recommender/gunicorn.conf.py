@@ -0,0 +1,16 @@
+# Gunicorn settings for the ML recommender
+bind = '0.0.0.0:8001'
+workers = 2
+timeout = 120
+
+
+def post_worker_init(worker):
+    """Kick off model loading as soon as each worker boots, not on first request"""
+    from app import start_background_services
+    start_background_services()
+
+
+def child_exit(server, worker):
+    """Clean up a dead worker's Prometheus multiprocess files"""
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -0,0 +1,89 @@
+"""
+Prometheus metrics for the ML recommender.
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR (entrypoint.sh does) so each
+worker writes its samples to shared files and /metrics aggregates all
+workers. Without it, metrics are per-process, which is fine for
+`python app.py` and scripts.
+"""
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+    CONTENT_TYPE_LATEST, generate_latest, multiprocess,
+)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+REQUEST_LATENCY = Histogram(
+    'ml_request_duration_seconds', 'HTTP request latency by endpoint',
+    ['endpoint', 'method', 'status'], buckets=LATENCY_BUCKETS,
+)
+SCORING_STAGE_LATENCY = Histogram(
+    'ml_scoring_stage_duration_seconds', 'Time spent in each ProductRecommender scoring stage',
+    ['stage'], buckets=STAGE_BUCKETS,
+)
+CACHE_EVENTS = Counter(
+    'ml_cache_events_total', 'Recommendation cache lookups by tier and result (hit, miss, stampede)',
+    ['tier', 'result'],
+)
+MODEL_TRAINED_AT = Gauge(
+    'ml_model_trained_timestamp_seconds', 'Training time of the loaded model, used as its version',
+    multiprocess_mode='livemax',
+)
+MODEL_AGE = Gauge(
+    'ml_model_age_seconds', 'Seconds since the loaded model was trained',
+    multiprocess_mode='livemax',
+)
+MODEL_PRODUCTS = Gauge(
+    'ml_model_products', 'Products in the loaded model', multiprocess_mode='livemax',
+)
+TRAINING_DURATION = Histogram(
+    'ml_training_duration_seconds', 'Model training duration',
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+TRAINING_ROWS = Gauge(
+    'ml_training_rows', 'Rows used by the last training run', ['table'],
+    multiprocess_mode='livemax',
+)
+
+SCORING_STAGES = ('lookup', 'similarity', 'preference_boost', 'ranking', 'materialization')
+# Label children resolved once, so timing a stage is a dict lookup plus observe()
+_stage_histograms = {stage: SCORING_STAGE_LATENCY.labels(stage) for stage in SCORING_STAGES}
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time a scoring stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stage_histograms[stage].observe(time.perf_counter() - start)
+
+
+def record_model(model: dict):
+    """Publish version, age and size of the model in memory"""
+    trained_at = model.get('trained_at')
+    if trained_at:
+        MODEL_TRAINED_AT.set(trained_at)
+        MODEL_AGE.set(time.time() - trained_at)
+    MODEL_PRODUCTS.set(len(model['products']))
+
+
+def render_metrics():
+    """Return (body, content_type) for the /metrics endpoint"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int):
+    """Drop a dead worker's live gauges (gunicorn child_exit hook)"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
@@ -1,98 +1,371 @@
 import os
+import json
+import fcntl
+import tempfile
+from collections import Counter
+from contextlib import contextmanager
 import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.decomposition import TruncatedSVD
 import joblib
-from datetime import datetime
+import time
+from datetime import datetime, timedelta, timezone
 import requests
 from typing import Optional, Dict, List
 import logging
+from session_store import INTERACTION_WEIGHTS
+from snapshot import latest_snapshot, read_manifest, read_snapshot
+from metrics import stage_timer, record_model, TRAINING_DURATION, TRAINING_ROWS
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Cold-start lists: how many products to keep per segment, and how fast
+# an interaction's contribution to popularity fades
+SEGMENT_TOP_N = 50
+POPULARITY_HALF_LIFE_DAYS = 14
+POPULAR_FIELDS = ['name', 'category', 'gender', 'price', 'avg_rating']
+
+# Snapshots older than this are ignored and training fetches from the API,
+# so a snapshot nobody refreshes can't pin the model to old data
+SNAPSHOT_MAX_AGE_HOURS = 26
+
+# Records per DataFrame chunk when reading the streamed training export
+READ_CHUNK_ROWS = 10000
+
+
+def dump_atomic(obj, path: str):
+    """
+    joblib.dump to a temp file unique to this process, in the target's
+    directory, then rename over the target: readers and other writers never
+    see a partial file, and a crash mid-save keeps the last good one.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            joblib.dump(obj, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
 
 class ProductRecommender:
-    def __init__(self, model_path='models/recommender_model.pkl', backend_url='http://localhost:8000'):
+    def __init__(self, model_path='models/recommender_model.pkl', backend_url='http://localhost:8000',
+                 auto_load=True, snapshot_dir=None, snapshot_max_age_hours=SNAPSHOT_MAX_AGE_HOURS):
         """
         Initialize the recommender.
         
         Args:
             model_path: Path to save/load trained model
             backend_url: Django backend API URL for fetching training data
+            auto_load: Load or train the model now. Pass False to construct
+                without any I/O and call load_or_train() later.
+            snapshot_dir: Shared directory of columnar training snapshots.
+                When it holds a recent snapshot of the requested window,
+                training reads it instead of fetching from the backend API.
+            snapshot_max_age_hours: Age past which a snapshot is ignored
         """
         self.model_path = model_path
         self.backend_url = backend_url
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_max_age_hours = snapshot_max_age_hours
         self.products_data = None
         self.user_interactions = None
         self.tfidf_vectorizer = None
         self.product_features_matrix = None
         self.model = None
-        self.load_or_train()
+        self.load_state = {'stage': 'pending', 'started_at': None, 'finished_at': None, 'error': None}
+        if auto_load:
+            self.load_or_train()
+
+    def _set_stage(self, stage: str, error: Optional[str] = None):
+        """Record load progress for the readiness probe"""
+        now = datetime.now().isoformat()
+        if self.load_state['started_at'] is None:
+            self.load_state['started_at'] = now
+        if stage in ('ready', 'failed'):
+            self.load_state['finished_at'] = now
+        self.load_state['stage'] = stage
+        self.load_state['error'] = error
+
+    @contextmanager
+    def _training_lock(self):
+        """
+        Exclusive file lock next to the model, held while training. Every
+        gunicorn worker loads and retrains on its own, so this makes one of
+        them train while the others wait and then load its artifact.
+        """
+        os.makedirs(os.path.dirname(self.model_path) or '.', exist_ok=True)
+        with open(f"{self.model_path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _saved_since(self, timestamp: float) -> bool:
+        """Whether the artifact on disk was written after timestamp"""
+        try:
+            return os.path.getmtime(self.model_path) > timestamp
+        except OSError:
+            return False
 
     def load_or_train(self):
-        """Load existing model or train from database"""
-        if os.path.exists(self.model_path):
-            self.load_model()
-        else:
-            os.makedirs('models', exist_ok=True)
-            try:
-                self.fetch_data_from_database()
-                self.train_model()
-                self.save_model()
-                logger.info("Model trained successfully from database")
-            except Exception as e:
-                logger.warning(f"Could not fetch from database ({e}), using dummy data instead")
-                self.generate_dummy_data()
-                self.train_model()
+        """Load the last saved model, or train from database if there is none"""
+        try:
+            if os.path.exists(self.model_path):
+                self._set_stage('loading_artifact')
+                if self.load_model():
+                    self._set_stage('ready')
+                    return
+                logger.warning("Saved model unusable, training a new one")
+
+            self._set_stage('waiting_for_trainer')
+            with self._training_lock():
+                # Another worker may have trained while we waited for the lock
+                if os.path.exists(self.model_path) and self.load_model():
+                    self._set_stage('ready')
+                    return
+                try:
+                    self._set_stage('fetching_data')
+                    self.load_training_data()
+                    self._set_stage('training')
+                    self.train_model()
+                    logger.info("Model trained successfully from database")
+                except Exception as e:
+                    logger.warning(f"Could not fetch from database ({e}), using dummy data instead")
+                    self.generate_dummy_data()
+                    self._set_stage('training')
+                    self.train_model()
+                self._set_stage('saving')
                 self.save_model()
+            self._set_stage('ready')
+        except Exception as e:
+            logger.error(f"Model loading failed: {e}")
+            self._set_stage('failed', str(e))
 
-    def fetch_data_from_database(self, days=90):
+    def fetch_data_from_database(self, days=90, incremental=False):
         """
         Fetch training data from Django backend API.
         
-        The backend should expose: GET /api/products/training_data/?days=90
-        Returns JSON with products and interactions for training.
+        The backend exposes: GET /api/products/products/training_data/?days=90&format=ndjson
+        The NDJSON export is read line by line and turned into DataFrames in
+        chunks, so the raw payload is never held in memory at once.
+
+        With incremental=True and a local dataset from an earlier fetch of the
+        same window, only changes since its watermark are transferred and
+        merged in. Every fetch refreshes the local dataset.
         """
         try:
-            response = requests.get(
-                f"{self.backend_url}/api/products/training_data/",
-                params={'days': days, 'format': 'json'},
+            cached = self._load_data_cache(days) if incremental else None
+            params = {'days': days, 'format': 'ndjson'}
+            if cached is not None:
+                params['since'] = cached['watermark']
+
+            with requests.get(
+                f"{self.backend_url}/api/products/products/training_data/",
+                params=params,
+                stream=True,
                 timeout=30
-            )
-            response.raise_for_status()
-            
-            data = response.json()
-            logger.info(f"Fetched {len(data['products'])} products and {len(data['interactions'])} interactions")
-            
-            # Convert products to DataFrame
-            self.products_data = pd.DataFrame(data['products'])
-            
-            # Handle missing ratings
-            self.products_data['avg_rating'] = self.products_data.get(
-                'avg_rating', 
-                3.5
-            ).fillna(3.5)
-            
-            # Rename category column if needed
-            if 'category__name' in self.products_data.columns:
-                self.products_data.rename(columns={'category__name': 'category'}, inplace=True)
-            
-            # Convert interactions to DataFrame
-            self.user_interactions = pd.DataFrame(data['interactions'])
-            
+            ) as response:
+                response.raise_for_status()
+                products, interactions, metadata = self._read_ndjson(response.iter_lines())
+
+            if metadata is None:
+                raise ValueError("Training data stream ended before its metadata trailer")
+            logger.info(f"Fetched {len(products)} products and {len(interactions)} interactions"
+                        + (f" since {cached['watermark']}" if cached is not None else ""))
+
+            if cached is not None:
+                products, interactions = self._merge_delta(cached, products, interactions, days)
+            self._save_data_cache(products, interactions, metadata.get('watermark'), days)
+            self._set_training_data(products, interactions)
             logger.info(f"Successfully loaded {len(self.products_data)} products from database")
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to fetch from backend: {e}")
             raise
 
-    def generate_dummy_data(self):
-        """Generate dummy training data (fallback if database unavailable)"""
+    def load_training_data(self, days: int = 90):
+        """
+        Load training data from the newest columnar snapshot if a snapshot
+        directory is configured and its snapshot is usable for this request
+        (see _snapshot_usable), otherwise from the backend API.
+        """
+        path = latest_snapshot(self.snapshot_dir) if self.snapshot_dir else None
+        if path and self._snapshot_usable(path, days):
+            self.load_snapshot(path, days=days)
+        else:
+            self.fetch_data_from_database(days=days, incremental=True)
+
+    def _snapshot_usable(self, path: str, days: int) -> bool:
+        """A snapshot is used only if it covers at least `days` and is recent enough"""
+        try:
+            manifest = read_manifest(path)
+            generated_at = datetime.fromisoformat(manifest['generated_at'])
+            if generated_at.tzinfo is None:
+                generated_at = generated_at.replace(tzinfo=timezone.utc)
+            window = manifest['date_range_days']
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable snapshot {os.path.basename(path)}: {e}")
+            return False
+
+        age_hours = (datetime.now(timezone.utc) - generated_at).total_seconds() / 3600
+        if window < days:
+            reason = f"covers {window} days, {days} requested"
+        elif age_hours > self.snapshot_max_age_hours:
+            reason = f"is {age_hours:.1f}h old (max {self.snapshot_max_age_hours}h)"
+        else:
+            return True
+        logger.info(f"Snapshot {os.path.basename(path)} {reason}, fetching from the backend instead")
+        return False
+
+    def load_snapshot(self, path: str, days: Optional[int] = None):
+        """
+        Load training data from a columnar snapshot directory (memory-mapped).
+        Interactions older than `days`, if given, are left out, so a 90-day
+        snapshot also serves a 30-day retrain.
+        """
+        products, interactions, manifest = read_snapshot(path)
+        if days is not None and days < manifest['date_range_days'] and 'created_at' in interactions.columns:
+            # Snapshot datetimes are naive UTC
+            cutoff = pd.Timestamp.now(tz='UTC').tz_localize(None) - pd.Timedelta(days=days)
+            interactions = interactions[interactions['created_at'] >= cutoff].reset_index(drop=True)
+        self._set_training_data(products, interactions)
+        logger.info(
+            f"Loaded snapshot {os.path.basename(path)} ({days or manifest['date_range_days']} days): "
+            f"{len(products)} products, {len(interactions)} interactions"
+        )
+
+    def _set_training_data(self, products: pd.DataFrame, interactions: pd.DataFrame):
+        """Normalize fetched frames into products_data and user_interactions"""
+        self.products_data = products.copy()
+
+        # Handle missing ratings
+        self.products_data['avg_rating'] = self.products_data.get(
+            'avg_rating',
+            3.5
+        ).fillna(3.5)
+
+        # Rename category column if needed
+        if 'category__name' in self.products_data.columns:
+            self.products_data.rename(columns={'category__name': 'category'}, inplace=True)
+
+        self.user_interactions = interactions
+
+    @property
+    def data_cache_path(self) -> str:
+        """Local copy of the raw training export, kept next to the model"""
+        return os.path.join(os.path.dirname(self.model_path) or '.', 'training_data_cache.pkl')
+
+    def _load_data_cache(self, days: int) -> Optional[Dict]:
+        """Return the local dataset if it covers the same window and has a watermark"""
+        if not os.path.exists(self.data_cache_path):
+            return None
+        try:
+            cached = joblib.load(self.data_cache_path)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable training data cache: {e}")
+            return None
+        if cached.get('days') != days or not cached.get('watermark'):
+            return None
+        return cached
+
+    def _cached_interactions(self) -> Optional[pd.DataFrame]:
+        """Interactions from the local dataset, whatever its window, or None"""
+        if not os.path.exists(self.data_cache_path):
+            return None
+        try:
+            return joblib.load(self.data_cache_path).get('interactions')
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable training data cache: {e}")
+            return None
+
+    def _save_data_cache(self, products: pd.DataFrame, interactions: pd.DataFrame,
+                         watermark: Optional[str], days: int):
+        dump_atomic({
+            'products': products,
+            'interactions': interactions,
+            'watermark': watermark,
+            'days': days,
+        }, self.data_cache_path)
+
+    @staticmethod
+    def _merge_delta(cached: Dict, products: pd.DataFrame, interactions: pd.DataFrame, days: int):
+        """
+        Apply an incremental export to the local dataset: changed products
+        replace their old rows (deactivated ones are dropped), new
+        interactions are appended (rows already held, from the export's
+        overlap window, are de-duplicated by id) and ones older than the
+        window age out.
+        """
+        products = pd.concat([cached['products'], products], ignore_index=True)
+        if 'id' in products.columns:
+            products = products.drop_duplicates('id', keep='last')
+        if 'is_active' in products.columns:
+            products = products[products['is_active'].fillna(True).astype(bool)]
+        products = products.reset_index(drop=True)
+
+        interactions = pd.concat([cached['interactions'], interactions], ignore_index=True)
+        if 'id' in interactions.columns:
+            # Deltas re-read an overlap before the watermark
+            interactions = interactions.drop_duplicates('id', keep='last')
+        if 'created_at' in interactions.columns:
+            created_at = pd.to_datetime(interactions['created_at'], utc=True, errors='coerce')
+            interactions = interactions[created_at >= pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=days)]
+        return products, interactions.reset_index(drop=True)
+
+    @staticmethod
+    def _read_ndjson(lines, chunk_rows: int = READ_CHUNK_ROWS):
+        """
+        Build product and interaction DataFrames from NDJSON lines tagged
+        with a "type", converting every chunk_rows records into a frame.
+        Returns (products, interactions, metadata trailer or None).
+        """
+        buffers = {'product': [], 'interaction': []}
+        frames = {'product': [], 'interaction': []}
+        metadata = None
+        for line in lines:
+            if not line:
+                continue
+            record = json.loads(line)
+            record_type = record.pop('type', None)
+            if record_type == 'metadata':
+                metadata = record
+                continue
+            buffer = buffers.get(record_type)
+            if buffer is None:
+                continue
+            buffer.append(record)
+            if len(buffer) >= chunk_rows:
+                frames[record_type].append(pd.DataFrame.from_records(buffer))
+                buffer.clear()
+
+        for record_type, buffer in buffers.items():
+            if buffer:
+                frames[record_type].append(pd.DataFrame.from_records(buffer))
+
+        def combine(parts):
+            return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+        return combine(frames['product']), combine(frames['interaction']), metadata
+
+    def generate_dummy_data(self, days: int = 90):
+        """
+        Generate dummy training data (fallback if database unavailable).
+        Each user's interactions are spread over the last `days` days, in
+        order, so time-based splits and recency weights have something to
+        work with.
+        """
         logger.info("Generating dummy training data...")
         np.random.seed(42)
+        now = datetime.now(timezone.utc)
 
         categories = ['T-Shirts', 'Jeans', 'Jackets', 'Shoes', 'Dresses', 'Sweaters']
         genders = ['M', 'W', 'U']
@@ -123,26 +396,37 @@ class ProductRecommender:
         for user_id in range(1, num_users + 1):
             num_interactions = np.random.randint(2, 16)
             product_ids = np.random.choice(self.products_data['id'].values, num_interactions, replace=False)
+            ages_days = np.sort(np.random.uniform(0, days, num_interactions))[::-1]
 
-            for product_id in product_ids:
+            for product_id, age_days in zip(product_ids, ages_days):
                 interactions.append({
                     'user_id': user_id,
                     'product_id': product_id,
                     'interaction_type': np.random.choice(['view', 'add_to_cart', 'purchase'], p=[0.5, 0.2, 0.3]),
                     'rating': np.random.randint(1, 6) if np.random.random() > 0.7 else None,
-                    'created_at': datetime.now(),
+                    'created_at': now - timedelta(days=float(age_days)),
                 })
 
         self.user_interactions = pd.DataFrame(interactions)
         logger.info(f"Generated {len(self.products_data)} dummy products and {len(interactions)} interactions")
 
     def train_model(self):
-        """Train the recommender model on product features"""
+        """
+        Train the recommender model on product features.
+
+        Everything requests read (matrices, product index, user histories,
+        cold-start lists) is built in locals and published with a single
+        assignment to self.model, so a request sees either the old model or
+        the new one, never a mix, and self.model is only set once complete.
+        """
         if self.products_data is None:
             self.generate_dummy_data()
 
+        started = time.perf_counter()
+        products = self.products_data.copy()
+        interactions = self.user_interactions
         feature_text = []
-        for idx, row in self.products_data.iterrows():
+        for idx, row in products.iterrows():
             text_parts = [
                 str(row.get('category', '')),
                 str(row.get('gender', '')),
@@ -153,123 +437,395 @@ class ProductRecommender:
             text = ' '.join([p for p in text_parts if p])
             feature_text.append(text if text else 'generic product')
 
-        self.tfidf_vectorizer = TfidfVectorizer(max_features=50, stop_words='english')
-        self.product_features_matrix = self.tfidf_vectorizer.fit_transform(feature_text)
+        vectorizer = TfidfVectorizer(max_features=50, stop_words='english')
+        features_matrix = vectorizer.fit_transform(feature_text)
 
-        price_values = self.products_data['price'].values
+        price_values = products['price'].values
         price_normalized = (price_values - np.mean(price_values)) / (np.std(price_values) + 1e-8)
-        rating_normalized = self.products_data['avg_rating'].values / 5.0
+        rating_normalized = products['avg_rating'].values / 5.0
 
-        self.model = {
-            'products': self.products_data.copy(),
-            'tfidf_matrix': self.product_features_matrix,
+        product_index = self._build_product_index(products)
+        popularity = self._compute_popularity(products, product_index, interactions)
+        model = {
+            'products': products,
+            'tfidf_matrix': features_matrix,
             'price_normalized': price_normalized,
             'rating_normalized': rating_normalized,
-            'vectorizer': self.tfidf_vectorizer,
+            'vectorizer': vectorizer,
+            'trained_at': time.time(),
+            'product_index': product_index,
+            'user_items': self._build_user_items(interactions),
+            'popularity': popularity,
+            'segment_top': self._build_segment_lists(products, popularity),
         }
-        
-        logger.info(f"Model trained with {len(self.model['products'])} products")
+
+        self.tfidf_vectorizer = vectorizer
+        self.product_features_matrix = features_matrix
+        self.model = model
+
+        TRAINING_DURATION.observe(time.perf_counter() - started)
+        TRAINING_ROWS.labels('products').set(len(products))
+        TRAINING_ROWS.labels('interactions').set(0 if interactions is None else len(interactions))
+        record_model(model)
+
+        logger.info(f"Model trained with {len(products)} products")
+
+    @property
+    def product_index(self) -> Dict[int, int]:
+        """Product id -> row position in the current model's arrays"""
+        model = self.model
+        return model['product_index'] if model is not None else {}
+
+    @property
+    def user_items(self) -> Dict[int, List[tuple]]:
+        """User id -> (product_id, weight) history of the current model"""
+        model = self.model
+        return model['user_items'] if model is not None else {}
+
+    @staticmethod
+    def _build_product_index(products: pd.DataFrame) -> Dict[int, int]:
+        """Map product ids to their row position in the model arrays"""
+        product_col = 'id' if 'id' in products.columns else 'product_id'
+        return {int(pid): row for row, pid in enumerate(products[product_col].values)}
+
+    @staticmethod
+    def _build_user_items(interactions: Optional[pd.DataFrame]) -> Dict[int, List[tuple]]:
+        """
+        Collect each user's (product_id, weight) history once at training
+        time, so per-request lookups don't scan the interactions frame.
+        """
+        user_items = {}
+        if interactions is None or interactions.empty:
+            return user_items
+        weights = interactions['interaction_type'].map(INTERACTION_WEIGHTS).astype(float).fillna(0)
+        history = pd.DataFrame({
+            'user_id': interactions['user_id'],
+            'product_id': interactions['product_id'],
+            'weight': weights,
+        }).dropna(subset=['user_id', 'product_id'])
+        history = history.groupby(['user_id', 'product_id'], sort=False)['weight'].sum().reset_index()
+        for user_id, group in history.groupby('user_id', sort=False):
+            user_items[int(user_id)] = list(zip(group['product_id'].astype(int), group['weight']))
+        return user_items
+
+    @staticmethod
+    def _compute_popularity(products: pd.DataFrame, product_index: Dict[int, int],
+                            interactions: Optional[pd.DataFrame]) -> np.ndarray:
+        """
+        Interaction-weighted popularity per product row, with each
+        interaction's weight halved every POPULARITY_HALF_LIFE_DAYS.
+        """
+        popularity = np.zeros(len(products))
+        if interactions is None or interactions.empty:
+            return popularity
+
+        weights = interactions['interaction_type'].map(INTERACTION_WEIGHTS).astype(float).fillna(0).values
+        if 'created_at' in interactions.columns:
+            created_at = pd.to_datetime(interactions['created_at'], utc=True, errors='coerce')
+            age_days = (pd.Timestamp.now(tz='UTC') - created_at).dt.total_seconds().values / 86400
+            age_days = np.clip(np.nan_to_num(age_days, nan=0.0), 0, None)
+            weights = weights * 0.5 ** (age_days / POPULARITY_HALF_LIFE_DAYS)
+
+        rows = interactions['product_id'].map(product_index)
+        known = rows.notna().values
+        np.add.at(popularity, rows[known].astype(int).values, weights[known])
+        return popularity
+
+    @staticmethod
+    def _build_segment_lists(products: pd.DataFrame, popularity: np.ndarray) -> Dict:
+        """
+        Rank in-stock products by popularity (ties broken by rating) and keep
+        the top SEGMENT_TOP_N per segment. Keys are (gender, category) with
+        '*' as the wildcard, so ('*', '*') is the overall list.
+        """
+        product_col = 'id' if 'id' in products.columns else 'product_id'
+        ratings = products['avg_rating'].fillna(0).values
+        order = np.lexsort((-ratings, -popularity))
+        if 'stock' in products.columns:
+            in_stock = products['stock'].fillna(0).values > 0
+            order = order[in_stock[order]]
+
+        genders = products['gender'].astype(str).values if 'gender' in products.columns else None
+        categories = products['category'].astype(str).values if 'category' in products.columns else None
+        records = products[[product_col] + [f for f in POPULAR_FIELDS if f in products.columns]]
+
+        segments: Dict[tuple, List[int]] = {}
+        for row in order:
+            gender = genders[row] if genders is not None else '*'
+            category = categories[row] if categories is not None else '*'
+            for key in {('*', '*'), (gender, '*'), ('*', category), (gender, category)}:
+                rows = segments.setdefault(key, [])
+                if len(rows) < SEGMENT_TOP_N:
+                    rows.append(row)
+
+        return {
+            key: records.iloc[rows].to_dict('records')
+            for key, rows in segments.items()
+        }
+
+    def get_popular_products(self, n_recommendations: int = 5, gender: Optional[str] = None,
+                             category: Optional[str] = None) -> List[Dict]:
+        """
+        Get the most popular in-stock products for a segment from the lists
+        precomputed at training time. Unknown segments fall back to overall.
+        """
+        model = self.model
+        if model is None:
+            return []
+
+        segment_top = model['segment_top']
+        key = (gender or '*', category or '*')
+        popular = segment_top.get(key, segment_top.get(('*', '*'), []))
+        return popular[:n_recommendations]
+
+    @staticmethod
+    def _materialize(model: Dict, indices, scores) -> List[Dict]:
+        """Build recommendation dicts for the given row positions"""
+        products = model['products']
+        product_col = 'id' if 'id' in products.columns else 'product_id'
+        recommendations = []
+        for idx in indices:
+            row = products.iloc[idx]
+            prod_id = int(row[product_col])
+            recommendations.append({
+                'product_id': prod_id,
+                'name': str(row.get('name', f'Product {prod_id}')),
+                'category': str(row.get('category', 'Unknown')),
+                'gender': str(row.get('gender', 'U')),
+                'color': str(row.get('color', 'Unknown')),
+                'price': float(row['price']),
+                'rating': float(row.get('avg_rating', 3.5)),
+                'similarity_score': float(scores[idx]),
+            })
+        return recommendations
 
     def get_recommendations(self, product_id: int, user_preferences: Optional[Dict] = None, n_recommendations: int = 5) -> List[Dict]:
         """Get product recommendations based on content similarity"""
-        if self.model is None:
+        # One read of self.model, so a concurrent retrain can't mix two models
+        model = self.model
+        if model is None:
             logger.warning("Model not trained yet")
             return []
 
-        product_col = 'id' if 'id' in self.model['products'].columns else 'product_id'
-        matching_products = self.model['products'][self.model['products'][product_col] == product_id]
+        with stage_timer('lookup'):
+            idx = model['product_index'].get(int(product_id))
         
-        if matching_products.empty:
+        if idx is None:
             logger.warning(f"Product {product_id} not found in database")
             return []
 
-        idx = matching_products.index[0]
+        with stage_timer('similarity'):
+            similarity_scores = cosine_similarity(
+                model['tfidf_matrix'][idx], 
+                model['tfidf_matrix']
+            ).flatten()
 
-        similarity_scores = cosine_similarity(
-            self.model['tfidf_matrix'][idx], 
-            self.model['tfidf_matrix']
-        ).flatten()
-
-        price_similarity = 1 - np.abs(
-            self.model['price_normalized'] - self.model['price_normalized'][idx]
-        ) / 2
-        price_similarity = np.clip(price_similarity, 0, 1)
-        
-        rating_boost = self.model['rating_normalized'] * 0.2
+            price_similarity = 1 - np.abs(
+                model['price_normalized'] - model['price_normalized'][idx]
+            ) / 2
+            price_similarity = np.clip(price_similarity, 0, 1)
+            
+            rating_boost = model['rating_normalized'] * 0.2
 
-        combined_scores = similarity_scores * 0.7 + price_similarity * 0.2 + rating_boost
+            combined_scores = similarity_scores * 0.7 + price_similarity * 0.2 + rating_boost
 
         if user_preferences:
-            for key, value in user_preferences.items():
-                if key in self.model['products'].columns:
-                    match_mask = (self.model['products'][key] == value).values
-                    combined_scores = combined_scores * (1 + match_mask * 0.3)
+            with stage_timer('preference_boost'):
+                for key, value in user_preferences.items():
+                    if key in model['products'].columns:
+                        match_mask = (model['products'][key] == value).values
+                        combined_scores = combined_scores * (1 + match_mask * 0.3)
+
+        with stage_timer('ranking'):
+            top_indices = [i for i in np.argsort(combined_scores)[::-1] if i != idx]
+        with stage_timer('materialization'):
+            return self._materialize(model, top_indices[:n_recommendations], combined_scores)
+
+    def get_session_recommendations(self, weighted_items: List[tuple], n_recommendations: int = 5) -> List[Dict]:
+        """
+        Get recommendations for an in-progress session.
 
-        top_indices = np.argsort(combined_scores)[::-1]
-        recommendations = []
-        
-        for idx in top_indices:
-            prod_id = int(self.model['products'].iloc[idx][product_col])
-            if prod_id != product_id and len(recommendations) < n_recommendations:
-                recommendations.append({
-                    'product_id': prod_id,
-                    'name': str(self.model['products'].iloc[idx].get('name', f'Product {prod_id}')),
-                    'category': str(self.model['products'].iloc[idx].get('category', 'Unknown')),
-                    'gender': str(self.model['products'].iloc[idx].get('gender', 'U')),
-                    'color': str(self.model['products'].iloc[idx].get('color', 'Unknown')),
-                    'price': float(self.model['products'].iloc[idx]['price']),
-                    'rating': float(self.model['products'].iloc[idx].get('avg_rating', 3.5)),
-                    'similarity_score': float(combined_scores[idx]),
-                })
+        Args:
+            weighted_items: (product_id, weight) pairs of recently interacted
+                products, already decayed by recency
+            n_recommendations: Number of products to return
+        """
+        model = self.model
+        if model is None:
+            logger.warning("Model not trained yet")
+            return []
 
-        return recommendations
+        with stage_timer('lookup'):
+            rows, weights = self._resolve_weighted_items(model, weighted_items)
+        if not rows:
+            return []
+
+        with stage_timer('similarity'):
+            combined_scores = self._profile_scores(model, rows, weights)
+        combined_scores[rows] = -np.inf
+
+        n = min(n_recommendations, len(combined_scores) - len(set(rows)))
+        if n <= 0:
+            return []
+        with stage_timer('ranking'):
+            top_indices = np.argpartition(combined_scores, -n)[-n:]
+            top_indices = top_indices[np.argsort(combined_scores[top_indices])[::-1]]
+        with stage_timer('materialization'):
+            return self._materialize(model, top_indices, combined_scores)
+
+    @staticmethod
+    def _resolve_weighted_items(model: Dict, weighted_items) -> tuple:
+        """Map (product_id, weight) pairs to model rows, dropping unknown products"""
+        product_index = model['product_index']
+        rows, weights = [], []
+        for product_id, weight in weighted_items:
+            row = product_index.get(int(product_id))
+            if row is not None and weight > 0:
+                rows.append(row)
+                weights.append(weight)
+        return rows, weights
+
+    @staticmethod
+    def _profile_scores(model: Dict, rows: List[int], weights: List[float], candidate_rows=None) -> np.ndarray:
+        """
+        Score products against a profile built as the weighted blend of the
+        given rows. Only candidate_rows are scored when given, so the cost
+        scales with the candidate count rather than the catalog size.
+        """
+        weights = np.asarray(weights, dtype=float)
+        weights = weights / np.sum(weights)
+        tfidf = model['tfidf_matrix']
+        price_normalized = model['price_normalized']
+        rating_normalized = model['rating_normalized']
+        if candidate_rows is not None:
+            candidate_tfidf = tfidf[candidate_rows]
+            candidate_price = price_normalized[candidate_rows]
+            candidate_rating = rating_normalized[candidate_rows]
+        else:
+            candidate_tfidf, candidate_price, candidate_rating = tfidf, price_normalized, rating_normalized
+
+        profile = tfidf[rows].T.dot(weights).reshape(1, -1)
+        similarity_scores = cosine_similarity(profile, candidate_tfidf).flatten()
+
+        profile_price = np.dot(weights, price_normalized[rows])
+        price_similarity = np.clip(1 - np.abs(candidate_price - profile_price) / 2, 0, 1)
+        rating_boost = candidate_rating * 0.2
+
+        return similarity_scores * 0.7 + price_similarity * 0.2 + rating_boost
+
+    def rerank(self, candidate_ids: List[int], user_id: Optional[int] = None,
+               seed_product_ids: Optional[List[int]] = None) -> Dict:
+        """
+        Order a caller-supplied candidate list for a user or a set of seed
+        products.
+
+        The profile comes from the seed products when given, otherwise from
+        the user's interaction history. Without either, candidates are
+        ordered by popularity. Candidates unknown to the model are returned
+        separately, in their original order.
+        """
+        model = self.model
+        if model is None:
+            logger.warning("Model not trained yet")
+            return {'ranked': [], 'unknown': list(candidate_ids)}
+
+        with stage_timer('lookup'):
+            product_index = model['product_index']
+            candidate_rows, known_ids, unknown_ids = [], [], []
+            for product_id in candidate_ids:
+                row = product_index.get(int(product_id))
+                if row is None:
+                    unknown_ids.append(product_id)
+                else:
+                    candidate_rows.append(row)
+                    known_ids.append(int(product_id))
+            if not candidate_rows:
+                return {'ranked': [], 'unknown': unknown_ids}
+
+            if seed_product_ids:
+                weighted_items = [(product_id, 1.0) for product_id in seed_product_ids]
+            elif user_id is not None:
+                weighted_items = model['user_items'].get(int(user_id), [])
+            else:
+                weighted_items = []
+            rows, weights = self._resolve_weighted_items(model, weighted_items)
+
+        candidate_rows = np.asarray(candidate_rows)
+        with stage_timer('similarity'):
+            if rows:
+                scores = self._profile_scores(model, rows, weights, candidate_rows)
+            else:
+                scores = model['popularity'][candidate_rows] + model['rating_normalized'][candidate_rows] * 1e-3
+
+        with stage_timer('ranking'):
+            order = np.argsort(-scores, kind='stable')
+        with stage_timer('materialization'):
+            ranked = [
+                {'product_id': known_ids[i], 'score': float(scores[i])}
+                for i in order
+            ]
+        return {'ranked': ranked, 'unknown': unknown_ids}
 
     def get_personalized_recommendations(self, user_id: int, n_recommendations: int = 5) -> List[Dict]:
         """Get personalized recommendations based on user history"""
-        if self.user_interactions is None or self.model is None:
-            logger.warning("Model or interactions not loaded")
+        model = self.model
+        if model is None:
+            logger.warning("Model not loaded")
             return []
 
-        user_history = self.user_interactions[self.user_interactions['user_id'] == user_id]
-        
-        if user_history.empty:
+        # Histories are part of the model, so workers that loaded the
+        # artifact instead of training have them too
+        user_history = model['user_items'].get(int(user_id), [])
+
+        if not user_history:
             logger.info(f"No history found for user {user_id}, returning popular products")
-            product_col = 'id' if 'id' in self.model['products'].columns else 'product_id'
-            popular = self.model['products'].nlargest(n_recommendations, 'avg_rating')
-            return popular[[product_col, 'name', 'category', 'price', 'avg_rating']].to_dict('records')
+            return self.get_popular_products(n_recommendations)
 
         user_prefs = {}
-        if 'gender' in self.model['products'].columns:
-            gender_counts = user_history.merge(
-                self.model['products'],
-                left_on='product_id',
-                right_on='id' if 'id' in self.model['products'].columns else 'product_id'
-            )['gender'].value_counts()
-            if not gender_counts.empty:
-                user_prefs['gender'] = gender_counts.idxmax()
+        products = model['products']
+        if 'gender' in products.columns:
+            genders = products['gender'].values
+            gender_counts = Counter(
+                genders[row] for row in (model['product_index'].get(product_id) for product_id, _ in user_history)
+                if row is not None
+            )
+            if gender_counts:
+                user_prefs['gender'] = gender_counts.most_common(1)[0][0]
 
         recommendations = []
-        for _, interaction in user_history.iterrows():
-            product_id = int(interaction['product_id'])
+        for product_id, _ in user_history:
             recs = self.get_recommendations(product_id, user_prefs, n_recommendations * 2)
             recommendations.extend(recs)
 
-        seen_ids = set(user_history['product_id'].values)
+        seen_ids = {product_id for product_id, _ in user_history}
         unique_recs = []
         for rec in sorted(recommendations, key=lambda x: x['similarity_score'], reverse=True):
             if rec['product_id'] not in seen_ids and len(unique_recs) < n_recommendations:
                 unique_recs.append(rec)
                 seen_ids.add(rec['product_id'])
 
+        if not unique_recs:
+            # The history's products are no longer in the model
+            logger.info(f"No current products in the history of user {user_id}, returning popular products")
+            return self.get_popular_products(n_recommendations)
         return unique_recs
 
     def retrain_model(self, days: int = 90) -> bool:
-        """Retrain the model with fresh data from the backend database"""
+        """
+        Retrain the model with fresh data from the backend database. If
+        another worker retrained while this one waited for the training
+        lock, its artifact is loaded instead of training again.
+        """
         logger.info(f"Starting model retraining with {days} days of data...")
+        requested_at = time.time()
         try:
-            self.fetch_data_from_database(days=days)
-            self.train_model()
-            self.save_model()
+            with self._training_lock():
+                if self._saved_since(requested_at) and self.load_model():
+                    logger.info("Model was retrained by another worker, loaded its artifact")
+                    return True
+                self.load_training_data(days=days)
+                self.train_model()
+                self.save_model()
             logger.info("Model retraining completed successfully")
             return True
         except Exception as e:
@@ -278,31 +834,48 @@ class ProductRecommender:
 
     def save_model(self):
         """Save trained model to disk"""
-        if self.model is None:
+        model = self.model
+        if model is None:
             logger.warning("No model to save")
             return
 
-        os.makedirs(os.path.dirname(self.model_path) or '.', exist_ok=True)
-        joblib.dump(self.model, self.model_path)
+        dump_atomic(model, self.model_path)
         logger.info(f"Model saved to {self.model_path}")
 
-    def load_model(self):
-        """Load trained model from disk"""
+    def load_model(self) -> bool:
+        """
+        Load trained model from disk. Parts missing from artifacts saved by
+        older versions are rebuilt before the model is published. Returns
+        False, keeping the current model, if the artifact is unusable.
+        """
         try:
-            self.model = joblib.load(self.model_path)
-            logger.info(f"Model loaded from {self.model_path}")
+            model = joblib.load(self.model_path)
+            if 'product_index' not in model:
+                model['product_index'] = self._build_product_index(model['products'])
+            if 'popularity' not in model:
+                model['popularity'] = np.zeros(len(model['products']))
+            if 'segment_top' not in model:
+                model['segment_top'] = self._build_segment_lists(model['products'], model['popularity'])
+            if 'user_items' not in model:
+                model['user_items'] = self._build_user_items(self._cached_interactions())
         except Exception as e:
             logger.error(f"Failed to load model: {e}")
-            self.model = None
+            return False
+        self.model = model
+        record_model(model)
+        logger.info(f"Model loaded from {self.model_path}")
+        return True
 
     def get_model_info(self) -> Dict:
         """Get information about the current model"""
-        if self.model is None:
+        model = self.model
+        if model is None:
             return {'status': 'not_trained'}
 
         return {
             'status': 'trained',
-            'num_products': len(self.model['products']),
-            'num_features': self.model['tfidf_matrix'].shape[1],
+            'num_products': len(model['products']),
+            'num_features': model['tfidf_matrix'].shape[1],
             'model_path': self.model_path,
+            'trained_at': model.get('trained_at'),
         }
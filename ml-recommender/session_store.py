@@ -0,0 +1,92 @@
+import time
+import logging
+from collections import OrderedDict, deque
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Relative strength of each interaction type in the session profile
+INTERACTION_WEIGHTS = {
+    'view': 1.0,
+    'add_to_cart': 3.0,
+    'purchase': 5.0,
+    'rate': 2.0,
+}
+
+
+class SessionStore:
+    """
+    Bounded, in-memory store of recent interactions per shopping session.
+
+    Each session keeps a ring buffer of its last `max_events` interactions.
+    Sessions are kept in least-recently-active order so idle ones and the
+    overflow beyond `max_sessions` are evicted in O(1) from the front.
+    """
+
+    def __init__(self, max_events: int = 50, max_sessions: int = 100000,
+                 idle_seconds: int = 1800, half_life_seconds: int = 900):
+        self.max_events = max_events
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.half_life_seconds = half_life_seconds
+        self._sessions: "OrderedDict[str, deque]" = OrderedDict()
+        self._last_seen: Dict[str, float] = {}
+        self._lock = Lock()
+
+    def add(self, session_id: str, product_id: int, interaction_type: str,
+            timestamp: Optional[float] = None):
+        """Record an interaction and evict idle or excess sessions"""
+        weight = INTERACTION_WEIGHTS.get(interaction_type)
+        if weight is None:
+            return
+        now = time.time()
+        timestamp = timestamp or now
+
+        with self._lock:
+            events = self._sessions.get(session_id)
+            if events is None:
+                events = deque(maxlen=self.max_events)
+                self._sessions[session_id] = events
+            else:
+                self._sessions.move_to_end(session_id)
+            events.append((int(product_id), weight, timestamp))
+            self._last_seen[session_id] = now
+            self._evict(now)
+
+    def _evict(self, now: float):
+        """Drop sessions from the least recently active end (lock held)"""
+        while self._sessions:
+            oldest = next(iter(self._sessions))
+            idle = now - self._last_seen[oldest] > self.idle_seconds
+            if not idle and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[oldest]
+            del self._last_seen[oldest]
+
+    def get_weighted_items(self, session_id: str,
+                           now: Optional[float] = None) -> List[Tuple[int, float]]:
+        """
+        Return (product_id, weight) pairs for a session, with each event's
+        type weight decayed exponentially by its age.
+        """
+        now = now or time.time()
+        with self._lock:
+            events = list(self._sessions.get(session_id, ()))
+
+        weights: Dict[int, float] = {}
+        for product_id, weight, timestamp in events:
+            age = max(now - timestamp, 0.0)
+            decayed = weight * 0.5 ** (age / self.half_life_seconds)
+            weights[product_id] = weights.get(product_id, 0.0) + decayed
+        return list(weights.items())
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'events': sum(len(events) for events in self._sessions.values()),
+                'max_sessions': self.max_sessions,
+                'max_events_per_session': self.max_events,
+                'idle_seconds': self.idle_seconds,
+            }
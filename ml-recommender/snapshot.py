@@ -0,0 +1,60 @@
+"""
+Reader for the columnar training snapshots written by the backend's
+`manage.py export_training_snapshot` (see backend/products/snapshots.py).
+
+Each column is an .npy file opened with mmap_mode='r', so loading a
+snapshot maps the files instead of parsing them; dictionary-encoded text
+columns become pandas Categoricals built straight from their code arrays.
+"""
+import os
+import json
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMAT_VERSION = 1
+LATEST_FILE = 'LATEST'
+
+
+def latest_snapshot(root: str) -> Optional[str]:
+    """Path of the snapshot LATEST points at, or None if there is none"""
+    try:
+        with open(os.path.join(root, LATEST_FILE)) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    path = os.path.join(root, name)
+    return path if name and os.path.isdir(path) else None
+
+
+def _read_table(path: str, table: Dict) -> pd.DataFrame:
+    rows = table['rows']
+    columns = {}
+    for column in table['columns']:
+        values = np.load(os.path.join(path, column['file']), mmap_mode='r')[:rows]
+        if column['encoding'] == 'dictionary':
+            with open(os.path.join(path, column['dictionary'])) as f:
+                categories = json.load(f)
+            values = pd.Categorical.from_codes(values, categories=categories)
+        columns[column['name']] = values
+    return pd.DataFrame(columns, copy=False)
+
+
+def read_manifest(path: str) -> Dict:
+    """A snapshot's manifest, without touching its column files"""
+    with open(os.path.join(path, 'manifest.json')) as f:
+        return json.load(f)
+
+
+def read_snapshot(path: str) -> Tuple[pd.DataFrame, pd.DataFrame, Dict]:
+    """Return (products, interactions, manifest) for a snapshot directory"""
+    manifest = read_manifest(path)
+    if manifest.get('format_version') != SUPPORTED_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format {manifest.get('format_version')} in {path}")
+
+    products = _read_table(path, manifest['tables']['products'])
+    interactions = _read_table(path, manifest['tables']['interactions'])
+    return products, interactions, manifest
@@ -0,0 +1,230 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+import numpy as np
+from evaluation import time_split
+from recommender import ProductRecommender
+from session_store import SessionStore
+from snapshot import LATEST_FILE, SUPPORTED_FORMAT_VERSION
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+logging.disable(logging.WARNING)
+
+
+class SavedArtifactTests(unittest.TestCase):
+    """A worker that loads another worker's artifact serves like the trainer"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.model_path = os.path.join(cls.directory, 'model.pkl')
+        cls.trainer = ProductRecommender(model_path=cls.model_path, auto_load=False)
+        cls.trainer.generate_dummy_data()
+        cls.trainer.train_model()
+        cls.trainer.save_model()
+        cls.loader = ProductRecommender(model_path=cls.model_path, auto_load=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_loads_without_training(self):
+        self.assertEqual(self.loader.load_state['stage'], 'ready')
+        self.assertIsNone(self.loader.user_interactions)
+        self.assertEqual(self.loader.user_items.keys(), self.trainer.user_items.keys())
+
+    def test_personalized_for_known_user(self):
+        user_id = next(iter(self.trainer.user_items))
+        seen = {product_id for product_id, _ in self.trainer.user_items[user_id]}
+        recommendations = self.loader.get_personalized_recommendations(user_id, 5)
+        self.assertEqual(len(recommendations), 5)
+        self.assertEqual(recommendations, self.trainer.get_personalized_recommendations(user_id, 5))
+        self.assertFalse(seen & {rec['product_id'] for rec in recommendations})
+
+    def test_unknown_user_gets_popular_products(self):
+        recommendations = self.loader.get_personalized_recommendations(10 ** 9, 5)
+        self.assertEqual(len(recommendations), 5)
+        self.assertEqual(recommendations, self.loader.get_popular_products(5))
+
+    def test_history_of_removed_products_gets_popular_products(self):
+        user_id = 10 ** 9 + 1
+        model = dict(self.loader.model, user_items={user_id: [(10 ** 9, 1.0)]})
+        recommender = ProductRecommender(model_path=self.model_path, auto_load=False)
+        recommender.model = model
+        self.assertEqual(recommender.get_personalized_recommendations(user_id, 5),
+                         recommender.get_popular_products(5))
+
+
+def write_snapshot(root, days, age_hours=1, interaction_ages_days=(1, 10, 45, 80)):
+    """A minimal snapshot as the backend writes it: 3 products, one interaction per age"""
+    now = datetime.now(timezone.utc)
+    name = f'snapshot-{days}-{age_hours}'
+    path = os.path.join(root, name)
+    os.makedirs(path)
+
+    def table(table_name, columns):
+        entries = []
+        for column, values in columns.items():
+            entry = {'name': column, 'file': f'{table_name}.{column}.npy', 'encoding': 'plain'}
+            if isinstance(values[0], str):
+                categories = sorted(set(values))
+                with open(os.path.join(path, f'{table_name}.{column}.dict.json'), 'w') as f:
+                    json.dump(categories, f)
+                values = np.array([categories.index(value) for value in values], dtype='int32')
+                entry.update(encoding='dictionary', dictionary=f'{table_name}.{column}.dict.json')
+            np.save(os.path.join(path, entry['file']), np.asarray(values))
+            entries.append(entry)
+        return {'rows': len(next(iter(columns.values()))), 'columns': entries}
+
+    naive_now = now.replace(tzinfo=None)
+    manifest = {
+        'format_version': SUPPORTED_FORMAT_VERSION,
+        'generated_at': (now - timedelta(hours=age_hours)).isoformat(),
+        'date_range_days': days,
+        'tables': {
+            'products': table('products', {
+                'id': [1, 2, 3], 'name': ['A', 'B', 'C'], 'category': ['Shoes', 'Shoes', 'Jeans'],
+                'gender': ['M', 'W', 'U'], 'color': ['Black', 'Blue', 'Red'],
+                'material': ['Cotton', 'Denim', 'Wool'], 'size': ['M', 'L', 'S'],
+                'price': [10.0, 20.0, 30.0], 'avg_rating': [4.0, 3.5, 5.0],
+            }),
+            'interactions': table('interactions', {
+                'id': list(range(1, len(interaction_ages_days) + 1)),
+                'user_id': [7] * len(interaction_ages_days),
+                'product_id': [1 + i % 3 for i in range(len(interaction_ages_days))],
+                'interaction_type': ['view'] * len(interaction_ages_days),
+                'created_at': np.array([naive_now - timedelta(days=age) for age in interaction_ages_days],
+                                       dtype='datetime64[us]'),
+            }),
+        },
+    }
+    with open(os.path.join(path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+    with open(os.path.join(root, LATEST_FILE), 'w') as f:
+        f.write(name)
+
+
+class SnapshotWindowTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.recommender = ProductRecommender(
+            model_path=os.path.join(self.directory, 'model.pkl'), auto_load=False, snapshot_dir=self.directory,
+        )
+        fetch = mock.patch.object(ProductRecommender, 'fetch_data_from_database')
+        self.fetch = fetch.start()
+        self.addCleanup(fetch.stop)
+
+    def test_longer_snapshot_serves_shorter_window(self):
+        # The default 90-day export serves the 30-day scheduled retrain
+        write_snapshot(self.directory, days=90)
+        self.recommender.load_training_data(days=30)
+        self.fetch.assert_not_called()
+        self.assertEqual(len(self.recommender.products_data), 3)
+        self.assertEqual(len(self.recommender.user_interactions), 2)
+
+    def test_same_window_keeps_every_interaction(self):
+        write_snapshot(self.directory, days=90)
+        self.recommender.load_training_data(days=90)
+        self.fetch.assert_not_called()
+        self.assertEqual(len(self.recommender.user_interactions), 4)
+
+    def test_shorter_snapshot_falls_back_to_api(self):
+        write_snapshot(self.directory, days=7)
+        self.recommender.load_training_data(days=30)
+        self.fetch.assert_called_once_with(days=30, incremental=True)
+
+    def test_stale_snapshot_falls_back_to_api(self):
+        write_snapshot(self.directory, days=90, age_hours=48)
+        self.recommender.load_training_data(days=30)
+        self.fetch.assert_called_once_with(days=30, incremental=True)
+
+
+class DummyDataTests(unittest.TestCase):
+    """Dummy interactions can be split by time, as evaluation.py does"""
+
+    def test_timestamps_span_the_window(self):
+        recommender = ProductRecommender(auto_load=False)
+        recommender.generate_dummy_data(days=30)
+        ages = datetime.now(timezone.utc) - recommender.user_interactions['created_at']
+        self.assertLessEqual(ages.max(), timedelta(days=30))
+        self.assertGreater(ages.max() - ages.min(), timedelta(days=25))
+
+    def test_time_split_holds_out_the_latest(self):
+        recommender = ProductRecommender(auto_load=False)
+        recommender.generate_dummy_data()
+        train, test = time_split(recommender.user_interactions, 0.2)
+        self.assertEqual(len(train) + len(test), len(recommender.user_interactions))
+        self.assertLess(train['created_at'].max(), test['created_at'].min())
+        # Most held-out users also have training history to recommend from
+        self.assertGreater(test['user_id'].isin(train['user_id']).mean(), 0.5)
+
+
+@unittest.skipUnless(fakeredis, 'fakeredis is not installed')
+class InteractionStreamTests(unittest.TestCase):
+    """Events in the backend's stream format reach session recommendations"""
+
+    @classmethod
+    def setUpClass(cls):
+        import app
+        cls.app = app
+        cls.recommender = ProductRecommender(auto_load=False)
+        cls.recommender.generate_dummy_data()
+        cls.recommender.train_model()
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        for name, value in (('recommender', self.recommender), ('background_services_started', True),
+                            ('session_store', SessionStore())):
+            patcher = mock.patch.object(self.app, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def publish(self, user_id, product_id, interaction_type, session_id=''):
+        # Same fields as products.events.publish_interactions in the backend
+        return self.redis.xadd(self.app.STREAM_KEY, {
+            'user_id': user_id,
+            'product_id': product_id,
+            'interaction_type': interaction_type,
+            'session_id': session_id,
+            'created_at': datetime.now(timezone.utc).timestamp(),
+        })
+
+    def test_events_feed_session_recommendations(self):
+        self.publish(7, 1, 'view', session_id='abc')
+        last = self.publish(7, 2, 'add_to_cart', session_id='abc')
+        self.assertEqual(self.app.read_interaction_stream(self.redis, '0', block=None), last)
+
+        self.assertEqual({product_id for product_id, _ in self.app.session_store.get_weighted_items('abc')}, {1, 2})
+        response = self.app.app.test_client().get('/api/ml/recommendations/session/abc?n=5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['session_items'], 2)
+        self.assertEqual(response.get_json()['count'], 5)
+
+    def test_reads_resume_after_the_last_id(self):
+        first = self.publish(7, 1, 'view', session_id='abc')
+        last_id = self.app.read_interaction_stream(self.redis, '0', block=None)
+        self.assertEqual(last_id, first)
+        self.assertEqual(self.app.read_interaction_stream(self.redis, last_id, block=None), last_id)
+
+        self.publish(7, 3, 'purchase', session_id='abc')
+        self.app.read_interaction_stream(self.redis, last_id, block=None)
+        self.assertEqual(len(self.app.session_store.get_weighted_items('abc')), 2)
+
+    def test_events_without_a_session_are_kept_per_user(self):
+        self.publish(9, 4, 'view')
+        self.app.read_interaction_stream(self.redis, '0', block=None)
+        self.assertEqual([product_id for product_id, _ in self.app.session_store.get_weighted_items('user-9')], [4])
+
+
+if __name__ == '__main__':
+    unittest.main()